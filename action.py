@@ -1,271 +1,143 @@
-class Action:
-    """
-    Class to facilitate actions taken by agents in StateSpace.
-
-    arguments: (all functions)
-    agent - 'F' for female agent; 'M' for male agent
-    ssObj - StateSpace Class object
-    """
-    def is_pickup_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly pick up a block and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check cell type
-        if not ssObj.is_pickup(loc):
-            return False
-        
-        # check carrying
-        if ssObj.is_agent_carrying(agent):
-            return False
-        
-        # check number of blocks
-        if ssObj.state_space[loc[0], loc[1], loc[2]].get_num_blocks() <= 0:
-            return False
-
-        return True
-
-    def is_dropoff_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly drop off a block and False otherwise
-        """
-        loc = ssObj.get_location(agent)
+from cell import PICKUP, DROPOFF, DROPOFF_CAPACITY
 
-        # check cell type
-        if not ssObj.is_dropoff(loc):
-            return False
+# Names of the actions, indexed by action code; the simulator only uses the codes
+# Bit i of an applicability mask stands for the action of code i
+ACTIONS = ['Pickup', 'Dropoff', 'N', 'S', 'E', 'W', 'U', 'D']
+ACT_PICKUP, ACT_DROPOFF, ACT_NORTH, ACT_SOUTH, ACT_EAST, ACT_WEST, ACT_UP, ACT_DOWN = range(len(ACTIONS))
+# code of every action name, for the boundaries where actions are read as text
+ACTION_INDEX = {a: i for i, a in enumerate(ACTIONS)}
+ACTION_BIT = [1 << i for i in range(len(ACTIONS))]
 
-        # check carrying
-        if not ssObj.is_agent_carrying(agent):
-            return False
+# (dx, dy, dz) of each move, by action code
+MOVES = {ACT_NORTH: (0, 1, 0), ACT_SOUTH: (0, -1, 0), ACT_EAST: (1, 0, 0),
+         ACT_WEST: (-1, 0, 0), ACT_UP: (0, 0, 1), ACT_DOWN: (0, 0, -1)}
 
-        # check number of blocks
-        if ssObj.state_space[loc[0], loc[1], loc[2]].get_num_blocks() >= 5:
-            return False
+# Codes of the actions in a mask, in increasing order, for every possible mask
+# These are also the Q-table row positions of the actions
+MASK_ACTIONS = [[a for a in range(len(ACTIONS)) if mask & ACTION_BIT[a]] for mask in range(1 << len(ACTIONS))]
 
-        return True
+# Move codes of extracted Q-tables: 0 when no action has a positive Q value, i+1 for action code i
+MOVE_NAMES = [''] + ACTIONS
 
-    def is_east_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly move east and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check bounds
-        if loc[0] >= 2:
-            return False
-        
-        # check occupied
-        loc = [loc[0] + 1, loc[1], loc[2]]
-        if ssObj.state_space[loc[0], loc[1], loc[2]].is_occupied():
-            return False
-
-        return True
-
-    def is_west_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly move west and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check bounds
-        if loc[0] <= 0:
-            return False
-        
-        # check occupied
-        loc = [loc[0] - 1, loc[1], loc[2]]
-        if ssObj.state_space[loc[0], loc[1], loc[2]].is_occupied():
-            return False
-
-        return True
-
-    def is_north_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly move north and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check bounds
-        if loc[1] >= 2:
-            return False
-        
-        # check occupied
-        loc = [loc[0], loc[1] + 1, loc[2]]
-        if ssObj.state_space[loc[0], loc[1], loc[2]].is_occupied():
-            return False
-
-        return True
-
-    def is_south_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly move south and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check bounds
-        if loc[1] <= 0:
-            return False
-        
-        # check occupied
-        loc = [loc[0], loc[1] - 1, loc[2]]
-        if ssObj.state_space[loc[0], loc[1], loc[2]].is_occupied():
-            return False
-
-        return True
-
-    def is_up_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly move up and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check bounds
-        if loc[2] >= 2:
-            return False
-        
-        # check occupied
-        loc = [loc[0], loc[1], loc[2] + 1]
-        if ssObj.state_space[loc[0], loc[1], loc[2]].is_occupied():
-            return False
-
-        return True
-
-    def is_down_applicable(self, agent, ssObj):
-        """
-        returns True if agent can validly move down and False otherwise
-        """
-        loc = ssObj.get_location(agent)
-
-        # check bounds
-        if loc[2] <= 0:
-            return False
-        
-        # check occupied
-        loc = [loc[0], loc[1], loc[2] - 1]
-        if ssObj.state_space[loc[0], loc[1], loc[2]].is_occupied():
-            return False
-
-        return True
-
-    def move_east(self, agent, ssObj):
-        """
-        moves an agent east by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
-
-        # perform check
-        if self.is_east_applicable(agent, ssObj):
-            newLoc = [loc[0]+1, loc[1], loc[2]]
-
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_agent(agent)
-            ssObj.state_space[newLoc[0], newLoc[1], newLoc[2]].add_agent(agent)
-            ssObj.update_agent_loc(agent, newLoc)
-
-    def move_west(self, agent, ssObj):
-        """
-        moves an agent west by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
-
-        # perform check
-        if self.is_west_applicable(agent, ssObj):
-            newLoc = [loc[0]-1, loc[1], loc[2]]
-
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_agent(agent)
-            ssObj.state_space[newLoc[0], newLoc[1], newLoc[2]].add_agent(agent)
-            ssObj.update_agent_loc(agent, newLoc)
-
-    def move_north(self, agent, ssObj):
-        """
-        moves an agent north by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
-
-        # perform check
-        if self.is_north_applicable(agent, ssObj):
-            newLoc = [loc[0], loc[1]+1, loc[2]]
-
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_agent(agent)
-            ssObj.state_space[newLoc[0], newLoc[1], newLoc[2]].add_agent(agent)
-            ssObj.update_agent_loc(agent, newLoc)
-
-    def move_south(self, agent, ssObj):
-        """
-        moves an agent south by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
-
-        # perform check
-        if self.is_south_applicable(agent, ssObj):
-            newLoc = [loc[0], loc[1]-1, loc[2]]
-
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_agent(agent)
-            ssObj.state_space[newLoc[0], newLoc[1], newLoc[2]].add_agent(agent)
-            ssObj.update_agent_loc(agent, newLoc)
-
-    def move_up(self, agent, ssObj):
-        """
-        moves an agent up by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
-
-        # perform check
-        if self.is_up_applicable(agent, ssObj):
-            newLoc = [loc[0], loc[1], loc[2]+1]
-
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_agent(agent)
-            ssObj.state_space[newLoc[0], newLoc[1], newLoc[2]].add_agent(agent)
-            ssObj.update_agent_loc(agent, newLoc)
-
-    def move_down(self, agent, ssObj):
-        """
-        moves an agent down by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
+class Grid:
+    """
+    Move tables of an X×Y×Z grid, shared by every world of that size.
+    Cells are numbered in row-major order, cell = (x*Y + y)*Z + z
+
+    Properties:
+    size - (X,Y,Z) dimensions of the grid
+    cells - number of cells
+    cell_loc - (x,y,z) coordinates of every cell
+    neighbor - table neighbor[cell][action code] of the cell reached by a move, or -1 if it leaves the grid
+        Pickup and Dropoff keep the agent in its cell
+    border_mask - bitmask of the moves that stay on the grid, for every cell
+    blocking - dict {neighbor cell: move bit} for every cell; an agent in the neighbor cell blocks that move
+    blocked_mask - dict {neighbor cell: border mask without the move bit} for every cell, the moves left
+        when an agent is in the neighbor cell
+    """
+    __slots__ = ('size', 'cells', 'cell_loc', 'neighbor', 'border_mask', 'blocking', 'blocked_mask')
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        X, Y, Z = self.size
+        self.cells = X*Y*Z
+        self.cell_loc = [(x, y, z) for x in range(X) for y in range(Y) for z in range(Z)]
+        self.neighbor = []
+        self.border_mask = []
+        self.blocking = []
+        for cell, loc in enumerate(self.cell_loc):
+            row = [cell]*len(ACTIONS)
+            mask = 0
+            blocking = {}
+            for move, delta in MOVES.items():
+                x, y, z = loc[0] + delta[0], loc[1] + delta[1], loc[2] + delta[2]
+                if 0 <= x < X and 0 <= y < Y and 0 <= z < Z:
+                    row[move] = self.cell_index((x, y, z))
+                    mask |= ACTION_BIT[move]
+                    blocking[row[move]] = ACTION_BIT[move]
+                else:
+                    row[move] = -1
+            self.neighbor.append(row)
+            self.border_mask.append(mask)
+            self.blocking.append(blocking)
+        self.blocked_mask = [{other: self.border_mask[cell] & ~bit for other, bit in blocking.items()}
+                             for cell, blocking in enumerate(self.blocking)]
+
+    def __deepcopy__(self, memo):
+        # the tables never change, copies of a world share them
+        return self
+
+    def cell_index(self, loc):
+        """
+        returns the cell number of (x,y,z) coordinates
+        """
+        return (loc[0]*self.size[1] + loc[1])*self.size[2] + loc[2]
+
+    def applicable_mask(self, cell, other_cell, carrying, cell_type, num_blocks, capacity=DROPOFF_CAPACITY):
+        """
+        returns the bitmask of applicable actions of an agent
+
+        arguments:
+        cell - cell number of the agent
+        other_cell - cell number of the other agent
+        carrying - True if the agent is carrying a block
+        cell_type - type code of the agent's cell
+        num_blocks - number of blocks in the agent's cell
+        capacity - number of blocks that fill a Dropoff cell
+        """
+        mask = self.blocked_mask[cell].get(other_cell, self.border_mask[cell])
+        if carrying:
+            if cell_type == DROPOFF and num_blocks < capacity:
+                mask |= 2
+        elif cell_type == PICKUP and num_blocks > 0:
+            mask |= 1
+        return mask
+
+_GRIDS = {}
+
+def grid(size):
+    """
+    returns the Grid of an (X,Y,Z) size, built once per size
+    """
+    size = tuple(size)
+    if size not in _GRIDS:
+        _GRIDS[size] = Grid(size)
+    return _GRIDS[size]
 
-        # perform check
-        if self.is_down_applicable(agent, ssObj):
-            newLoc = [loc[0], loc[1], loc[2]-1]
+# The action functions below are stateless: the world is passed in, so a step never builds an object to act on it
 
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_agent(agent)
-            ssObj.state_space[newLoc[0], newLoc[1], newLoc[2]].add_agent(agent)
-            ssObj.update_agent_loc(agent, newLoc)
+def is_applicable(action, agent, ssObj):
+    """
+    returns True if agent can validly perform action and False otherwise
+    arguments:
+    action - code of the action
+    agent - code of the agent (see cell.AGENTS)
+    ssObj - StateSpace Class object
+    """
+    return bool(ssObj.applicable_mask(agent) & ACTION_BIT[action])
 
-    def pickup_block(self, agent, ssObj):
-        """
-        picks up a block by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
+def pickup_block(ssObj, agent, action=ACT_PICKUP):
+    """
+    picks up a block by updating state space object, the action being applicable
+    returns nothing
+    """
+    ssObj.remove_block_at(ssObj.cell[agent])
+    ssObj.carrying[agent] = True
 
-        # perform check
-        if self.is_pickup_applicable(agent, ssObj):
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].remove_block()
-            ssObj.update_agent_carrying(agent, True)
+def dropoff_block(ssObj, agent, action=ACT_DROPOFF):
+    """
+    drops off a block by updating state space object, the action being applicable
+    returns nothing
+    """
+    ssObj.add_block_at(ssObj.cell[agent])
+    ssObj.carrying[agent] = False
 
-    def dropoff_block(self, agent, ssObj):
-        """
-        drops off a block by updating state space object
-        returns nothing
-        """
-        loc = ssObj.get_location(agent)
+def move(ssObj, agent, action):
+    """
+    moves an agent in the direction of action by updating state space object, the action being applicable
+    returns nothing
+    """
+    ssObj.move_agent_to(agent, ssObj.grid.neighbor[ssObj.cell[agent]][action])
 
-        # perform check
-        if self.is_dropoff_applicable(agent, ssObj):
-            # update state space
-            ssObj.state_space[loc[0], loc[1], loc[2]].add_block()
-            ssObj.update_agent_carrying(agent, False)
\ No newline at end of file
+# effect of an applicable action on a StateSpace, by action code, called as EFFECTS[action](ssObj, agent, action)
+EFFECTS = [pickup_block, dropoff_block] + [move]*6
@@ -1,19 +1,91 @@
 import numpy as np
-import random
-import copy
+from action import ACTIONS, MASK_ACTIONS
+from qtable import make_table
+from policy import POLICIES
+from randomStream import spawn_tie_rngs
 
-# Constant determining how often to prune the history the agents keep track of
-MAX_HISTORY = 10
-# Total possible actions available
-ACTIONS = ['Pickup', 'Dropoff', 'N', 'S', 'E', 'W', 'U', 'D']
+# Number of steps the agents keep track of, as many as SARSA looks back
+HISTORY = 3
+
+class History:
+    """
+    Fixed-size ring buffer of the last steps of an agent: the RL state it was in, the action it took from it
+    and the reward it got. The slots are allocated once, recording a step only overwrites the oldest one.
+
+    Steps are addressed from the most recent: back=1 is the current step, whose action is not chosen yet,
+    back=2 the one before it, and so on
+
+    API:
+    push - starts a new current step in an RL state, with no action and reward 0
+    set_action - records the action taken from the current step
+    set_reward - records the reward of the previous step
+    state, action, reward - return a field of the step back steps ago
+    to_list - returns the steps as [state, action, reward] lists, oldest first
+    """
+    __slots__ = ('size', 'states', 'actions', 'rewards', 'head', 'length')
+
+    def __init__(self, state, size=HISTORY):
+        self.size = size
+        self.states = [0]*size
+        self.actions = [None]*size
+        self.rewards = [0]*size
+        self.head = -1
+        self.length = 0
+        self.push(state)
+
+    def __len__(self):
+        return self.length
+
+    def push(self, state):
+        self.head = head = (self.head + 1) % self.size
+        self.states[head] = state
+        self.actions[head] = None
+        self.rewards[head] = 0
+        if self.length < self.size:
+            self.length += 1
+
+    def set_action(self, action):
+        self.actions[self.head] = action
+
+    def set_reward(self, reward):
+        self.rewards[(self.head - 1) % self.size] = reward
+
+    def state(self, back):
+        return self.states[(self.head + 1 - back) % self.size]
+
+    def action(self, back):
+        return self.actions[(self.head + 1 - back) % self.size]
+
+    def reward(self, back):
+        return self.rewards[(self.head + 1 - back) % self.size]
+
+    def to_list(self):
+        return [[self.state(back), self.action(back), self.reward(back)] for back in range(self.length, 0, -1)]
+
+    @classmethod
+    def from_list(cls, steps, size=HISTORY):
+        """
+        returns a History holding the last size steps of a list returned by to_list
+        """
+        steps = steps[-size:]
+        history = cls(steps[0][0], size)
+        for i, (state, action, reward) in enumerate(steps):
+            if i:
+                history.push(state)
+            history.actions[history.head] = action
+            history.rewards[history.head] = reward
+        return history
 
 class Agent:
-    def __init__(self, agent, rlstate, policy, init_state, alpha=0.5, gamma=0.5):
+    __slots__ = ('agent', 'actions', 'rlstate', 'rwstate', 'policy', 'seed', 'learning', 'table', 'history',
+                 'alpha', 'gamma', 'tie_rng')
+
+    def __init__(self, agent, rlstate, policy, init_state, alpha=0.5, gamma=0.5, table='dense64', tie_rng=None):
         """
         Constructor for generic agent.
 
         Arguments:
-        agent - 'M' for male agent, 'F' for female agent
+        agent - code of the agent, cell.AGENT_F or cell.AGENT_M
         rlstate - A RLState object which provides a mapping from the real-world state space to RL states
             This is used to initialize 'table' that implements Q-tables
         policy - A Policy object, which provides a function that, given an RL state, returns an action
@@ -21,6 +93,9 @@ class Agent:
         init_state - The initial state of the world, a StateSpace object
         alpha - The learning rate
         gamma - The discounting factor for future Q values
+        table - The storage backend of the Q-table, a key of qtable.TABLES
+        tie_rng - The numpy Generator breaking ties in extract_table, the one randomStream.spawn_tie_rngs
+            spawns for the agent from the policy's seed if None
 
         API:
         choose_action - agent takes current RW state, chooses an applicable action by policy and returns it
@@ -28,6 +103,8 @@ class Agent:
         set_policy - agent changes policy to passed policy
         set_learning - agent changes learning method to learning method specified
         extract_table - get the current table state in a suitable for for dumping
+        checkpoint - returns everything the agent learned and its random states, in a picklable form
+        restore - resumes the agent from the data returned by checkpoint
         """
         self.agent = agent
         self.actions = ACTIONS
@@ -36,29 +113,29 @@ class Agent:
         self.policy = policy
         self.seed = self.policy.seed
         self.learning = 'ql'
-        self.table = self._initialize_table()
-        self.history = [[self.rlstate.map_state(init_state, self.agent), None, 0]]
+        self.table = self._initialize_table(table)
+        self.history = History(self.rlstate.map_state(init_state, self.agent))
         self.alpha = alpha
         self.gamma = gamma
+        # breaks ties in extract_table without touching the policy's random stream
+        self.tie_rng = tie_rng if tie_rng is not None else spawn_tie_rngs(self.seed)[agent]
 
-    def _initialize_table(self):
+    def _initialize_table(self, kind):
         """
         Initialize the Q-table with 0s
 
-        The Q-table currently is implemented as a dictionary indexed by action into ndarrays of the state space
+        The Q-table is a qtable.QTable of the given kind with one row per RL state id,
+        holding the Q values of every action in the order of ACTIONS, wrapped in a qtable.GreedyTable
+        caching the best actions of every row for the policies, the Q-learning target and extract_table
         """
-        shape = self.rlstate.shape()
-        table = {}
-        for a in self.actions:
-            table[a] = np.zeros(shape)
-        return table
+        return make_table(kind, self.rlstate.states(), len(self.actions), greedy=True)
 
     def choose_action(self, state):
         """
         Given the current state of the world, use policy to determine next action, and return that action
         """
         action_taken = self.policy.execute(state, self.rlstate.map_state(state, self.agent), self.table) # added self.agent arg to map_state call
-        self.history[-1][1] = action_taken
+        self.history.set_action(action_taken)
         return action_taken
 
     def update(self, new_state, reward):
@@ -66,12 +143,10 @@ class Agent:
         Updates the agent as needed, after an action is taken and reward is obtained
         Then run a Q-table update
         """
-        self.history.append([self.rlstate.map_state(new_state, self.agent), None, 0])
+        self.history.push(self.rlstate.map_state(new_state, self.agent))
         self.rwstate=new_state
-        self.history[-2][2] = reward
+        self.history.set_reward(reward)
         self._update_table()
-        if len(self.history) > MAX_HISTORY:
-            self._prune_history()
 
     def set_policy(self, policy):
         """
@@ -85,6 +160,35 @@ class Agent:
         """
         self.learning = learning
 
+    def checkpoint(self):
+        """
+        Returns the agent state that changes during an experiment as a dict
+        The policy is saved as its class name and random state, as policies hold lambdas that cannot be pickled
+        """
+        return {'policy': (type(self.policy).__name__, self.policy.checkpoint()),
+                'learning': self.learning,
+                'alpha': self.alpha,
+                'gamma': self.gamma,
+                'table': self.table.checkpoint(),
+                'history': self.history.to_list(),
+                'tie_rng': self.tie_rng.bit_generator.state}
+
+    def restore(self, data, state):
+        """
+        Resumes the agent from the dict returned by checkpoint, in the real world state given
+        """
+        name, policy_state = data['policy']
+        # the stream of the current policy is the agent's stream, which later policies are given as well
+        self.policy.restore(policy_state)
+        self.policy = POLICIES[name](self.agent, self.rlstate, self.actions, seed=self.seed, stream=self.policy.rng)
+        self.learning = data['learning']
+        self.alpha = data['alpha']
+        self.gamma = data['gamma']
+        self.table.restore(data['table'])
+        self.history = History.from_list(data['history'])
+        self.tie_rng.bit_generator.state = data['tie_rng']
+        self.rwstate = state
+
     def _update_table(self):
         """
         Given the current state space, use appropriate learning method to update the Q-table
@@ -98,67 +202,70 @@ class Agent:
         """
         Updates Q-table using Q-learning
         """
-        prev_step = self.history[-2]
-        prev_state = prev_step[0]
-        action = prev_step[1]
-        reward = prev_step[2]
-        new_state = self.history[-1][0]
-        old_q = self.table[action][prev_state]
-        best_next_action_q = -2**32
-        for ap in self.policy.get_applicable_actions(self.rwstate):
-            if self.table[ap][new_state] > best_next_action_q:
-                best_next_action_q = self.table[ap][new_state]
-        self.table[action][prev_state] = (1-self.alpha)*old_q + self.alpha*(reward + self.gamma*best_next_action_q)
+        history = self.history
+        prev_state = history.state(2)
+        action = history.action(2)
+        reward = history.reward(2)
+        new_state = history.state(1)
+        old_q = self.table.get(prev_state, action)
+        mask = self.rwstate.applicable_mask(self.agent)
+        best_next_action_q, bits = self.table.best(new_state)
+        # the rows are only scanned when no action holding the maximum of the row is applicable
+        if not bits & mask:
+            best_next_action_q = None
+            for a in MASK_ACTIONS[mask]:
+                q = self.table.get(new_state, a)
+                if best_next_action_q is None or q > best_next_action_q:
+                    best_next_action_q = q
+            if best_next_action_q is None:
+                best_next_action_q = -2**32
+        self.table.set(prev_state, action, (1-self.alpha)*old_q + self.alpha*(reward + self.gamma*best_next_action_q))
 
     def _update_table_sarsa(self):
         """
         Updates Q-table using SARSA
         """
-        prev_step = self.history[-3]
-        prev_state = prev_step[0]
-        action = prev_step[1]
-        reward = prev_step[2]
-        curr_step = self.history[-2]
-        new_state = curr_step[0]
-        next_action_taken = curr_step[1]
-        old_q = self.table[action][prev_state]
-        next_q = self.table[next_action_taken][new_state]
-        self.table[action][prev_state] = (1-self.alpha)*old_q + self.alpha*(reward + self.gamma*next_q)
-
-    def _prune_history(self):
-        """
-        Reduce the size of the history that the agents keep
-        """
-        self.history = self.history[-2:]
+        history = self.history
+        prev_state = history.state(3)
+        action = history.action(3)
+        reward = history.reward(3)
+        new_state = history.state(2)
+        next_action_taken = history.action(2)
+        old_q = self.table.get(prev_state, action)
+        next_q = self.table.get(new_state, next_action_taken)
+        self.table.set(prev_state, action, (1-self.alpha)*old_q + self.alpha*(reward + self.gamma*next_q))
 
     def extract_table(self, state):
         """
         Extract part of the Q-table state at the present for the agent, in the form suitable for dumping
-        The format uses a (3,3,3) matrix encoding the direction and strength of the action with strongest Q value of the agent at that space,
-        for the current RL state space information regarding the location of the other agent, block carrying status, and state of the rest of the world
-
-        In the case of ties for the strongest, the possible actions are shuffled
-        to make any of the tied best actions equally probable
-        """
-        strength = [0] * 54
-        moves = ['' for i in range(54)]
-        for has_block in [True, False]:
-            state.update_agent_carrying(self.agent, has_block)
-            for i in range(3):
-                for j in range(3):
-                    for k in range(3):
-                        index = i*18 + j*6 + k*2 + has_block
-                        state.update_agent_loc(self.agent, (i,j,k))
-                        actions = copy.deepcopy(self.actions)
-                        random.shuffle(actions)
-                        cur_rlstate = self.rlstate.map_state(state, self.agent)
-                        max_q = 0
-                        max_act = ''
-                        for a in actions:
-                            temp = self.table[a][cur_rlstate]
-                            if temp > max_q:
-                                max_q = temp
-                                max_act = a
-                        strength[index] = max_q
-                        moves[index] = max_act
-        return (strength, moves)
+        The format uses a (X,Y,Z,2) grid, flattened in the order cell*2 + carrying (see action.Grid), encoding the direction
+        and strength of the action with strongest Q value of the agent at every location, with and without a block,
+        for the current RL state space information regarding the location of the other agent and state of the rest of the world
+
+        Returns (strength, moves), where moves holds the move codes of action.MOVE_NAMES
+        Locations where no action has a positive Q value get strength 0 and move code 0
+
+        In the case of ties for the strongest, one of the tied best actions is chosen uniformly at random
+        """
+        return extract_best(*self.table.best_rows(self.rlstate.map_positions(state, self.agent)), self.tie_rng)
+
+def extract_rows(rows, tie_rng):
+    """
+    returns (strength, moves) of Agent.extract_table for an array of Q-table rows, one per (location, carrying) pair
+    Ties are broken with keys drawn from the numpy Generator tie_rng
+    """
+    strength = rows.max(axis=1)
+    return extract_best(strength, rows == strength[:, None], tie_rng)
+
+def extract_best(strength, held, tie_rng):
+    """
+    returns (strength, moves) of Agent.extract_table given the maximum Q value of every row
+    and a boolean array of the actions holding it, which extract_rows computes from the rows
+    """
+    keys = tie_rng.random(held.shape)
+    keys[~held] = -1
+    moves = (keys.argmax(axis=1) + 1).astype(np.uint8)
+    unset = strength <= 0
+    strength[unset] = 0
+    moves[unset] = 0
+    return (strength, moves)
@@ -0,0 +1,372 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import contextlib
+import tracemalloc
+import numpy as np
+from main import experiment
+from fastEngine import check_options
+from generate_csv import Args
+from stateSpace import StateSpace
+from action import ACTIONS
+from cell import AGENT_F, AGENT_M
+from agent import Agent
+from rlw import RL_SPACES
+from policy import PRandom, PGreedy, PExploit
+
+RL_TYPES = ['ss', 'vs', 'ms']
+EXPERIMENTS = ['1a', '1b', '1c', '2', '3a', '3b', '4']
+
+# Number of worlds sampled along a random walk for the micro-benchmarks
+SAMPLES = 2000
+# Shortest duration of one micro-benchmark timing, shorter ones are dominated by timer noise
+MIN_SECONDS = 0.2
+# Number of steps taken before and while measuring the memory allocated by steps
+WARMUP_STEPS = 2000
+ALLOCATION_STEPS = 2000
+
+def best_time(fn, repeat):
+    """
+    returns the shortest of repeat wall-clock timings of fn() in seconds, and the result of the last call
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def peak_memory(fn):
+    """
+    returns the peak memory in KiB allocated by Python while fn() runs
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def run_experiment(exp, seed, rl_type, steps, table='dense64', engine='reference'):
+    """
+    runs main.experiment without history or Q-table files and with its output silenced
+    returns the number of moves performed
+    """
+    args = Args(exp, seed, rl_type, os.devnull)
+    args.produce_history = False
+    args.steps = steps
+    args.table_backend = table
+    args.engine = engine
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        return experiment(args)
+
+def bench_end_to_end(rl_types, experiments, seed, steps, repeat, table='dense64', engine='reference'):
+    """
+    returns {'<rl_type>/<experiment>': {...}} with the steps/sec and peak memory of every end-to-end run
+    Peak memory is measured in a separate run, tracemalloc slowing the loop down
+    """
+    results = {}
+    for rl_type in rl_types:
+        for exp in experiments:
+            seconds, moves = best_time(lambda: run_experiment(exp, seed, rl_type, steps, table, engine), repeat)
+            results[f'{rl_type}/{exp}'] = {
+                'steps': moves,
+                'seconds': seconds,
+                'steps_per_sec': moves / seconds,
+                'peak_memory_kb': peak_memory(lambda: run_experiment(exp, seed, rl_type, steps, table, engine)),
+            }
+    return results
+
+def sample_worlds(count, seed):
+    """
+    returns count copies of the world taken along a random walk of both agents
+    with the actions that were taken from them and the agent taking them
+    """
+    world = StateSpace('original')
+    policies = {agent: PRandom(agent, None, ACTIONS, seed=seed) for agent in (AGENT_F, AGENT_M)}
+    samples = []
+    agent = AGENT_F
+    while len(samples) < count:
+        action = policies[agent].execute(world, None, None)
+        sample = StateSpace(world.layout)
+        sample.restore(world.snapshot())
+        samples.append((sample, agent, action))
+        world.perform_action(agent, action)
+        if world.is_complete():
+            world.reset('original')
+            agent = AGENT_F
+        else:
+            agent = 1 - agent
+    return samples
+
+def calls_per_sec(fn, calls, repeat):
+    """
+    returns the calls/sec of fn, which makes calls calls per invocation
+    Like timeit, fn is invoked often enough in a row for one timing to last at least MIN_SECONDS
+    """
+    number = 1
+    while best_time(lambda: [fn() for _ in range(number)], 1)[0] < MIN_SECONDS:
+        number *= 2
+    seconds, _ = best_time(lambda: [fn() for _ in range(number)], repeat)
+    return {'calls': calls*number, 'seconds': seconds, 'calls_per_sec': calls*number / seconds}
+
+def bench_micro(rl_types, seed, repeat, table='dense64'):
+    """
+    returns {'<function>[/<rl_type>]': {...}} with the calls/sec of the hot paths of the event loop
+    Every function is called once for each world of a fixed random walk
+    """
+    samples = sample_worlds(SAMPLES, seed)
+    results = {}
+
+    snapshots = [world.snapshot() for world, _, _ in samples]
+    scratch = [StateSpace(world.layout) for world, _, _ in samples]
+    def snapshot():
+        for world, _, _ in samples:
+            world.snapshot()
+    results['StateSpace.snapshot'] = calls_per_sec(snapshot, len(samples), repeat)
+    def restore():
+        for world, snap in zip(scratch, snapshots):
+            world.restore(snap)
+    results['StateSpace.restore'] = calls_per_sec(restore, len(samples), repeat)
+
+    # perform_action changes the world, so every pass acts on worlds restored outside the timing
+    def perform_action():
+        calls, seconds = 0, 0
+        while seconds < MIN_SECONDS:
+            restore()
+            start = time.perf_counter()
+            for world, (_, agent, action) in zip(scratch, samples):
+                world.perform_action(agent, action)
+            seconds += time.perf_counter() - start
+            calls += len(scratch)
+        return {'calls': calls, 'seconds': seconds, 'calls_per_sec': calls / seconds}
+    results['StateSpace.perform_action'] = max((perform_action() for _ in range(repeat)),
+                                               key=lambda r: r['calls_per_sec'])
+
+    policies = {agent: PRandom(agent, None, ACTIONS, seed=seed) for agent in (AGENT_F, AGENT_M)}
+    def get_applicable_actions():
+        for world, agent, _ in samples:
+            policies[agent].get_applicable_actions(world)
+    results['Policy.get_applicable_actions'] = calls_per_sec(get_applicable_actions, len(samples), repeat)
+
+    for rl_type in rl_types:
+        rlw = RL_SPACES[rl_type]()
+        def map_state():
+            for world, agent, _ in samples:
+                rlw.map_state(world, agent)
+        results[f'RLSpace.map_state/{rl_type}'] = calls_per_sec(map_state, len(samples), repeat)
+
+        agents = {agent: Agent(agent, rlw, PRandom(agent, rlw, ACTIONS, seed=seed), samples[0][0], table=table)
+                  for agent in (AGENT_F, AGENT_M)}
+        for learning in ('ql', 'sarsa'):
+            for a in agents.values():
+                a.set_learning(learning)
+            def update():
+                for world, agent, action in samples:
+                    a = agents[agent]
+                    a.history.set_action(action)
+                    a.update(world, -1)
+            results[f'Agent.update/{rl_type}/{learning}'] = calls_per_sec(update, len(samples), repeat)
+
+        def extract_table():
+            for world, agent, _ in samples:
+                agents[agent].extract_table(world)
+        results[f'Agent.extract_table/{rl_type}'] = calls_per_sec(extract_table, len(samples), repeat)
+
+        # policies act on the Q-tables the updates above filled
+        ids = [rlw.map_state(world, agent) for world, agent, _ in samples]
+        for cls in (PRandom, PGreedy, PExploit):
+            policies = {agent: cls(agent, rlw, ACTIONS, seed=seed) for agent in (AGENT_F, AGENT_M)}
+            def execute():
+                for (world, agent, _), rlstate in zip(samples, ids):
+                    policies[agent].execute(world, rlstate, agents[agent].table)
+            results[f'Policy.execute/{rl_type}/{cls.__name__}'] = calls_per_sec(execute, len(samples), repeat)
+    return results
+
+def bench_allocations(rl_types, seed, table='dense64'):
+    """
+    returns {'<rl_type>/<learning>': {...}} with the memory allocated by one step of the event loop core
+    (choose_action, perform_action and update of the agent whose turn it is), measured with tracemalloc:
+    peak_bytes_per_step - mean of the most memory held during a step above what was held before it
+    retained_bytes_per_step - memory still held after the steps, per step
+    The agents use PExploit after WARMUP_STEPS steps, so that both random and greedy choices are measured
+    """
+    results = {}
+    for rl_type in rl_types:
+        rlw = RL_SPACES[rl_type]()
+        for learning in ('ql', 'sarsa'):
+            world = StateSpace('original')
+            agents = [Agent(agent, rlw, PExploit(agent, rlw, ACTIONS, seed=seed), world, table=table)
+                      for agent in (AGENT_F, AGENT_M)]
+            for a in agents:
+                a.set_learning(learning)
+            turn = [AGENT_F]
+            def step():
+                agent = agents[turn[0]]
+                agent.update(world, world.perform_action(turn[0], agent.choose_action(world)))
+                if world.is_complete():
+                    world.reset('original')
+                    turn[0] = AGENT_F
+                else:
+                    turn[0] = 1 - turn[0]
+            for _ in range(WARMUP_STEPS):
+                step()
+            peaks = 0
+            tracemalloc.start()
+            try:
+                start = tracemalloc.get_traced_memory()[0]
+                for _ in range(ALLOCATION_STEPS):
+                    before = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    step()
+                    peaks += tracemalloc.get_traced_memory()[1] - before
+                retained = tracemalloc.get_traced_memory()[0] - start
+            finally:
+                tracemalloc.stop()
+            results[f'{rl_type}/{learning}'] = {'steps': ALLOCATION_STEPS,
+                                                'peak_bytes_per_step': peaks / ALLOCATION_STEPS,
+                                                'retained_bytes_per_step': retained / ALLOCATION_STEPS}
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    returns a list of messages, one for every benchmark of baseline that regressed by more than threshold
+    A regression is a drop in steps/sec or calls/sec, or a rise in peak memory or in the memory allocated by steps
+    """
+    regressions = []
+    for section in ('end_to_end', 'micro', 'allocations'):
+        for name, old in baseline.get(section, {}).items():
+            new = results.get(section, {}).get(name)
+            if new is None:
+                continue
+            for key, worse in (('steps_per_sec', -1), ('calls_per_sec', -1), ('peak_memory_kb', 1),
+                               ('peak_bytes_per_step', 1), ('retained_bytes_per_step', 1)):
+                if key not in old or key not in new or old[key] == 0:
+                    continue
+                change = (new[key] - old[key]) / old[key]
+                if worse*change > threshold:
+                    regressions.append(f'{section} {name}: {key} {old[key]:.1f} -> {new[key]:.1f} ({change:+.1%})')
+    return regressions
+
+def print_results(results):
+    print(f"{'end-to-end':<32}{'steps':>8}{'steps/s':>12}{'peak KiB':>12}")
+    for name, r in results['end_to_end'].items():
+        print(f"{name:<32}{r['steps']:>8}{r['steps_per_sec']:>12.0f}{r['peak_memory_kb']:>12.0f}")
+    print(f"\n{'micro-benchmark':<44}{'calls/s':>12}")
+    for name, r in results['micro'].items():
+        print(f"{name:<44}{r['calls_per_sec']:>12.0f}")
+    print(f"\n{'allocations':<32}{'peak B/step':>12}{'kept B/step':>12}")
+    for name, r in results['allocations'].items():
+        print(f"{name:<32}{r['peak_bytes_per_step']:>12.1f}{r['retained_bytes_per_step']:>12.1f}")
+
+def main():
+    """
+    Benchmark suite of the simulation
+    Times main.experiment end-to-end for every RL state space type and experiment,
+    and the hot paths of its event loop on their own, and the memory allocated by a step with tracemalloc
+    Results are written to a JSON file, and compared against a JSON baseline if one is given,
+    the script exiting with status 1 if any benchmark regressed by more than the threshold
+    """
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-r", "--rl",
+        dest="rl_types",
+        help="RL state space types to benchmark",
+        required=False,
+        nargs='+',
+        default=RL_TYPES)
+    arg_parser.add_argument("-e", "--experiments",
+        dest="experiments",
+        help="Experiments to benchmark end-to-end",
+        required=False,
+        nargs='+',
+        default=EXPERIMENTS)
+    arg_parser.add_argument("-s", "--seed",
+        dest="seed",
+        help="Random seed to use",
+        required=False,
+        type=int,
+        default=1)
+    arg_parser.add_argument("-n", "--steps",
+        dest="steps",
+        help="Number of moves of every end-to-end run",
+        required=False,
+        type=int,
+        default=10000)
+    arg_parser.add_argument("--repeat",
+        dest="repeat",
+        help="Number of timings of every benchmark, the fastest is kept",
+        required=False,
+        type=int,
+        default=3)
+    arg_parser.add_argument("-t", "--table",
+        dest="table_backend",
+        help="Choose Q-table storage",
+        required=False,
+        type=str,
+        choices=['dense64', 'dense32', 'sparse'],
+        default='dense64')
+    arg_parser.add_argument("--engine",
+        dest="engine",
+        help="Choose the implementation of the event loop timed end-to-end",
+        required=False,
+        type=str,
+        choices=['reference', 'fast'],
+        default='reference')
+    arg_parser.add_argument("-o", "--out",
+        dest="out",
+        help="Choose destination of the JSON results",
+        required=False,
+        type=str,
+        default='out/benchmark.json')
+    arg_parser.add_argument("-b", "--baseline",
+        dest="baseline",
+        help="JSON results of an earlier run to compare against",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--threshold",
+        dest="threshold",
+        help="Relative regression above which the suite fails, e.g. 0.1 for 10%%",
+        required=False,
+        type=float,
+        default=0.1)
+    args = arg_parser.parse_args()
+    if args.engine == 'fast':
+        try:
+            check_options(args)
+        except ValueError as e:
+            arg_parser.error(str(e))
+
+    results = {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+                 'machine': platform.machine(), 'seed': args.seed, 'steps': args.steps, 'repeat': args.repeat,
+                 'table': args.table_backend, 'engine': args.engine},
+        'end_to_end': bench_end_to_end(args.rl_types, args.experiments, args.seed, args.steps, args.repeat,
+                                       args.table_backend, args.engine),
+        'micro': bench_micro(args.rl_types, args.seed, args.repeat, args.table_backend),
+        'allocations': bench_allocations(args.rl_types, args.seed, args.table_backend),
+    }
+    print_results(results)
+
+    if os.path.dirname(args.out):
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions above {args.threshold:.0%}:")
+            for message in regressions:
+                print(message)
+            sys.exit(1)
+        print(f"\nNo regressions above {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import io
+import sys
+import shutil
+import argparse
+import tempfile
+import contextlib
+from main import experiment
+from fastEngine import check_options
+from generate_csv import Args, SEED1, SEED2
+from goldenTrace import TABLE_EVERY, CONTEXT, load_trace, trace_name, first_divergence, format_divergence
+
+EXPERIMENTS = ['1a', '1b', '1c', '2', '3a', '3b', '4']
+RL_TYPES = ['ss', 'vs', 'ms']
+# Default directory of the golden traces
+GOLDEN_DIR = os.path.join('out', 'golden')
+
+def run_traced(exp, seed, rl_type, path, steps=10000, table_every=TABLE_EVERY, engine='reference',
+               transition_cache=None):
+    """
+    runs main.experiment without history or Q-table files and with its output silenced, recording its trace to path
+    """
+    args = Args(exp, seed, rl_type, os.devnull)
+    args.engine = engine
+    args.transition_cache = transition_cache
+    args.produce_history = False
+    args.steps = steps
+    args.trace = path
+    args.trace_every = table_every
+    with contextlib.redirect_stdout(io.StringIO()):
+        experiment(args)
+
+def runs(experiments, seeds, rl_types):
+    return [(exp, seed, rl_type) for rl_type in rl_types for exp in experiments for seed in seeds]
+
+def record(args):
+    """
+    records the golden trace of every run into args.dir
+    """
+    for exp, seed, rl_type in runs(args.experiments, args.seeds, args.rl_types):
+        path = os.path.join(args.dir, trace_name(exp, seed, rl_type))
+        run_traced(exp, seed, rl_type, path, args.steps, args.table_every, args.engine, args.transition_cache)
+        print(f'recorded {path}')
+    return 0
+
+def check(args):
+    """
+    replays every run with a golden trace in args.dir and compares the traces
+    returns 1 if any of them diverges or if there is no golden trace to check, 0 otherwise
+    """
+    scratch = tempfile.mkdtemp()
+    checked = diverged = 0
+    try:
+        for exp, seed, rl_type in runs(args.experiments, args.seeds, args.rl_types):
+            name = trace_name(exp, seed, rl_type)
+            golden_path = os.path.join(args.dir, name)
+            if not os.path.exists(golden_path):
+                print(f'{name}: no golden trace, skipped')
+                continue
+            golden = load_trace(golden_path)
+            path = os.path.join(scratch, name)
+            run_traced(exp, seed, rl_type, path, golden['meta']['steps'], golden['meta']['table_every'],
+                       args.engine, args.transition_cache)
+            divergence = first_divergence(golden, load_trace(path), args.context)
+            print(format_divergence(name, divergence))
+            checked += 1
+            diverged += divergence is not None
+    finally:
+        shutil.rmtree(scratch)
+    if not checked:
+        print(f'\nNo golden traces to check in {args.dir}')
+        return 1
+    if diverged:
+        print(f'\n{diverged} runs diverged from the golden traces')
+        return 1
+    print(f'\nAll {checked} runs match the golden traces')
+    return 0
+
+def main():
+    """
+    Golden-trace equivalence harness
+    'record' saves the canonical trace of main.experiment for every (experiment, seed, rl_type) of the sweep,
+    'check' runs them again and reports the first step at which each run diverges from its golden trace,
+    the script exiting with status 1 if any run diverged
+    """
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("command", help="record or check", choices=['record', 'check'])
+    arg_parser.add_argument("-e", "--experiments",
+        dest="experiments",
+        help="Experiments to trace",
+        required=False,
+        nargs='+',
+        default=EXPERIMENTS)
+    arg_parser.add_argument("-s", "--seeds",
+        dest="seeds",
+        help="Seeds to trace",
+        required=False,
+        nargs='+',
+        type=int,
+        default=[SEED1, SEED2])
+    arg_parser.add_argument("-r", "--rl",
+        dest="rl_types",
+        help="RL state space types to trace",
+        required=False,
+        nargs='+',
+        default=RL_TYPES)
+    arg_parser.add_argument("-n", "--steps",
+        dest="steps",
+        help="Number of moves of every recorded run",
+        required=False,
+        type=int,
+        default=10000)
+    arg_parser.add_argument("--table-every",
+        dest="table_every",
+        help="Number of steps between Q-table checksums of recorded runs",
+        required=False,
+        type=int,
+        default=TABLE_EVERY)
+    arg_parser.add_argument("-d", "--dir",
+        dest="dir",
+        help="Choose the directory of the golden traces",
+        required=False,
+        type=str,
+        default=GOLDEN_DIR)
+    arg_parser.add_argument("--engine",
+        dest="engine",
+        help="Choose the engine that is recorded or checked",
+        required=False,
+        type=str,
+        choices=['reference', 'fast'],
+        default='reference')
+    arg_parser.add_argument("--transition-cache",
+        dest="transition_cache",
+        help="Step the reference engine through a transition cache keeping this many transitions",
+        required=False,
+        type=int,
+        default=None)
+    arg_parser.add_argument("--context",
+        dest="context",
+        help="Number of steps before a divergence shown in its report",
+        required=False,
+        type=int,
+        default=CONTEXT)
+    args = arg_parser.parse_args()
+    if args.engine == 'fast':
+        try:
+            check_options(args)
+        except ValueError as e:
+            arg_parser.error(str(e))
+    sys.exit(record(args) if args.command == 'record' else check(args))
+
+if __name__ == "__main__":
+    main()
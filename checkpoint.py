@@ -0,0 +1,39 @@
+import os
+import pickle
+
+MAGIC = b'RLCK'
+# Bumped whenever the content of checkpoints changes, older checkpoints are then refused
+VERSION = 2
+
+def save_checkpoint(path, state):
+    """
+    writes the dict state of a running experiment to a binary checkpoint file
+    The file is written under a temporary name and renamed, so that a run interrupted while
+    checkpointing still leaves the previous checkpoint intact
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        pickle.dump(dict(state, version=VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    """
+    returns the dict written to a checkpoint file by save_checkpoint
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a checkpoint')
+        state = pickle.load(f)
+    if state.get('version') != VERSION:
+        raise ValueError(f'{path} was written by an incompatible version (checkpoint version {state.get("version")})')
+    return state
+
+def check_config(path, saved, config):
+    """
+    raises ValueError if the run configuration config differs from the one saved in a checkpoint,
+    as the resumed run would then not continue the checkpointed one
+    """
+    for key, value in config.items():
+        if saved.get(key) != value:
+            raise ValueError(f'{path} was written with {key}={saved.get(key)!r}, not {value!r}')
@@ -0,0 +1,420 @@
+from array import array
+import numpy as np
+from action import ACTIONS, MASK_ACTIONS, ACT_PICKUP, ACT_DROPOFF, grid
+from cell import AGENTS, AGENT_F, AGENT_M, PICKUP, DROPOFF, RISK
+from agent import HISTORY, extract_rows
+from reachability import make_space
+from randomStream import spawn_streams, spawn_tie_rngs
+from recorder import RunOutputs
+from layout import load_layouts
+from schedule import get_schedule
+from vecStateSpace import P_RANDOM, P_GREEDY, P_EXPLOIT, QL, POLICY_CODES, LEARNING_CODES
+
+# array typecode of the Q values of the Q-table storages the fast engine implements, every table being dense
+TYPECODES = {'dense64': 'd', 'dense32': 'f'}
+# arguments of main.experiment the fast engine does not support, with their command line options
+UNSUPPORTED = [('instrument', '--instrument'), ('checkpoint_every', '--checkpoint-every'), ('resume', '--resume'),
+               ('transition_cache', '--transition-cache')]
+
+class FastLayout:
+    """
+    Integer encoding of the initial world of a layout
+
+    Arguments:
+    layout - the layout.Layout to encode
+    grid - the action.Grid of its size
+
+    Properties:
+    start - [F, M] cell numbers of the agents
+    cell_type - type code of every cell
+    blocks - initial number of blocks in every cell
+    cost - reward of a move out of every cell, -2 for Risk cells and -1 otherwise
+    drops, picks - cell numbers of the Dropoff and Pickup cells, in layout order
+    flag - bit of every Dropoff and Pickup cell in the block flags, 0 for other cells
+        One bit per Dropoff cell (set while it is not full) followed by one per Pickup cell (set while it has blocks),
+        the first Dropoff cell being the most significant, as in rlw.MSpace
+    flags - initial block flags
+    capacity - number of blocks that fill a Dropoff cell
+    """
+    def __init__(self, layout, grid):
+        self.start = [grid.cell_index(layout.start[agent]) for agent in AGENTS]
+        self.cell_type = [0]*grid.cells
+        self.blocks = [0]*grid.cells
+        self.drops = [grid.cell_index(loc) for loc in layout.dropoffs]
+        self.picks = [grid.cell_index(loc) for loc in layout.pickups]
+        self.flag = [0]*grid.cells
+        bits = len(self.drops) + len(self.picks)
+        for i, cell in enumerate(self.drops + self.picks):
+            self.flag[cell] = 1 << (bits - 1 - i)
+        for cell in self.drops:
+            self.cell_type[cell] = DROPOFF
+        for cell in self.picks:
+            self.cell_type[cell] = PICKUP
+            self.blocks[cell] = layout.pickup_blocks
+        for loc in layout.risks:
+            self.cell_type[grid.cell_index(loc)] = RISK
+        self.cost = [-2 if t == RISK else -1 for t in self.cell_type]
+        self.capacity = layout.dropoff_capacity
+        self.flags = sum(self.flag[cell] for cell in self.drops)
+        if layout.pickup_blocks > 0:
+            self.flags += sum(self.flag[cell] for cell in self.picks)
+
+class Kernel:
+    """
+    Precomputed integer tables of a grid and an RL space, which the fast event loop only indexes
+
+    Arguments:
+    grid - the action.Grid of the world
+    space - the RLSpace of the agents, possibly a reachability.CompactSpace
+    flags - number of block flags of the layouts (see FastLayout)
+
+    Properties:
+    move_mask[cell*cells + other] - bitmask of the moves of an agent in cell, the other agent being in other
+    neighbor[cell*actions + action] - cell reached by a move, see action.Grid.neighbor
+    distance[cell*cells + other] - Manhattan distance between two cells
+    sid[(cell*2 + carrying)*context + other*other_stride + (flags & flag_mask)] - RL state id of an agent
+        The context holds what the space observes besides the agent itself: the cell of the other agent
+        if it observes it, the block flags if it observes them
+    """
+    def __init__(self, grid, space, flags):
+        cells = grid.cells
+        actions = len(ACTIONS)
+        self.cells = cells
+        self.move_mask = [grid.blocked_mask[cell].get(other, grid.border_mask[cell])
+                          for cell in range(cells) for other in range(cells)]
+        self.neighbor = [n for row in grid.neighbor for n in row]
+        coords = np.array(grid.cell_loc)
+        self.distance = np.abs(coords[:, None, :] - coords[None, :, :]).sum(axis=2).reshape(-1).tolist()
+
+        others = cells if space.observes_other else 1
+        masks = 1 << flags if space.observes_blocks else 1
+        self.other_stride = masks if space.observes_other else 0
+        self.flag_mask = masks - 1
+        self.context = others*masks
+        prefix, other, mask = np.meshgrid(np.arange(2*cells), np.arange(others), np.arange(masks), indexing='ij')
+        prefix, other, mask = prefix.reshape(-1), other.reshape(-1), mask.reshape(-1)
+        cell = prefix // 2
+        if not space.observes_other:
+            # any other cell, the space ignores it
+            other = (cell + 1) % cells
+        bits = (mask[:, None] >> np.arange(flags)[::-1]) & 1
+        drops = len(space.layout.dropoffs)
+        drop_blocks = np.where(bits[:, :drops] == 1, 0, space.layout.dropoff_capacity)
+        pick_blocks = bits[:, drops:]
+        ids = space.map_states(coords[cell], prefix % 2, coords[other], drop_blocks, pick_blocks)
+        # ids of every (cell, carrying) pair in each context, for extracting Q-tables
+        self.positions = np.asarray(ids).reshape(2*cells, self.context)
+        self.sid = self.positions.reshape(-1).tolist()
+
+def state_representation(grid, cell, car, blocks, world):
+    """
+    returns StateSpace.get_state_representation() of the world of the fast engine
+    """
+    return (list(grid.cell_loc[cell[AGENT_F]]) + list(grid.cell_loc[cell[AGENT_M]]) + [car & 1, car >> 1 & 1]
+            + [blocks[c] for c in world.drops] + [blocks[c] for c in world.picks])
+
+def check_options(args):
+    """
+    raises ValueError if args hold options the fast engine does not support
+    Arguments missing from args take their default value, so the namespaces of check_golden.py and benchmark.py
+    can be checked as well
+    """
+    options = [option for name, option in UNSUPPORTED if getattr(args, name, None)]
+    table_backend = getattr(args, 'table_backend', 'dense64')
+    if table_backend not in TYPECODES:
+        options.append(f'--table {table_backend}')
+    if options:
+        raise ValueError(f"the fast engine does not support {', '.join(options)}")
+
+def experiment(args):
+    """
+    Implements the event loop of main.experiment on integer-encoded state
+    The world is one cell number per agent, a bitfield of the carrying flags, a list of block counts and
+    the block flags of MSpace; moves, applicability and RL state ids are read from the precomputed tables
+    of a Kernel, and each Q-table is a flat array of floats indexed by state*actions + action.
+
+    Every step takes the same random draws and floating-point operations as the reference loop, so for a given
+    seed the actions, rewards, Q-tables and output files are identical (see goldenTrace.py).
+    It takes the arguments of main.experiment, except those rejected by check_options
+    returns the number of moves performed
+    """
+    # Parse argument options
+    id = args.experiment
+    seed = args.seed
+    produce_history = args.produce_history
+    dump_table = args.dump_tables
+    steps = args.steps
+    layouts = load_layouts(args.layout, args.grid)
+    table_backend = args.table_backend
+    schedule = get_schedule(id, args.schedule)
+    trace = args.trace
+
+    print(f"\n### Experiment {id} running with seed {seed} ###\n")
+
+    # layout the world is reset to after a terminal state
+    layout = schedule.layout
+
+    # RL state space, compacted to the reachable states as by main.experiment
+    RLW = make_space(args.rl_type, layouts, args.full_tables)
+
+    g = grid(layouts['original'].size)
+    worlds = {name: FastLayout(l, g) for name, l in layouts.items()}
+    original = layouts['original']
+    kernel = Kernel(g, RLW, len(original.dropoffs) + len(original.pickups))
+    cells = kernel.cells
+    move_mask = kernel.move_mask
+    neighbor = kernel.neighbor
+    distance = kernel.distance
+    sid = kernel.sid
+    context = kernel.context
+    other_stride = kernel.other_stride
+    flag_mask = kernel.flag_mask
+    A = len(ACTIONS)
+    AGENT_BIT = [1, 2]
+
+    # the world: cell of each agent, carrying bitfield, blocks of every cell, block flags and full Dropoff cells
+    # of the current layout, whose Dropoff capacity may differ from that of the others
+    world = worlds[layout]
+    capacity = world.capacity
+    cell = list(world.start)
+    car = 0
+    blocks = list(world.blocks)
+    cell_type = list(world.cell_type)
+    cost = list(world.cost)
+    flag = list(world.flag)
+    flags = world.flags
+    nfull = 0
+    ndrops = len(world.drops)
+
+    # flat Q-tables, and (states, actions) NumPy views of them for dumps and traces
+    states = RLW.states()
+    typecode = TYPECODES[table_backend]
+    Q = [array(typecode, bytes(array(typecode).itemsize*states*A)) for _ in AGENTS]
+    views = [np.frombuffer(q, dtype=np.float64 if typecode == 'd' else np.float32).reshape(states, A) for q in Q]
+
+    # agents: random streams, policy and learning codes, hyperparameters and ring buffers of the last steps
+    streams = spawn_streams(seed)
+    tie_rngs = spawn_tie_rngs(seed)
+    pol = [POLICY_CODES[schedule.policy]]*2
+    learn = [LEARNING_CODES[schedule.learning]]*2
+    alpha = [schedule.alpha]*2
+    gamma = [schedule.gamma]*2
+    hist_state = []
+    hist_action = [[None]*HISTORY for _ in AGENTS]
+    hist_reward = [[0]*HISTORY for _ in AGENTS]
+    head = [0, 0]
+    length = [1, 1]
+    for a in (AGENT_F, AGENT_M):
+        carrying = 1 if car & AGENT_BIT[a] else 0
+        hist_state.append([sid[(cell[a]*2 + carrying)*context + cell[1 - a]*other_stride + (flags & flag_mask)]]
+                          + [0]*(HISTORY - 1))
+
+    outputs = RunOutputs(args, 2*cells)
+    stepLog = outputs.stepLog
+    tables = outputs.tables
+    tracer = outputs.tracer
+
+    terminal = 0
+    n = 0
+    numActions = 0
+    cur = AGENT_F
+
+    # MAIN EVENT LOOP, step for step the loop of main.experiment
+    try:
+        while True:
+            a = cur
+            o = 1 - a
+            bit = AGENT_BIT[a]
+            c = cell[a]
+            oc = cell[o]
+            carrying = 1 if car & bit else 0
+            rng = streams[a]
+            q = Q[a]
+
+            # applicable actions
+            mask = move_mask[c*cells + oc]
+            if carrying:
+                if cell_type[c] == DROPOFF and blocks[c] < capacity:
+                    mask |= 2
+            elif cell_type[c] == PICKUP and blocks[c] > 0:
+                mask |= 1
+
+            # choose action, PExploit drawing before Pickup and Dropoff are checked as PExploit.exploit does
+            policy = pol[a]
+            if policy == P_EXPLOIT:
+                policy = P_RANDOM if rng.random() >= 0.85 else P_GREEDY
+            if mask & 1:
+                action = ACT_PICKUP
+            elif mask & 2:
+                action = ACT_DROPOFF
+            elif policy == P_RANDOM:
+                action = rng.choice(MASK_ACTIONS[mask])
+            else:
+                base = sid[(c*2 + carrying)*context + oc*other_stride + (flags & flag_mask)]*A
+                action = -1
+                best = ties = 0
+                for x in MASK_ACTIONS[mask]:
+                    v = q[base + x]
+                    if action < 0 or v > best:
+                        action, best, ties = x, v, 1
+                    elif v == best:
+                        ties += 1
+                if ties > 1:
+                    k = rng.integer(ties)
+                    for x in MASK_ACTIONS[mask]:
+                        if q[base + x] == best:
+                            if k == 0:
+                                action = x
+                                break
+                            k -= 1
+            hist_action[a][head[a]] = action
+
+            # perform action, which is always applicable
+            if action == ACT_PICKUP:
+                reward = 14
+                b = blocks[c] - 1
+                blocks[c] = b
+                if b == 0:
+                    flags ^= flag[c]
+                car |= bit
+                carrying = 1
+            elif action == ACT_DROPOFF:
+                reward = 14
+                b = blocks[c] + 1
+                blocks[c] = b
+                if b == capacity:
+                    flags ^= flag[c]
+                    nfull += 1
+                car ^= bit
+                carrying = 0
+            else:
+                reward = cost[c]
+                c = neighbor[c*A + action]
+                cell[a] = c
+            numActions += 1
+
+            # update qtable
+            s = sid[(c*2 + carrying)*context + oc*other_stride + (flags & flag_mask)]
+            hs = hist_state[a]
+            hr = hist_reward[a]
+            prev = head[a]
+            h = prev + 1 if prev < HISTORY - 1 else 0
+            head[a] = h
+            hs[h] = s
+            ha = hist_action[a]
+            ha[h] = None
+            hr[h] = 0
+            hr[prev] = reward
+            if length[a] < HISTORY:
+                length[a] += 1
+            if learn[a] == QL:
+                mask = move_mask[c*cells + oc]
+                if carrying:
+                    if cell_type[c] == DROPOFF and blocks[c] < capacity:
+                        mask |= 2
+                elif cell_type[c] == PICKUP and blocks[c] > 0:
+                    mask |= 1
+                best = None
+                base = s*A
+                for x in MASK_ACTIONS[mask]:
+                    v = q[base + x]
+                    if best is None or v > best:
+                        best = v
+                if best is None:
+                    best = -2**32
+                i = hs[prev]*A + action
+                q[i] = (1-alpha[a])*q[i] + alpha[a]*(reward + gamma[a]*best)
+            elif length[a] > 2:
+                first = prev - 1 if prev else HISTORY - 1
+                i = hs[first]*A + ha[first]
+                q[i] = (1-alpha[a])*q[i] + alpha[a]*(hr[first] + gamma[a]*q[hs[prev]*A + action])
+
+            # record the step, and periodically the Q-tables, in the golden trace
+            if trace:
+                tracer.step(a, action, reward, state_representation(g, cell, car, blocks, world))
+                if tracer.tables_due():
+                    tracer.tables(views)
+
+            # dump qtable
+            if dump_table:
+                dump = tables[a]
+                if dump.due():
+                    ids = kernel.positions[:, oc*other_stride + (flags & flag_mask)]
+                    dump.append(extract_rows(views[a][ids], tie_rngs[a]))
+                else:
+                    dump.skip()
+            if dump_table and nfull == 1:
+                outputs.first_dropoff_filled(n+1)
+
+            # Store reward, distance between agents and moving agent for analytics
+            complete = nfull == ndrops
+            if produce_history:
+                stepLog.append((n+1, a, action, reward, distance[cell[AGENT_F]*cells + cell[AGENT_M]], terminal, complete))
+
+            # check completion criterion
+            cur = o
+            if complete:
+                terminal += 1
+                outputs.terminal_reached(n+1, terminal, numActions)
+                numActions = 0
+                effects = schedule.at_terminal(terminal)
+                if effects:
+                    apply_schedule(effects, pol, learn, alpha, gamma)
+                    if 'layout' in effects and effects['layout'] != layout:
+                        layout = effects['layout']
+                        print(f"Switching to the {layout} layout\n")
+                    if effects.get('stop'):
+                        outputs.stopped(terminal)
+                        n += 1
+                        break
+                # reset the world, F moving first
+                world = worlds[layout]
+                cell[:] = world.start
+                car = 0
+                blocks[:] = world.blocks
+                cell_type[:] = world.cell_type
+                cost[:] = world.cost
+                flag[:] = world.flag
+                flags = world.flags
+                nfull = 0
+                ndrops = len(world.drops)
+                capacity = world.capacity
+                cur = AGENT_F
+            # Provide progress updates of the world periodically to stdout
+            if n % (250-1) == 0:
+                print(state_representation(g, cell, car, blocks, world))
+
+            n += 1
+
+            if n == schedule.next_step:
+                effects = schedule.advance()
+                apply_schedule(effects, pol, learn, alpha, gamma)
+                layout = effects.get('layout', layout)
+
+            # stop after the requested number of moves (10,000 by default)
+            if n == steps:
+                outputs.steps_reached(n-1, terminal)
+                break
+    finally:
+        outputs.close()
+
+    outputs.export()
+
+    print(f"Q-table memory ({table_backend}, fast engine): F {views[AGENT_F].nbytes} bytes, M {views[AGENT_M].nbytes} bytes")
+    outputs.stop_profile()
+    return n
+
+def apply_schedule(effects, pol, learn, alpha, gamma):
+    """
+    Apply the policy, learning and hyperparameter effects of a schedule event to the codes of both agents
+    An agent keeps drawing from its own random stream whatever its policy, as in main.apply_schedule
+    """
+    for a in (AGENT_F, AGENT_M):
+        if 'policy' in effects:
+            pol[a] = POLICY_CODES[effects['policy']]
+        if 'learning' in effects:
+            learn[a] = LEARNING_CODES[effects['learning']]
+        if 'alpha' in effects:
+            alpha[a] = effects['alpha']
+        if 'gamma' in effects:
+            gamma[a] = effects['gamma']
@@ -1,4 +1,9 @@
 import os
+import io
+import shutil
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from main import experiment
 
 SEED1 = 1
@@ -8,13 +13,69 @@ class Args():
     """
     To mimic the argparse library, this stub code is used
     """
-    def __init__(self, experiment, seed, rl_type, csv_filename):
+    def __init__(self, experiment, seed, rl_type, csv_filename, out_dir='out'):
         self.experiment = experiment
         self.seed = seed
         self.rl_type = rl_type
         self.produce_history = True
+        self.export = True
         self.dump_tables = False
+        self.dump_stride = 1
+        self.dump_on_change = False
         self.vizFile = csv_filename
+        self.steps = 10000
+        self.outDir = out_dir
+        self.layout = None
+        self.grid = None
+        self.instrument = False
+        self.profile = False
+        self.full_tables = False
+        self.table_backend = 'dense64'
+        self.checkpoint_every = None
+        self.checkpoint = None
+        self.resume = False
+        self.schedule = None
+        self.trace = None
+        self.trace_every = 100
+        self.engine = 'reference'
+        self.transition_cache = None
+
+def sweep():
+    """
+    returns the (index, experiment, seed, rl_type) of every run in the sweep
+    The index determines the name of the CSV files the run produces
+    """
+    runs = []
+    for rl_type in ['ss', 'vs', 'ms']:
+        for exp in ['1a', '1b', '1c', '2', '3a', '3b', '4']:
+            for seed in [SEED1, SEED2]:
+                runs.append((len(runs), exp, seed, rl_type))
+    return runs
+
+def run(i, exp, seed, rl_type):
+    """
+    Runs a single experiment of the sweep in its own directory out/runs/i
+    so that runs executing at the same time never share output files
+    returns the directory and everything the run printed
+    """
+    run_dir = os.path.join('out', 'runs', str(i))
+    os.makedirs(run_dir, exist_ok=True)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        print('-'*80)
+        print(f'{i}: {exp} - {seed} - {rl_type}')
+        print('-'*80)
+        experiment(Args(exp, seed, rl_type, os.path.join(run_dir, 'visualization.csv'), run_dir))
+    return run_dir, log.getvalue()
+
+def collect(i, run_dir):
+    """
+    Moves the CSV files of run i to the names expected by the Jupyter Notebook
+    """
+    suffix = '' if i == 0 else str(i)
+    os.replace(os.path.join(run_dir, 'visualization.csv'), f'out/visualization{suffix}.csv')
+    os.replace(os.path.join(run_dir, 'terminal_states'), f'out/terminal_states{suffix}.csv')
+    shutil.rmtree(run_dir)
 
 def main():
     """
@@ -22,24 +83,30 @@ def main():
     Runs the full suite of experiments for our chosen RL state space models and seeds
     CSV files of reward histories, L1 agent distances, and the terminal states are produced
     These are processed in the included Jupyter Notebook file
+
+    Runs are spread across a process pool; every run is deterministic for its seed,
+    so the files are identical to those of a sequential sweep
     """
-    i = 0
-    for rl_type in ['ss', 'vs', 'ms']:
-        for exp in ['1a', '1b', '1c', '2', '3a', '3b', '4']:        
-            for seed in [SEED1, SEED2]:            
-                viz_file = f'out/viz_{exp}_{seed}_{rl_type}.csv'
-                args = Args(exp, seed, rl_type, viz_file)
-                print('-'*80)
-                print(f'{i}: {exp} - {seed} - {rl_type}')
-                print('-'*80)
-                experiment(args)
-                if i == 0:
-                    os.rename(viz_file, f'out/visualization.csv')
-                    os.rename('out/terminal_states', f'out/terminal_states.csv')
-                else:
-                    os.rename(viz_file, f'out/visualization{i}.csv')
-                    os.rename('out/terminal_states', f'out/terminal_states{i}.csv')
-                i += 1
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-j", "--jobs",
+        dest="jobs",
+        help="Number of experiments run at the same time, 1 runs them sequentially",
+        required=False,
+        type=int,
+        default=os.cpu_count())
+    args = arg_parser.parse_args()
+
+    runs = sweep()
+    if args.jobs == 1:
+        results = [run(*r) for r in runs]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(run, *zip(*runs)))
+
+    for (i, _, _, _), (run_dir, log) in zip(runs, results):
+        print(log, end='')
+        collect(i, run_dir)
+    os.rmdir(os.path.join('out', 'runs'))
 
 if __name__=='__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,142 @@
+import os
+import json
+import zlib
+from array import array
+import numpy as np
+from action import ACTIONS
+from cell import AGENTS
+
+# Dtype of a recorded step: the moving agent, its action, the reward and the hash of the world after the action
+STEP_DTYPE = np.dtype([('agent', np.uint8), ('action', np.uint8), ('reward', np.int16), ('world', np.uint32)])
+# Dtype of a Q-table checksum record: the step after which the tables were summed and the checksum of each agent
+TABLE_DTYPE = np.dtype([('step', np.int64), ('F', np.uint32), ('M', np.uint32)])
+# Number of steps between Q-table checksums
+TABLE_EVERY = 100
+# Number of steps recorded before they are appended to the trace arrays
+CHUNK = 4096
+# Number of steps before a divergence shown in its report
+CONTEXT = 5
+
+def world_hash(state):
+    """
+    returns the CRC32 of a world given as StateSpace.get_state_representation(),
+    which depends on nothing but the state itself, so any engine producing that list can be compared
+    """
+    return zlib.crc32(array('i', state))
+
+def table_checksum(rows):
+    """
+    returns the CRC32 of the Q values of a (states, actions) array, taken as float64
+    """
+    return zlib.crc32(np.ascontiguousarray(rows, dtype=np.float64))
+
+class TraceRecorder:
+    """
+    Records the canonical trace of an experiment: every step, and the Q-table checksums of both agents
+    every table_every steps. The event loop of an engine calls step after every Q-table update,
+    and tables whenever tables_due returns True.
+
+    Arguments:
+    path - the .npz file the trace is written to by close
+    table_every - number of steps between Q-table checksums
+    meta - dict describing the run (experiment, seed, rl_type, ...), stored with the trace
+
+    API:
+    step - records the agent that moved, its action, the reward and the world after the action
+    tables_due - returns True if the Q-tables should be checksummed after the current step
+    tables - records the checksums of the Q-tables of both agents, given as (states, actions) arrays
+    close - writes the trace to path
+    """
+    def __init__(self, path, table_every=TABLE_EVERY, meta=None):
+        self.path = path
+        self.table_every = table_every
+        self.meta = dict(meta or {}, table_every=table_every)
+        self.count = 0
+        self.chunk = np.zeros(CHUNK, dtype=STEP_DTYPE)
+        self.chunks = []
+        self.checksums = []
+
+    def step(self, agent, action, reward, state):
+        i = self.count % CHUNK
+        self.chunk[i] = (agent, action, reward, world_hash(state))
+        self.count += 1
+        if i == CHUNK - 1:
+            self.chunks.append(self.chunk.copy())
+
+    def tables_due(self):
+        return self.count % self.table_every == 0
+
+    def tables(self, rows):
+        self.checksums.append((self.count,) + tuple(table_checksum(r) for r in rows))
+
+    def close(self):
+        steps = np.concatenate(self.chunks + [self.chunk[:self.count % CHUNK]])
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as f:
+            np.savez(f, steps=steps, tables=np.array(self.checksums, dtype=TABLE_DTYPE),
+                     meta=np.array(json.dumps(self.meta, sort_keys=True)))
+
+def load_trace(path):
+    """
+    returns the trace written by TraceRecorder as {'steps': ..., 'tables': ..., 'meta': dict}
+    """
+    with np.load(path) as data:
+        return {'steps': data['steps'], 'tables': data['tables'], 'meta': json.loads(str(data['meta']))}
+
+def trace_name(experiment, seed, rl_type):
+    return f'{experiment}-{seed}-{rl_type}.npz'
+
+def first_divergence(reference, candidate, context=CONTEXT):
+    """
+    returns None if the candidate trace matches the reference one, and a report of the first divergence otherwise:
+    {'step': 1-based step, 'kind': 'step', 'table' or 'length', 'detail': text, 'context': text}
+    A 'table' divergence is the first Q-table checksum that differs while every step up to it matched,
+    the Q values having drifted somewhere since the previous checksum
+    """
+    ref, cand = reference['steps'], candidate['steps']
+    n = min(len(ref), len(cand))
+    diff = np.flatnonzero(ref[:n] != cand[:n])
+    if len(diff):
+        i = int(diff[0])
+        fields = [f for f in STEP_DTYPE.names if ref[f][i] != cand[f][i]]
+        detail = ', '.join(f'{f} {ref[f][i]} != {cand[f][i]}' for f in fields)
+        return {'step': i + 1, 'kind': 'step', 'detail': detail, 'context': format_context(ref, cand, i, context)}
+
+    ref_tables, cand_tables = reference['tables'], candidate['tables']
+    m = min(len(ref_tables), len(cand_tables))
+    diff = np.flatnonzero(ref_tables[:m] != cand_tables[:m])
+    if len(diff):
+        j = int(diff[0])
+        step = int(ref_tables['step'][j])
+        agents = [a for a in ('F', 'M') if ref_tables[a][j] != cand_tables[a][j]]
+        since = int(ref_tables['step'][j - 1]) if j else 0
+        detail = f"Q-table checksum of {' and '.join(agents)} differs, tables last matched after step {since}"
+        return {'step': step, 'kind': 'table', 'detail': detail,
+                'context': format_context(ref, cand, step - 1, context)}
+
+    if len(ref) != len(cand):
+        detail = f'reference has {len(ref)} steps, candidate {len(cand)}'
+        return {'step': n + 1, 'kind': 'length', 'detail': detail, 'context': format_context(ref, cand, n, context)}
+    return None
+
+def format_context(ref, cand, i, context=CONTEXT):
+    """
+    returns the steps of both traces from context steps before index i up to i, side by side
+    """
+    def describe(steps, k):
+        if k >= len(steps):
+            return '-'
+        s = steps[k]
+        return f"{AGENTS[s['agent']]} {ACTIONS[s['action']]:<7} {s['reward']:>4} {s['world']:08x}"
+    lines = [f"{'step':>7}  {'reference':<27}  {'candidate':<27}"]
+    for k in range(max(0, i - context), i + 1):
+        mark = '>' if k == i else ' '
+        lines.append(f"{mark}{k + 1:>6}  {describe(ref, k):<27}  {describe(cand, k):<27}")
+    return '\n'.join(lines)
+
+def format_divergence(name, divergence):
+    if divergence is None:
+        return f'{name}: identical'
+    return (f"{name}: diverges at step {divergence['step']} ({divergence['kind']}): {divergence['detail']}\n"
+            f"{divergence['context']}")
@@ -0,0 +1,124 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+from action import ACTIONS
+
+# Phases of an iteration of the event loop, in loop order
+PHASES = ['choose_action', 'instrumentation', 'perform_action', 'update', 'dump_table', 'history',
+          'is_complete', 'print', 'schedule', 'checkpoint']
+COUNTERS = ['steps', 'applicability_checks', 'moves', 'adjacent_steps', 'pickups', 'dropoffs', 'terminal_resets']
+# counter of each action code
+STEP_COUNTER = ['pickups', 'dropoffs'] + ['moves']*(len(ACTIONS) - 2)
+
+class Instrument:
+    """
+    Cumulative timings and counters of the phases of the experiment event loop.
+    The loop only calls into this object when instrumentation is switched on, so it costs nothing otherwise.
+
+    API:
+    start - starts the loop clock, returns the time the first phase starts at
+    lap - adds the time since the previous lap to a phase, returns the current time
+    stop - stops the loop clock
+    attach - counts the applicability checks of a StateSpace object
+    count_step - counts the kind of the action an agent is about to take
+    count - adds to a counter
+    summary - returns a table of the timings and counters
+    write_json - writes the timings and counters to a JSON file
+    """
+    def __init__(self):
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.loop_seconds = 0.0
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        return self.started
+
+    def lap(self, phase, since):
+        now = time.perf_counter()
+        self.timings[phase] += now - since
+        return now
+
+    def stop(self):
+        self.loop_seconds = time.perf_counter() - self.started
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def attach(self, state):
+        """
+        counts every call of state.applicable_mask
+        This is done by switching the object to a subclass overriding the method, so worlds not attached
+        are not slowed down; StateSpace has __slots__, so the method cannot be shadowed on the object itself
+        """
+        counters = self.counters
+        class Counted(type(state)):
+            __slots__ = ()
+            def applicable_mask(self, agent):
+                counters['applicability_checks'] += 1
+                return super().applicable_mask(agent)
+        state.__class__ = Counted
+
+    def count_step(self, state, agent, action):
+        """
+        counts a step, the kind of action agent is about to take in state,
+        and whether the other agent is in a cell adjacent to agent's, blocking one of its moves
+        """
+        counters = self.counters
+        counters['steps'] += 1
+        counters[STEP_COUNTER[action]] += 1
+        if state.cell[1 - agent] in state.grid.blocking[state.cell[agent]]:
+            counters['adjacent_steps'] += 1
+
+    def to_dict(self):
+        total = self.loop_seconds or 1.0
+        steps = self.counters['steps'] or 1
+        return {
+            'loop_seconds': self.loop_seconds,
+            'phases': {phase: {'seconds': seconds,
+                               'share': seconds / total,
+                               'us_per_step': seconds / steps * 1e6}
+                       for phase, seconds in self.timings.items()},
+            'unaccounted_seconds': self.loop_seconds - sum(self.timings.values()),
+            'counters': dict(self.counters),
+        }
+
+    def summary(self):
+        data = self.to_dict()
+        lines = [f"{'phase':<18}{'seconds':>10}{'share':>8}{'us/step':>10}"]
+        for phase, t in data['phases'].items():
+            lines.append(f"{phase:<18}{t['seconds']:>10.4f}{t['share']:>8.1%}{t['us_per_step']:>10.2f}")
+        lines.append(f"{'unaccounted':<18}{data['unaccounted_seconds']:>10.4f}")
+        lines.append(f"{'loop':<18}{data['loop_seconds']:>10.4f}")
+        lines.append('')
+        for counter, value in data['counters'].items():
+            lines.append(f"{counter:<22}{value:>10}")
+        return '\n'.join(lines)
+
+    def write_json(self, path, **meta):
+        """
+        writes the timings and counters to a JSON file, together with the keyword arguments given
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, **self.to_dict()), f, indent=2)
+
+def start_profile():
+    """
+    returns a running cProfile.Profile
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def stop_profile(profiler, path, top=20):
+    """
+    stops profiler, writes its pstats file to path and returns the top functions by cumulative time as text
+    """
+    profiler.disable()
+    profiler.dump_stats(path)
+    text = io.StringIO()
+    pstats.Stats(path, stream=text).sort_stats('cumulative').print_stats(top)
+    return text.getvalue()
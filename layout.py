@@ -0,0 +1,116 @@
+import json
+from cell import PICKUP_BLOCKS, DROPOFF_CAPACITY
+
+class Layout:
+    """
+    Configuration of a world, from which StateSpace, the Action tables and the RL spaces derive their shapes.
+
+    Arguments:
+    name - name of the layout
+    size - (X,Y,Z) dimensions of the grid
+    start - dict of the (x,y,z) start coordinates of agent 'F' and agent 'M'
+    pickups - list of (x,y,z) coordinates of each Pickup cell
+    dropoffs - list of (x,y,z) coordinates of each Dropoff cell
+    risks - list of (x,y,z) coordinates of each Risk cell
+    pickup_blocks - number of blocks a Pickup cell starts with
+    dropoff_capacity - number of blocks that fill a Dropoff cell
+    """
+    def __init__(self, name, size, start, pickups, dropoffs, risks,
+                 pickup_blocks=PICKUP_BLOCKS, dropoff_capacity=DROPOFF_CAPACITY):
+        self.name = name
+        self.size = tuple(size)
+        self.start = {agent: tuple(loc) for agent, loc in start.items()}
+        self.pickups = [tuple(loc) for loc in pickups]
+        self.dropoffs = [tuple(loc) for loc in dropoffs]
+        self.risks = [tuple(loc) for loc in risks]
+        self.pickup_blocks = pickup_blocks
+        self.dropoff_capacity = dropoff_capacity
+        self._validate()
+
+    def _validate(self):
+        cells = [self.start['F'], self.start['M']] + self.pickups + self.dropoffs + self.risks
+        for loc in cells:
+            if len(loc) != 3 or not all(0 <= c < n for c, n in zip(loc, self.size)):
+                raise ValueError(f'layout {self.name}: {loc} is outside the {self.size} grid')
+        special = self.pickups + self.dropoffs + self.risks
+        if len(set(special)) != len(special):
+            raise ValueError(f'layout {self.name}: a cell has more than one type')
+        if self.start['F'] == self.start['M']:
+            raise ValueError(f'layout {self.name}: both agents start in the same cell')
+        if not self.pickups or not self.dropoffs:
+            raise ValueError(f'layout {self.name}: at least one Pickup and one Dropoff cell are needed')
+
+    def __deepcopy__(self, memo):
+        # layouts are never changed once built, copies of a world share them
+        return self
+
+    def to_dict(self):
+        return {'size': list(self.size),
+                'start': {agent: list(loc) for agent, loc in self.start.items()},
+                'pickups': [list(loc) for loc in self.pickups],
+                'dropoffs': [list(loc) for loc in self.dropoffs],
+                'risks': [list(loc) for loc in self.risks],
+                'pickup_blocks': self.pickup_blocks,
+                'dropoff_capacity': self.dropoff_capacity}
+
+    def scaled(self, n):
+        """
+        returns this layout stretched to an n×n×n grid
+        Every coordinate c of the X×Y×Z grid moves to round(c*(n-1)/(X-1)), so special cells keep
+        their relative positions; n must be at least the largest dimension so that no two cells merge
+        """
+        if n < max(self.size):
+            raise ValueError(f'layout {self.name} cannot be scaled below {max(self.size)} cells per side')
+        def move(loc):
+            return tuple(round(c*(n - 1)/(m - 1)) if m > 1 else 0 for c, m in zip(loc, self.size))
+        return Layout(f'{self.name}-{n}', (n, n, n),
+                      {agent: move(loc) for agent, loc in self.start.items()},
+                      [move(loc) for loc in self.pickups],
+                      [move(loc) for loc in self.dropoffs],
+                      [move(loc) for loc in self.risks],
+                      self.pickup_blocks, self.dropoff_capacity)
+
+# The world of the experiments, 'modified' being the Pickup cells used by experiment 4 after its 3rd terminal state
+LAYOUTS = {
+    'original': Layout('original', (3, 3, 3), {'F': (0, 0, 0), 'M': (2, 1, 2)},
+                       pickups=[(1, 1, 0), (2, 2, 1)],
+                       dropoffs=[(0, 0, 1), (0, 0, 2), (2, 0, 0), (2, 1, 2)],
+                       risks=[(1, 1, 1), (2, 1, 0)]),
+    'modified': Layout('modified', (3, 3, 3), {'F': (0, 0, 0), 'M': (2, 1, 2)},
+                       pickups=[(0, 2, 0), (1, 2, 2)],
+                       dropoffs=[(0, 0, 1), (0, 0, 2), (2, 0, 0), (2, 1, 2)],
+                       risks=[(1, 1, 1), (2, 1, 0)]),
+}
+
+def get_layout(layout):
+    """
+    returns the Layout object of a preset name, or layout itself if it already is one
+    """
+    if isinstance(layout, Layout):
+        return layout
+    return LAYOUTS[layout]
+
+def load_layouts(path=None, grid=None):
+    """
+    returns the dict {'original': Layout, 'modified': Layout} the experiments run on
+
+    arguments:
+    path - JSON file with an "original" layout object and optionally a "modified" one, in the form of
+        Layout.to_dict; a missing "modified" layout is the same as the "original" one
+        the presets are used if None
+    grid - if given, both layouts are scaled to a grid×grid×grid world
+    """
+    if path is None:
+        layouts = dict(LAYOUTS)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        layouts = {name: Layout(name, **config[name]) for name in ('original', 'modified') if name in config}
+        layouts.setdefault('modified', layouts['original'])
+    if grid is not None:
+        layouts = {name: layout.scaled(grid) for name, layout in layouts.items()}
+    if layouts['original'].size != layouts['modified'].size or \
+            len(layouts['original'].pickups) != len(layouts['modified'].pickups) or \
+            len(layouts['original'].dropoffs) != len(layouts['modified'].dropoffs):
+        raise ValueError('the original and modified layouts must share the grid and the number of Pickup and Dropoff cells')
+    return layouts
@@ -1,12 +1,21 @@
 from queue import Queue
 from stateSpace import StateSpace
-from action import Action
+from action import ACTIONS
+from cell import AGENT_F, AGENT_M
 from agent import Agent
-from rlw import VSSpace, SSSpace, MSpace
-from policy import PGreedy, PExploit, PRandom
+from policy import POLICIES
+from randomStream import spawn_streams
+from recorder import RunOutputs
+from layout import load_layouts
+from reachability import make_space
+from instrument import Instrument
+from checkpoint import save_checkpoint, load_checkpoint, check_config
+from schedule import get_schedule
+from transitionCache import TransitionCache, CachedWorld, CachedSpace
+import fastEngine
+import numpy as np
 import argparse
-import copy
-import csv
+import os
 
 # Manhattan
 def distance(locF, locM):
@@ -14,165 +23,148 @@ def distance(locF, locM):
             + abs(locF[1] - locM[1])
             + abs(locF[2] - locM[2]))
 
-def write_actions(agentFActions, agentMActions, id, seed, rewardList, distList, vizFile, movingAgent):
+def apply_schedule(effects, agents, streams, RLW, actions, seed):
     """
-    Write agent history and other performance metrics to files
-    These are used for analysis and for offline visualization
-    This is run at the end of simulation when the --history
-    flag is supplied
+    Apply the policy, learning and hyperparameter effects of a schedule event to both agents
+    The layout and stop effects concern the event loop, which handles them itself
     """
-    with open('out/f_actions', 'w', encoding="utf-8") as f:
-        for action in agentFActions:
-            f.write('%s\n' % action)
-    with open('out/m_actions', 'w', encoding="utf-8") as f:
-        for action in agentMActions:
-            f.write('%s\n' % action)
-    with open('out/experiment_id', 'w', encoding="utf-8") as f:
-        f.write(id)
-    with open('out/experiment_seed', 'w', encoding="utf-8") as f:
-        f.write(seed)
-    with open(vizFile, 'w', newline='',encoding="utf-8") as f:
-        write = csv.writer(f)
-        for i, (rewards, distance, agent) in enumerate(zip(rewardList, distList, movingAgent)):
-            write.writerow([i+1, rewards, distance, agent])
-
-def write_terminal_states(terminal_states):
-    """
-    Write a CSV file containing the terminal state times
-    These are used for analysis of performance
-    This is run at the end of simulation when the --history
-    flag is supplied
-    """
-    with open('out/terminal_states', 'w', encoding="utf-8") as f:
-        write = csv.writer(f, delimiter=',')
-        write.writerow(['Steps'])
-        for s in terminal_states:
-            write.writerow([s])
-
-def write_table(agentFtable, agentMtable):
-    """
-    Write the entire Q-table for each agent to file
-    This is used for the offline visualization of the entire run
-    This is called appropriately at the end of the simulation
-    when the --dump-tables option is supplied
-    """
-    with open('out/f_table.txt', 'w', encoding="utf-8") as f:
-        for table in agentFtable:
-            f.write('%s\n' % str(table))
-    with open('out/m_table.txt', 'w', encoding="utf-8") as f:
-        for table in agentMtable:
-            f.write('%s\n' % str(table))
-
-def write_report_timing(timings):
-    """
-    Write the timesteps for report Q-table dumps
-    This is used for providing visualizations for the report
-    This is called appropriately in the simulation
-    when the --report option is supplied
-    """
-    with open(f'out/report_timings.txt', 'w', encoding='utf-8') as f:
-        for t in timings:
-            f.write(str(t) + '\n')
+    for agent in agents:
+        if 'policy' in effects:
+            agent.set_policy(POLICIES[effects['policy']](agent.agent, RLW, actions, seed=seed, stream=streams[agent.agent]))
+        if 'learning' in effects:
+            agent.set_learning(effects['learning'])
+        if 'alpha' in effects:
+            agent.alpha = effects['alpha']
+        if 'gamma' in effects:
+            agent.gamma = effects['gamma']
 
 def reload_queue(q):
     # empty queue and load F first then M
     q.get()
-    q.put('F')
-    q.put('M')
+    q.put(AGENT_F)
+    q.put(AGENT_M)
 
 def experiment(args):
     """
     Implements the event loop for experiments
     argparse object args has the following parameters:
-    id - '1a', '1b', '1c', '2', '3a', '3b', '4'
+    id - '1a', '1b', '1c', '2', '3a', '3b', '4', or an experiment of the schedule file
     seed - seed value for reproducibility
-    produce_history - whether to write agent history/analytics to file
+    produce_history - whether to write agent history/analytics to the step log (see stepLog.py)
+    export - whether to also write the text and CSV history files generated from the step log at the end of the run
     dump_table - whether to dump complete agent Q-table history to file
+    dump_stride - dump the Q-table only every dump_stride-th step of an agent
+    dump_on_change - dump the Q-table of an agent only when it changed
     rl_type - type of RL state space to use (options: 'vs', 'c2', 'ss')
-    vizFile - filename for providing analytics
+    vizFile - filename of the visualization CSV exported for analytics
+    steps - number of moves after which the experiment stops
+    outDir - directory the history and Q-table files are written to
+    layout - JSON file of the layouts to use instead of the presets (see layout.load_layouts)
+    grid - size N of an N×N×N grid the layouts are scaled to
+    instrument - whether to time the phases of the event loop and count its events
+    profile - whether to run the event loop under cProfile
+    full_tables - whether to allocate Q-table rows for every RL state, not only the reachable ones
+    table_backend - storage of the Q-tables, 'dense64', 'dense32' or 'sparse' (see qtable.py)
+    checkpoint_every - write a checkpoint every checkpoint_every moves, never if None
+    checkpoint - checkpoint file, <outDir>/checkpoint.bin if None
+    resume - whether to continue the run saved in the checkpoint file instead of starting over
+    schedule - JSON file of experiment schedules adding to or replacing the presets (see schedule.py)
+    trace - .npz file the golden trace of the run is written to (see goldenTrace.py), none if None
+    trace_every - number of steps between the Q-table checksums of the trace
+    engine - 'reference' for this loop, 'fast' for the integer-kernel loop of fastEngine.py
+    transition_cache - number of transitions of the interned worlds to memoize (see transitionCache.py), none if None
+    returns the number of moves performed
     """
+    if args.engine == 'fast':
+        fastEngine.check_options(args)
+        return fastEngine.experiment(args)
+
     # Parse argument options
     id = args.experiment
     seed = args.seed
     produce_history = args.produce_history
+    export = args.export
     dump_table = args.dump_tables
+    dump_stride = args.dump_stride
+    dump_on_change = args.dump_on_change
     rl_type = args.rl_type
     vizFile = args.vizFile
+    steps = args.steps
+    outDir = args.outDir
+    layouts = load_layouts(args.layout, args.grid)
+    instrument = args.instrument
+    full_tables = args.full_tables
+    table_backend = args.table_backend
+    checkpoint_every = args.checkpoint_every
+    checkpoint = args.checkpoint or os.path.join(outDir, 'checkpoint.bin')
+    resume = args.resume
+    schedule = get_schedule(id, args.schedule)
+    trace = args.trace
+    transition_cache = args.transition_cache
+
+    # everything a resumed run must share with the checkpointed one, steps may be changed to extend a run
+    config = {'experiment': id, 'seed': seed, 'rl_type': rl_type,
+              'layouts': {name: layout.to_dict() for name, layout in layouts.items()},
+              'full_tables': full_tables, 'table_backend': table_backend,
+              'produce_history': produce_history, 'export': export, 'vizFile': vizFile, 'outDir': outDir,
+              'dump_tables': dump_table, 'dump_stride': dump_stride, 'dump_on_change': dump_on_change,
+              'schedule': schedule.definition}
+    saved = None
+    if resume and trace:
+        raise ValueError('a golden trace covers a whole run, it cannot be recorded when resuming')
+    if resume:
+        saved = load_checkpoint(checkpoint)
+        check_config(checkpoint, saved['config'], config)
     
     print(f"\n### Experiment {id} running with seed {seed} ###\n")
     
-    # Setting hyperparameters appropriately
-    alpha = 0.3
-    if id == '1a' or id == '1b' or id == '1c' or id == '2' or id == '4':
-        alpha = 0.3
-    elif id == '3a':
-        alpha = 0.1
-    elif id == '3b':
-        alpha = 0.5
-    gamma = 0.5
-
-    # Setting real world state space object RW
-    RW = StateSpace('original')
-
-    # Setting RL state space object RLW
-    RLW = SSSpace()
-    if rl_type == 'ss':
-        RLW = SSSpace()
-    elif rl_type == 'vs':
-        RLW = VSSpace()
-    elif rl_type == 'ms':
-        RLW = MSpace()
+    # Setting hyperparameters as the schedule of the experiment starts with them
+    alpha = schedule.alpha
+    gamma = schedule.gamma
+
+    # layout the world is reset to after a terminal state
+    layout = schedule.layout
+
+    # Setting real world state space object RW, stepped through a transition cache of interned worlds if asked for
+    cache = None
+    if transition_cache:
+        cache = TransitionCache(layouts[layout], transition_cache)
+        RW = CachedWorld(cache, layouts[layout])
+    else:
+        RW = StateSpace(layouts[layout])
+
+    # Setting RL state space object RLW, only allocating Q-table rows for the RL states the layouts can produce
+    RLW = make_space(rl_type, layouts, full_tables)
+    # Map the interned worlds to RL states once
+    if cache:
+        RLW = CachedSpace(RLW, cache)
     
-    actions = ['Pickup', 'Dropoff', 'N', 'S', 'E', 'W', 'U', 'D']
+    actions = ACTIONS
+
+    # Independent random streams of the agents, which their successive policies keep drawing from
+    streams = spawn_streams(seed)
 
-    # Initialize agents with PRANDOM and appropriate arguments
+    # Initialize agents with the initial policy of the schedule (PRANDOM for the presets) and appropriate arguments
 
-    policyF = PRandom('F', RLW, actions, seed=seed)
-    policyM = PRandom('M', RLW, actions, seed=seed)
+    policyF = POLICIES[schedule.policy](AGENT_F, RLW, actions, seed=seed, stream=streams[AGENT_F])
+    policyM = POLICIES[schedule.policy](AGENT_M, RLW, actions, seed=seed, stream=streams[AGENT_M])
 
-    agentF = Agent('F', RLW, policyF, RW, alpha, gamma)
-    agentM = Agent('M', RLW, policyM, RW, alpha, gamma)
+    agentF = Agent(AGENT_F, RLW, policyF, RW, alpha, gamma, table_backend)
+    agentM = Agent(AGENT_M, RLW, policyM, RW, alpha, gamma, table_backend)
+    # agents by agent code
+    agents = [agentF, agentM]
+    agentF.set_learning(schedule.learning)
+    agentM.set_learning(schedule.learning)
 
     # We utilize a Queue to store the order of the agents
 
     q = Queue(maxsize=2)
-    q.put('F')
-    q.put('M')
-
-    # Here we create some Lists to store the results
-    # from the simulation for offline visualization and analytics
-
-    # stores the rewards obtained for analytics
-    rewardList = []
-
-    # stores the distance between agents for analytics
-    distList = []
-
-    # stores the actions taken by agent 'F'
-    agentFActions = []
-
-    # stores the actions taken by agent 'M'
-    agentMActions = []
-
-    # stores the qtable dumps of agent 'F'
-    agentFtable = []
-
-    # stores the qtable dumps of agent 'M'
-    agentMtable = []
+    q.put(AGENT_F)
+    q.put(AGENT_M)
 
     # number of terminal states reached
     terminal = 0
 
-    # agent that is moving for each iteration (for CSV)
-    movingAgent = []
-
-    # actions required for each terminal state (for performance)
-    terminal_state_actions = []
-
-    # timings for Q-table dumps in the visualization
-    timings = []
-    dropoff_timing_not_written = True
-
     # iteration number
     n = 0
 
@@ -182,6 +174,49 @@ def experiment(args):
     # just terminated flag
     justTerminated = False
 
+    # continue from the state of the checkpointed run
+    if saved:
+        n = saved['n']
+        terminal = saved['terminal']
+        numActions = saved['numActions']
+        layout = saved['layout']
+        schedule.seek(n)
+        while not q.empty():
+            q.get()
+        for a in saved['queue']:
+            q.put(a)
+        world = saved['world']
+        RW.restore((layouts[world[0]],) + world[1:])
+        for agent, data in zip(agents, saved['agents']):
+            agent.restore(data, RW)
+
+    # per-phase timings and event counters of the loop, only touched when instrumenting
+    if instrument:
+        inst = Instrument()
+        inst.attach(RW)
+
+    # Here we open the streams that store the results
+    # from the simulation for offline visualization and analytics:
+    # the step log of the moving agent, action, reward, distance between agents, episode
+    # and completion of every step, the qtable dump files of agent 'F' and agent 'M'
+    # and the canonical trace of the run, to validate other engines against (see goldenTrace.py)
+    # Rows are written to disk in chunks by a background thread,
+    # so memory stays constant however long the simulation runs
+    # A resumed run truncates the streams to where they were at the checkpoint and appends to them
+    outputs = RunOutputs(args, 2*RW.grid.cells, saved['offsets'] if saved else None)
+    stepLog = outputs.stepLog
+    tables = outputs.tables
+    tracer = outputs.tracer
+    if trace:
+        all_states = np.arange(RLW.states())
+    if saved:
+        outputs.timings = saved['timings']
+        outputs.dropoff_timing_not_written = saved['dropoff_timing_not_written']
+        if dump_table:
+            for dump, data in zip(tables, saved['dumps']):
+                dump.restore(data)
+        print(f"Resuming from {checkpoint} after {n} moves\n")
+
     # MAIN EVENT LOOP
     # Briefly, the agent whose turn it is, chooses an action
     # History/analytics objects are updated as appropriate
@@ -189,125 +224,158 @@ def experiment(args):
     # The agent that moved is updated and using this reward performs SARSA/QL
     # Various states are tested, and policies/dropoffs change depending on experiment
     # If the RW indicates that a terminal state is reached, RW is reset
-    # The end result of the experiment is tested and analytic objects
-    # are written to a file as necessary before exiting
-
-    while True:
-        # 'F' or 'M'
-        curAgent = q.get()
-
-        movingAgent.append(curAgent)
-
-        # choose action
-        if curAgent == 'F':
-            action = agentF.choose_action(RW)
-            if produce_history:
-                agentFActions.append(action)
-        elif curAgent == 'M':
-            action = agentM.choose_action(RW)
-            if produce_history:
-                agentMActions.append(action)
-
-        # perform action
-        reward = RW.perform_action(curAgent, action)
-        numActions += 1
-
-        # update qtable
-        if curAgent == 'F':
-            agentF.update(RW, reward)
-        elif curAgent == 'M':
-            agentM.update(RW, reward)
-
-        rewardList.append(reward)
-
-        # dump qtable
-        if dump_table:
-            if curAgent == 'F':
-                agentFtable.append(agentF.extract_table(copy.deepcopy(RW)))
-            elif curAgent == 'M':
-                agentMtable.append(agentM.extract_table(copy.deepcopy(RW)))
-
-        # When the first dropoff is filled, dump qtable
-        if dump_table and RW.is_first_dropoff_filled() and dropoff_timing_not_written:
-            print(f"Recording {n+1} in report timings")
-            timings.append(n+1)
-            dropoff_timing_not_written = False      
-
-        # Store distance between agents after 'M' moves
-        distList.append(distance(RW.locF, RW.locM))
-
-        # check completion criterion
-        if RW.is_complete():
-            justTerminated = True
-            terminal += 1
+    # The end result of the experiment is tested and the history streams
+    # are closed, writing everything still buffered, before exiting
+
+    try:
+        if instrument:
+            t = inst.start()
+        while True:
+            # AGENT_F or AGENT_M
+            curAgent = q.get()
+            agent = agents[curAgent]
+
+            # choose action
+            action = agent.choose_action(RW)
+            if instrument:
+                t = inst.lap('choose_action', t)
+                inst.count_step(RW, curAgent, action)
+                t = inst.lap('instrumentation', t)
+
+            # perform action
+            reward = RW.perform_action(curAgent, action)
+            numActions += 1
+            if instrument:
+                t = inst.lap('perform_action', t)
+
+            # update qtable
+            agent.update(RW, reward)
+            if instrument:
+                t = inst.lap('update', t)
+
+            # record the step, and periodically the Q-tables, in the golden trace
+            if trace:
+                tracer.step(curAgent, action, reward, RW.get_state_representation())
+                if tracer.tables_due():
+                    tracer.tables([a.table.rows(all_states) for a in agents])
+                if instrument:
+                    t = inst.lap('history', t)
+
+            # dump qtable
             if dump_table:
-                print(f"Recording {n+1} in report timings")
-                timings.append(n+1)
-            print(f"Terminal state {terminal} reached after {numActions} actions\n")
-            terminal_state_actions.append(numActions)
-            numActions = 0
-            if id == '4' and (terminal == 1 or terminal == 2):
-                RW = StateSpace('original')
-                reload_queue(q)
-            elif id == '4' and (terminal == 3 or terminal == 4 or terminal == 5):
-                if terminal == 3:
-                    print("Pickup locations modified\n")
-                RW = StateSpace('modified')
+                dump = tables[curAgent]
+                if dump.due():
+                    dump.append(agent.extract_table(RW))
+                else:
+                    dump.skip()
+
+            # When the first dropoff is filled, dump qtable
+            if dump_table and outputs.dropoff_timing_not_written and RW.is_first_dropoff_filled():
+                outputs.first_dropoff_filled(n+1)
+            if instrument:
+                t = inst.lap('dump_table', t)
+
+            # Store the step, reward, distance between agents and moving agent for analytics
+            complete = RW.is_complete()
+            if produce_history:
+                stepLog.append((n+1, curAgent, action, reward, distance(RW.loc[AGENT_F], RW.loc[AGENT_M]),
+                                terminal, complete))
+            if instrument:
+                t = inst.lap('history', t)
+
+            # check completion criterion
+            if complete:
+                justTerminated = True
+                terminal += 1
+                outputs.terminal_reached(n+1, terminal, numActions)
+                numActions = 0
+                # events of the schedule at this terminal state, e.g. experiment 4 modifies the
+                # Pickup locations after its 3rd terminal state and stops at its 6th
+                effects = schedule.at_terminal(terminal)
+                if effects:
+                    apply_schedule(effects, agents, streams, RLW, actions, seed)
+                    if 'layout' in effects and effects['layout'] != layout:
+                        layout = effects['layout']
+                        print(f"Switching to the {layout} layout\n")
+                    if effects.get('stop'):
+                        outputs.stopped(terminal)
+                        n += 1
+                        break
+                RW.reset(layouts[layout])
                 reload_queue(q)
-            elif id == '4' and terminal == 6:
-                print(f"Total number of terminal states reached: {terminal}") # 6
-                if produce_history:
-                    write_actions(agentFActions, agentMActions, id, str(seed), rewardList, distList, vizFile, movingAgent)
-                    write_terminal_states(terminal_state_actions)
-                if dump_table:
-                    #print(agentFtable)
-                    write_table(agentFtable, agentMtable)
+                if instrument:
+                    inst.count('terminal_resets')
+            if instrument:
+                t = inst.lap('is_complete', t)
+            # Provide progress updates of RW periodically to stdout
+            if n % (250-1) == 0:
+                print(RW.get_state_representation())
+            if instrument:
+                t = inst.lap('print', t)
+
+            # This tests if the game was just completed
+
+            if not justTerminated:
+                q.put(curAgent)
+
+            justTerminated = False
+
+            n += 1
+
+            # events of the schedule at this move, e.g. the policy switch after the first 500 moves
+            # of 1b, 1c, 2, 3 & 4, and SARSA learning for the rest of experiment 2
+            if n == schedule.next_step:
+                effects = schedule.advance()
+                apply_schedule(effects, agents, streams, RLW, actions, seed)
+                layout = effects.get('layout', layout)
+            if instrument:
+                t = inst.lap('schedule', t)
+
+            # stop after the requested number of moves (10,000 by default)
+            if n == steps:
+                outputs.steps_reached(n-1, terminal)
                 break
-            elif id != '4':
-                RW = StateSpace('original')
-                reload_queue(q)
-        # Provide progress updates of RW periodically to stdout
-        if n % (250-1) == 0:
-            print(RW.get_state_representation())
-        
-        # This tests if the game was just completed
-
-        if not justTerminated:
-            q.put(curAgent)
-        
-        justTerminated = False
-        
-        n += 1
-
-        # switch policy after first 500 moves for 1b, 1c, 2, 3, & 4
-        if id != '1a':
-            if n == 500:
-                if id == '1b':
-                    agentF.set_policy(PGreedy('F', RLW, actions, seed=seed))
-                    agentM.set_policy(PGreedy('M', RLW, actions, seed=seed))
-                elif id == '1c' or id == '2' or id == '3a' or id == '3b' or id == '4':
-                    agentF.set_policy(PExploit('F', RLW, actions, seed=seed))
-                    agentM.set_policy(PExploit('M', RLW, actions, seed=seed))
-                if id == '2':
-                    # run the SARSA q-learning variation for 9500 steps
-                    agentF.set_learning('sarsa')
-                    agentM.set_learning('sarsa')
-
-        # stop after 10,000 moves
-        if n == 10000:
-            # TODO dump qtable
-            print(f"Recording {n-1} in report timings")
-            timings.append(n-1)
-            print(f"\nTotal number of terminal states reached: {terminal}")
-            if produce_history:
-                write_actions(agentFActions, agentMActions, id, str(seed), rewardList, distList, vizFile, movingAgent)
-                write_terminal_states(terminal_state_actions)
-            if dump_table:
-                #print(agentFtable)
-                print(timings)
-                write_report_timing(timings)
-                write_table(agentFtable, agentMtable)
-            break
+
+            # save everything needed to continue the run from this move
+            if checkpoint_every and n % checkpoint_every == 0:
+                dumps = None
+                if dump_table:
+                    dumps = [dump.checkpoint() for dump in tables]
+                world = RW.snapshot()
+                save_checkpoint(checkpoint, {
+                    'config': config,
+                    'n': n,
+                    'terminal': terminal,
+                    'numActions': numActions,
+                    'layout': layout,
+                    'timings': outputs.timings,
+                    'dropoff_timing_not_written': outputs.dropoff_timing_not_written,
+                    'queue': list(q.queue),
+                    # layouts are saved by name, world[0] being the layout object
+                    'world': (next(name for name, layout in layouts.items() if layout is world[0]),) + world[1:],
+                    'agents': [agent.checkpoint() for agent in agents],
+                    'dumps': dumps,
+                    'offsets': outputs.writer.sync(),
+                })
+            if instrument:
+                t = inst.lap('checkpoint', t)
+    finally:
+        outputs.close()
+
+    outputs.export()
+
+    print(f"Q-table memory ({table_backend}): F {agentF.table.nbytes()} bytes, M {agentM.table.nbytes()} bytes")
+    if cache:
+        print(cache.summary())
+
+    if instrument:
+        inst.stop()
+        print(f"\n{inst.summary()}")
+        inst.write_json(os.path.join(outDir, 'instrumentation.json'),
+                        experiment=id, seed=seed, rl_type=rl_type, moves=n,
+                        transition_cache=cache.stats() if cache else None)
+    outputs.stop_profile()
+    return n
 
 
 def main():
@@ -323,9 +391,25 @@ def main():
         help="Produce history for visualization",
         required=False,
         action="store_true")
+    arg_parser.add_argument("--export",
+        dest="export",
+        help="Export the step log of --history to the text and CSV history files",
+        required=False,
+        action="store_true")
     arg_parser.add_argument("-d", "--dump-tables",
         dest="dump_tables",
-        help="Dump Q-tables to files m_table.txt and f_table.txt",
+        help="Dump Q-tables to files m_table.bin and f_table.bin",
+        required=False,
+        action="store_true")
+    arg_parser.add_argument("--dump-stride",
+        dest="dump_stride",
+        help="Dump Q-tables only every N-th step of an agent",
+        required=False,
+        type=int,
+        default=1)
+    arg_parser.add_argument("--dump-on-change",
+        dest="dump_on_change",
+        help="Dump the Q-table of an agent only when it changed",
         required=False,
         action="store_true")
     arg_parser.add_argument("-r", "--rl", 
@@ -340,7 +424,106 @@ def main():
         required=False,
         type=str,
         default='out/visualization.csv')
+    arg_parser.add_argument("-n", "--steps",
+        dest="steps",
+        help="Number of moves after which the experiment stops",
+        required=False,
+        type=int,
+        default=10000)
+    arg_parser.add_argument("-o", "--out",
+        dest="outDir",
+        help="Choose directory of history and Q-table files",
+        required=False,
+        type=str,
+        default='out')
+    arg_parser.add_argument("--layout",
+        dest="layout",
+        help="Choose a JSON file of the original and modified layouts",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--grid",
+        dest="grid",
+        help="Scale the layouts to an N x N x N grid",
+        required=False,
+        type=int,
+        default=None)
+    arg_parser.add_argument("--instrument",
+        dest="instrument",
+        help="Time the phases of the event loop and count its events",
+        required=False,
+        action="store_true")
+    arg_parser.add_argument("--profile",
+        dest="profile",
+        help="Run the event loop under cProfile",
+        required=False,
+        action="store_true")
+    arg_parser.add_argument("--full-tables",
+        dest="full_tables",
+        help="Allocate Q-table rows for every RL state, not only the reachable ones",
+        required=False,
+        action="store_true")
+    arg_parser.add_argument("-t", "--table",
+        dest="table_backend",
+        help="Choose Q-table storage",
+        required=False,
+        type=str,
+        choices=['dense64', 'dense32', 'sparse'],
+        default='dense64')
+    arg_parser.add_argument("-c", "--checkpoint-every",
+        dest="checkpoint_every",
+        help="Write a checkpoint every N moves",
+        required=False,
+        type=int,
+        default=None)
+    arg_parser.add_argument("--checkpoint",
+        dest="checkpoint",
+        help="Choose the checkpoint file (default <out>/checkpoint.bin)",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--schedule",
+        dest="schedule",
+        help="Choose a JSON file of experiment schedules",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--trace",
+        dest="trace",
+        help="Record the golden trace of the run to a .npz file",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--trace-every",
+        dest="trace_every",
+        help="Number of steps between the Q-table checksums of the golden trace",
+        required=False,
+        type=int,
+        default=100)
+    arg_parser.add_argument("--engine",
+        dest="engine",
+        help="Choose the implementation of the event loop",
+        required=False,
+        type=str,
+        choices=['reference', 'fast'],
+        default='reference')
+    arg_parser.add_argument("--transition-cache",
+        dest="transition_cache",
+        help="Memoize the transitions of interned worlds, keeping this many",
+        required=False,
+        type=int,
+        default=None)
+    arg_parser.add_argument("--resume",
+        dest="resume",
+        help="Continue the run saved in the checkpoint file",
+        required=False,
+        action="store_true")
     args = arg_parser.parse_args()
+    if args.engine == 'fast':
+        try:
+            fastEngine.check_options(args)
+        except ValueError as e:
+            arg_parser.error(str(e))
     experiment(args)
 
 if __name__ == "__main__":
@@ -1,21 +1,27 @@
-from action import Action
-import numpy as np
+from action import ACT_PICKUP, ACT_DROPOFF, ACTION_BIT, MASK_ACTIONS
+from randomStream import RandomStream
 import random
 
 class Policy:
-    def __init__(self, agent, states, actions, seed=None):
+    # every attribute is declared here, so that PExploit can inherit from both PRandom and PGreedy
+    __slots__ = ('agent', 'states', 'actions', 'pi', 'seed', 'rng')
+
+    def __init__(self, agent, states, actions, seed=None, stream=None):
         """
         Constructor for SARSA/Q-Learning policy.
         This is a base class which will be specialized for the different epsilon-greedy policies
 
         Arguments:
-        agent - 'M' for the male agent, 'F' for the female agent
+        agent - code of the agent, cell.AGENT_F or cell.AGENT_M
         states - The RL state space being used
-        actions - A list of actions that are available
+        actions - A list of the names of the actions that are available, indexed by action code
+        seed - The seed of a new random stream, used if stream is None
+        stream - A randomStream.RandomStream to draw from, shared by the successive policies of an agent
+            so that switching policies continues the agent's stream instead of starting it over
 
         Properties:
         pi - The function executed to choose an action, given the current state and a Q table, intended to be overridden
-        rng - A random number generator used for stochastic policies, which can be initialized with a prescribed seed
+        rng - The RandomStream used for stochastic policies
         """
         self.agent = agent
         self.states = states
@@ -23,90 +29,110 @@ class Policy:
         # placeholder
         self.pi = None
         self.seed = seed
-        self.rng = np.random.default_rng(seed=seed)
+        self.rng = stream if stream is not None else RandomStream(seed)
 
     def execute(self, state, rlstate, table):
         """
         Execute the policy for one step, given current real world and RL states, and the Q table
+        Returns the code of the action chosen
         """
         return self.pi(state, rlstate, table)
     
+    def checkpoint(self):
+        """
+        Returns the position of the random stream, everything else being fixed at construction
+        """
+        return self.rng.checkpoint()
+
+    def restore(self, state):
+        """
+        Moves the random stream back to a position returned by checkpoint
+        """
+        self.rng.restore(state)
+
     def is_applicable(self, state, action):
         """
-        Returns True if the given action is applicable given the current state
+        Returns True if the action of the given code is applicable given the current state
         """
-        a = Action()
-        if action == 'Pickup':
-            return a.is_pickup_applicable(self.agent, state)
-        elif action == 'Dropoff':
-            return a.is_dropoff_applicable(self.agent, state)
-        elif action == 'N':
-            return a.is_north_applicable(self.agent, state)
-        elif action == 'S':
-            return a.is_south_applicable(self.agent, state)
-        elif action == 'E':
-            return a.is_east_applicable(self.agent, state)
-        elif action == 'W':
-            return a.is_west_applicable(self.agent, state)
-        elif action == 'U':
-            return a.is_up_applicable(self.agent, state)
-        elif action == 'D':
-            return a.is_down_applicable(self.agent, state)
+        return bool(state.applicable_mask(self.agent) & ACTION_BIT[action])
 
     def get_applicable_actions(self, state):
         """
-        Returns an list of actions applicable in the given state
+        Returns an list of the codes of the actions applicable in the given state
         """
-        return list(filter(lambda action: self.is_applicable(state, action), self.actions))
+        return list(MASK_ACTIONS[state.applicable_mask(self.agent)])
 
 class PRandom(Policy):
     """
     The PRANDOM policy: at any point, choose uniform random action from available actions
     """
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.pi = lambda s, rs, qs: self.random(s)
 
     def random(self, state):
-        valid_actions = self.get_applicable_actions(state)
-        if 'Pickup' in valid_actions:
-            return 'Pickup'
-        elif 'Dropoff' in valid_actions:
-            return 'Dropoff'
+        mask = state.applicable_mask(self.agent)
+        if mask & ACTION_BIT[ACT_PICKUP]:
+            return ACT_PICKUP
+        elif mask & ACTION_BIT[ACT_DROPOFF]:
+            return ACT_DROPOFF
         else:
-            return self.rng.choice(valid_actions)
+            return self.rng.choice(MASK_ACTIONS[mask])
         
 class PGreedy(Policy):
     """
     The PGREEDY policy: always choose the available action leading to the highest possible Q value from the given state
     """
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.pi = lambda s, rs, qs: self.greedy(s, rs, qs)
 
     def greedy(self, state, rlstate, table):
-        valid_actions = self.get_applicable_actions(state)
-        if 'Pickup' in valid_actions:
-            return 'Pickup'
-        elif 'Dropoff' in valid_actions:
-            return 'Dropoff'
+        mask = state.applicable_mask(self.agent)
+        if mask & ACTION_BIT[ACT_PICKUP]:
+            return ACT_PICKUP
+        elif mask & ACTION_BIT[ACT_DROPOFF]:
+            return ACT_DROPOFF
         else:
-            # avoid blockage problem
-            self.rng.shuffle(valid_actions)
-            
-            best_q = -2**32
-            best_a = None
-            for action in valid_actions:
-                this_q = table[action][rlstate]
-                if this_q > best_q:
-                    best_q = this_q
-                    best_a = action
-            return best_a
+            # avoid blockage problem: ties are broken uniformly at random
+            # the table caches the maximum of the row and the actions holding it,
+            # the row is only scanned when none of those actions is applicable
+            best, bits = table.best(rlstate)
+            tied = bits & mask
+            if tied:
+                actions = MASK_ACTIONS[tied]
+                if len(actions) == 1:
+                    return actions[0]
+                return actions[self.rng.integer(len(actions))]
+            # the best action and its number of ties are found in one pass, without building a list
+            best_action = -1
+            best = ties = 0
+            for a in MASK_ACTIONS[mask]:
+                q = table.get(rlstate, a)
+                if best_action < 0 or q > best:
+                    best_action, best, ties = a, q, 1
+                elif q == best:
+                    ties += 1
+            if ties == 1:
+                return best_action
+            # the k-th of the tied actions, in action code order
+            k = self.rng.integer(ties)
+            for a in MASK_ACTIONS[mask]:
+                if table.get(rlstate, a) == best:
+                    if k == 0:
+                        return a
+                    k -= 1
 
 class PExploit(PRandom, PGreedy):
     """
     The PEXPLOIT policy: randomly perform PGREEDY 80% of the time, and PRANDOM 20% of the time.
     """
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super(PRandom, self).__init__(*args, **kwargs)
         self.pi = lambda s, rs, qs: self.exploit(s, rs, qs)
@@ -115,4 +141,7 @@ class PExploit(PRandom, PGreedy):
         if self.rng.random() >= 0.85:
             return self.random(state)
         else:
-            return self.greedy(state, rlstate, table)
\ No newline at end of file
+            return self.greedy(state, rlstate, table)
+
+# Policy classes by name, to rebuild the policy of an agent from a checkpoint
+POLICIES = {'PRandom': PRandom, 'PGreedy': PGreedy, 'PExploit': PExploit}
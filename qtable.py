@@ -0,0 +1,235 @@
+import sys
+from array import array
+import numpy as np
+
+class QTable:
+    """
+    An abstract class representing the storage of a Q-table: one row of Q values per RL state id,
+    one Q value per action in the order of action.ACTIONS. Every value starts at 0.
+
+    API:
+    get - returns the Q value of an action in a state
+    set - stores the Q value of an action in a state
+    values - returns the row of a state as a sequence of floats, to be read but not modified
+    rows - returns the rows of an array of states as a 2D ndarray
+    nbytes - returns the memory footprint of the table in bytes
+    checkpoint - returns the contents of the table in a picklable form
+    restore - replaces the contents of the table by those returned by checkpoint
+    """
+    def get(self, state, action):
+        pass
+
+    def set(self, state, action, value):
+        pass
+
+    def values(self, state):
+        pass
+
+    def rows(self, states):
+        pass
+
+    def nbytes(self):
+        pass
+
+    def checkpoint(self):
+        pass
+
+    def restore(self, data):
+        pass
+
+class DenseTable(QTable):
+    """
+    A single contiguous ndarray of shape (states, actions), allocated up front
+    """
+    def __init__(self, states, actions, dtype=np.float64):
+        self.array = np.zeros((states, actions), dtype=dtype)
+
+    def get(self, state, action):
+        return self.array.item(state, action)
+
+    def set(self, state, action, value):
+        self.array[state, action] = value
+
+    def values(self, state):
+        return self.array[state].tolist()
+
+    def rows(self, states):
+        return self.array[states]
+
+    def nbytes(self):
+        return self.array.nbytes
+
+    def checkpoint(self):
+        return self.array
+
+    def restore(self, data):
+        self.array[...] = data
+
+class SparseTable(QTable):
+    """
+    A dict of float64 rows, a row being allocated the first time one of its values is set
+    Rows never set read as zeros
+    """
+    def __init__(self, states, actions):
+        self.actions = actions
+        self.data = {}
+        self.zeros = array('d', bytes(8*actions))
+
+    def get(self, state, action):
+        row = self.data.get(state)
+        return row[action] if row is not None else 0.0
+
+    def set(self, state, action, value):
+        row = self.data.get(state)
+        if row is None:
+            row = self.data[state] = array('d', self.zeros)
+        row[action] = value
+
+    def values(self, state):
+        return self.data.get(state, self.zeros)
+
+    def rows(self, states):
+        zeros = self.zeros
+        get = self.data.get
+        return np.array([get(s, zeros) for s in np.asarray(states).tolist()]).reshape(-1, self.actions)
+
+    def nbytes(self):
+        return sys.getsizeof(self.data) + sum(sys.getsizeof(row) for row in self.data.values())
+
+    def checkpoint(self):
+        return self.data
+
+    def restore(self, data):
+        self.data = {state: array('d', row) for state, row in data.items()}
+
+class GreedyTable(QTable):
+    """
+    A Q-table of any storage, keeping for every state its maximum Q value and the bitmask of the actions
+    holding it (bit a for action code a), so that greedy choices and Q-learning targets need no scan of the row.
+    A set changes one value: if it reaches the maximum, the cache is updated in O(1); the row is only
+    scanned again when the last action holding the maximum decreases.
+    The cache of a DenseTable is a flat array per field, viewed as an ndarray by best_rows so that
+    extract_table reads a whole grid at once; that of a SparseTable is a dict per field, holding the states
+    set at least once, which reads never add to.
+
+    Arguments:
+    table - the empty QTable storing the values
+    states - number of rows of the table
+    actions - number of values per row, at most 8 for the bitmasks to fit a byte
+
+    API (besides that of QTable):
+    best - returns (maximum Q value, bitmask of the actions holding it) of a state
+    best_rows - returns (maximum Q values, boolean array of the actions holding them) of an array of states
+    nbytes - returns the memory footprint of the table and of its cache in bytes
+    """
+    def __init__(self, table, states, actions):
+        self.table = table
+        self.states = states
+        self.actions = actions
+        self.dtype = table.rows([0]).dtype
+        # float32 storage rounds the values set, the cache must hold them as stored
+        self.rounds = self.dtype != np.float64
+        self.sparse = isinstance(table, SparseTable)
+        # reads go straight to the storage
+        self.get = table.get
+        self.values = table.values
+        self.rows = table.rows
+        self.checkpoint = table.checkpoint
+        # every value is 0, so every action holds the maximum of every state
+        self.full = (1 << actions) - 1
+        if self.sparse:
+            self.best = self._best_sparse
+        self._reset()
+
+    def _reset(self):
+        full = self.full
+        if self.sparse:
+            self.maxima = {}
+            self.argmax = {}
+        else:
+            self.maxima = array('d' if self.dtype == np.float64 else 'f', bytes(self.dtype.itemsize*self.states))
+            self.argmax = array('B', [full])*self.states
+            self.maxima_view = np.frombuffer(self.maxima, dtype=self.dtype)
+            self.argmax_view = np.frombuffer(self.argmax, dtype=np.uint8)
+
+    def _scan(self, state):
+        best, bits = None, 0
+        for a, q in enumerate(self.table.values(state)):
+            if best is None or q > best:
+                best, bits = q, 1 << a
+            elif q == best:
+                bits |= 1 << a
+        self.maxima[state] = best
+        self.argmax[state] = bits
+
+    def set(self, state, action, value):
+        table = self.table
+        table.set(state, action, value)
+        if self.rounds:
+            value = table.get(state, action)
+        maxima, argmax = self.maxima, self.argmax
+        if self.sparse and state not in maxima:
+            maxima[state] = 0.0
+            argmax[state] = self.full
+        best = maxima[state]
+        bit = 1 << action
+        if value > best:
+            maxima[state] = value
+            argmax[state] = bit
+        elif value == best:
+            argmax[state] |= bit
+        elif argmax[state] & bit:
+            if argmax[state] == bit:
+                self._scan(state)
+            else:
+                argmax[state] &= ~bit
+
+    def best(self, state):
+        return self.maxima[state], self.argmax[state]
+
+    def _best_sparse(self, state):
+        # states never set are not in the dicts, and read as a row of zeros
+        return self.maxima.get(state, 0.0), self.argmax.get(state, self.full)
+
+    def best_rows(self, states):
+        if self.sparse:
+            states = np.asarray(states).tolist()
+            maxima = np.array([self.maxima.get(s, 0.0) for s in states], dtype=self.dtype)
+            argmax = np.array([self.argmax.get(s, self.full) for s in states], dtype=np.uint8)
+        else:
+            maxima, argmax = self.maxima_view[states], self.argmax_view[states]
+        held = np.unpackbits(argmax[:, None], axis=1, count=self.actions, bitorder='little')
+        return maxima, held.astype(bool)
+
+    def nbytes(self):
+        if self.sparse:
+            cache = (sys.getsizeof(self.maxima) + sys.getsizeof(self.argmax)
+                     + sum(sys.getsizeof(best) for best in self.maxima.values()))
+        else:
+            cache = self.maxima_view.nbytes + self.argmax_view.nbytes
+        return self.table.nbytes() + cache
+
+    def restore(self, data):
+        self.table.restore(data)
+        self._reset()
+        if self.sparse:
+            for state in self.table.checkpoint():
+                self._scan(state)
+        else:
+            rows = self.table.rows(np.arange(self.states))
+            self.maxima_view[:] = rows.max(axis=1)
+            self.argmax_view[:] = np.packbits(rows == self.maxima_view[:, None], axis=1, bitorder='little')[:, 0]
+
+TABLES = {
+    'dense64': lambda states, actions: DenseTable(states, actions, np.float64),
+    'dense32': lambda states, actions: DenseTable(states, actions, np.float32),
+    'sparse': SparseTable,
+}
+
+def make_table(kind, states, actions, greedy=False):
+    """
+    returns an empty Q-table of a kind of TABLES, with states rows of actions values,
+    wrapped in a GreedyTable if greedy is True
+    """
+    table = TABLES[kind](states, actions)
+    return GreedyTable(table, states, actions) if greedy else table
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Number of uniform draws generated at a time
+BLOCK = 4096
+
+class RandomStream:
+    """
+    A stream of uniform draws in [0, 1), generated by NumPy in blocks and served one at a time from a list
+    at an explicit index, as single-sample NumPy calls cost far more than the draw itself.
+    The draws only depend on the seed, whatever mix of random, integer and choice consumes them.
+
+    Argument:
+    seed - seed of the underlying numpy.random.Generator: an int, a numpy.random.SeedSequence or None
+    block - number of draws generated at a time
+
+    API:
+    random - returns the next draw
+    integer - returns an integer drawn uniformly in 0..n-1
+    choice - returns an element drawn uniformly from a sequence
+    checkpoint - returns the position of the stream in a picklable form
+    restore - moves the stream back to a position returned by checkpoint
+    """
+    __slots__ = ('rng', 'block', 'block_state', 'buffer', 'index')
+
+    def __init__(self, seed=None, block=BLOCK):
+        self.rng = np.random.default_rng(seed)
+        self.block = block
+        self._refill()
+
+    def _refill(self):
+        # the generator state the block is drawn from, enough to draw it again when restoring
+        self.block_state = self.rng.bit_generator.state
+        self.buffer = self.rng.random(self.block).tolist()
+        # index in the block of the next draw
+        self.index = 0
+
+    def random(self):
+        i = self.index
+        if i == self.block:
+            self._refill()
+            i = 0
+        self.index = i + 1
+        return self.buffer[i]
+
+    def integer(self, n):
+        return int(self.random()*n)
+
+    def choice(self, seq):
+        return seq[int(self.random()*len(seq))]
+
+    def checkpoint(self):
+        return (self.block_state, self.index)
+
+    def restore(self, state):
+        block_state, index = state
+        self.rng.bit_generator.state = block_state
+        self._refill()
+        self.index = index
+
+def spawn_streams(seed, agents=2):
+    """
+    returns a list of independent RandomStreams, one for every agent code, spawned from the SeedSequence of seed
+    """
+    return [RandomStream(child) for child in np.random.SeedSequence(seed).spawn(agents)]
+
+def spawn_tie_rngs(seed, agents=2):
+    """
+    returns a list of independent numpy Generators breaking the ties of the Q-table dumps, one for every agent code
+    Each is spawned from the child SeedSequence of the agent's stream in spawn_streams, so it is independent
+    of that stream and of the other agent's
+    """
+    return [np.random.default_rng(child.spawn(1)[0]) for child in np.random.SeedSequence(seed).spawn(agents)]
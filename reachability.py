@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+import numpy as np
+from rlw import RLSpace, SSSpace, RL_SPACES
+
+# Bumped whenever the analysis or the RL state encodings change, invalidating cached indices
+VERSION = 2
+# Default directory of cached indices
+CACHE_DIR = os.path.join('out', 'reachability')
+# Number of block configurations mapped to RL states at a time
+CHUNK = 4096
+
+def block_configurations(layout):
+    """
+    returns every (carF, carM, dropoff blocks, pickup blocks) configuration the dynamics can reach from the
+    initial world of layout, by a breadth-first search over pickups and dropoffs
+
+    Agent positions are abstracted away: an agent can always walk to any cell not holding the other agent,
+    and the other agent can always step aside, so any Pickup or Dropoff cell can be used next.
+    The search stops at terminal configurations, where every Dropoff cell is full.
+    """
+    capacity = layout.dropoff_capacity
+    start = (0, 0, (0,)*len(layout.dropoffs), (layout.pickup_blocks,)*len(layout.pickups))
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        following = []
+        for carF, carM, drops, picks in frontier:
+            if all(d == capacity for d in drops):
+                continue
+            for agent, carrying in enumerate((carF, carM)):
+                if not carrying:
+                    for i, p in enumerate(picks):
+                        if p > 0:
+                            nxt = (1 if agent == 0 else carF, 1 if agent == 1 else carM,
+                                   drops, picks[:i] + (p - 1,) + picks[i+1:])
+                            if nxt not in seen:
+                                seen.add(nxt)
+                                following.append(nxt)
+                else:
+                    for j, d in enumerate(drops):
+                        if d < capacity:
+                            nxt = (0 if agent == 0 else carF, 0 if agent == 1 else carM,
+                                   drops[:j] + (d + 1,) + drops[j+1:], picks)
+                            if nxt not in seen:
+                                seen.add(nxt)
+                                following.append(nxt)
+        frontier = following
+    return seen
+
+def agent_views(layouts, capacity):
+    """
+    returns the (carrying, dropoff blocks, pickup blocks) an agent can observe on any of the layouts, as arrays
+    Dropoff cells are given as full, with capacity blocks, or empty, as the RL spaces only observe whether
+    a Dropoff cell is full, against the capacity of its own layout
+    """
+    views = set()
+    for layout in layouts:
+        for carF, carM, drops, picks in block_configurations(layout):
+            drops = tuple(capacity if d == layout.dropoff_capacity else 0 for d in drops)
+            views.add((carF, drops, picks))
+            views.add((carM, drops, picks))
+    views = sorted(views)
+    return (np.array([v[0] for v in views]),
+            np.array([v[1] for v in views]),
+            np.array([v[2] for v in views]))
+
+def reachable_ids(space, layouts):
+    """
+    returns the sorted array of the ids of space that a real world can map to on any of the layouts
+    The result is a superset of the states visited by an experiment: every ordered pair of distinct
+    agent cells is combined with every block configuration an agent can observe
+    Spaces that do not observe the other agent or the blocks only get one pair per cell or one configuration
+    per carrying flag, as the rest would map to the same ids
+    """
+    grid = space.grid
+    cells = np.array(grid.cell_loc)
+    if space.observes_other:
+        agent_cell, other_cell = np.nonzero(~np.eye(grid.cells, dtype=bool))
+    else:
+        agent_cell = np.arange(grid.cells)
+        other_cell = (agent_cell + 1) % grid.cells
+    if space.observes_blocks:
+        carrying, drops, picks = agent_views(layouts, space.layout.dropoff_capacity)
+    else:
+        layout = layouts[0]
+        carrying = np.array([0, 1])
+        drops = np.zeros((2, len(layout.dropoffs)), dtype=np.int64)
+        picks = np.full((2, len(layout.pickups)), layout.pickup_blocks)
+    found = []
+    for start in range(0, len(carrying), CHUNK):
+        view = np.arange(start, min(start + CHUNK, len(carrying)))
+        # every combination of a chunk of views with every pair of cells
+        v = np.repeat(view, len(agent_cell))
+        pair = np.tile(np.arange(len(agent_cell)), len(view))
+        ids = space.map_states(cells[agent_cell[pair]], carrying[v], cells[other_cell[pair]], drops[v], picks[v])
+        found.append(np.unique(ids))
+    return np.unique(np.concatenate(found))
+
+def cache_key(space, layouts):
+    """
+    returns the name of the cache file of the reachable ids of space on layouts
+    """
+    config = json.dumps([VERSION, type(space).__name__, space.layout.to_dict(),
+                         [layout.to_dict() for layout in layouts]], sort_keys=True)
+    return f'{type(space).__name__}-{hashlib.sha1(config.encode()).hexdigest()[:16]}.npy'
+
+def load_reachable_ids(space, layouts, cache_dir=CACHE_DIR):
+    """
+    returns reachable_ids(space, layouts), computed once and then read from a .npy file in cache_dir
+    cache_dir None disables the cache
+    """
+    if cache_dir is None:
+        return reachable_ids(space, layouts)
+    path = os.path.join(cache_dir, cache_key(space, layouts))
+    if os.path.exists(path):
+        return np.load(path)
+    ids = reachable_ids(space, layouts)
+    os.makedirs(cache_dir, exist_ok=True)
+    # written under a temporary name and renamed, so that concurrent runs never read a partial file
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, ids)
+    os.replace(tmp, path)
+    return ids
+
+class CompactSpace(RLSpace):
+    """
+    An RL space restricted to the states reachable on a set of layouts.
+    Ids of the wrapped space are mapped to dense ids 1..R in increasing order by a perfect index;
+    every unreachable id maps to 0, a row of the Q-table that is never updated and so always reads as zeros.
+    Such ids are only looked up by Agent.extract_table, for locations where the agent cannot be,
+    e.g. the cell of the other agent.
+
+    Arguments:
+    space - the RLSpace to compact
+    layouts - the layouts the experiment may switch between
+    cache_dir - directory of cached reachable ids, None to always run the analysis
+    """
+    def __init__(self, space, layouts, cache_dir=CACHE_DIR):
+        self.space = space
+        self.observes_other = space.observes_other
+        self.observes_blocks = space.observes_blocks
+        self.layout = space.layout
+        self.size = space.size
+        self.grid = space.grid
+        self.reachable = load_reachable_ids(space, list(layouts), cache_dir)
+        self.index = np.zeros(space.states(), dtype=np.int64)
+        self.index[self.reachable] = np.arange(1, len(self.reachable) + 1)
+        # list copy of index, faster to index with a Python int
+        self.lookup = self.index.tolist()
+
+    def map_state(self, state, agent):
+        return self.lookup[self.space.map_state(state, agent)]
+
+    def map_states(self, loc, carrying, other_loc, drop_blocks, pick_blocks):
+        return self.index[self.space.map_states(loc, carrying, other_loc, drop_blocks, pick_blocks)]
+
+    def map_positions(self, state, agent):
+        return self.index[self.space.map_positions(state, agent)]
+
+    def shape(self):
+        return (len(self.reachable) + 1,)
+
+def make_space(rl_type, layouts, full_tables=False):
+    """
+    returns the RL space of rl_type ('ss' if unknown) on the original layout of layouts, compacted to the states
+    reachable on the original and modified layouts unless full_tables
+    """
+    space = RL_SPACES.get(rl_type, SSSpace)(layouts['original'])
+    if not full_tables:
+        space = CompactSpace(space, [layouts['original'], layouts['modified']])
+    return space
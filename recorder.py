@@ -0,0 +1,289 @@
+import os
+import queue
+import struct
+import threading
+from itertools import starmap
+from tableDump import TableDumpWriter
+from stepLog import STEP_DTYPE, STEP_LOG, export_history
+from goldenTrace import TraceRecorder
+from instrument import start_profile, stop_profile
+
+# Number of rows a stream buffers before handing them to the writer thread
+CHUNK = 4096
+# Number of chunks that may wait for the writer thread before the simulation waits for the disk
+MAX_PENDING = 64
+
+class HistoryWriter:
+    """
+    Background thread writing chunks of history rows to disk, so that the simulation loop
+    never performs file I/O itself and only ever holds a bounded number of rows in memory.
+
+    API:
+    open_binary - returns a Stream writing bytes objects as they are
+    open_records - returns a Stream writing tuples as records of a NumPy structured dtype
+    sync - writes all pending chunks and returns the size of every file
+    close - writes all pending chunks, closes every file and stops the thread
+
+    offsets - {path: size} as returned by sync; files at these paths are truncated to that size
+        and appended to, instead of being written from scratch, to resume a checkpointed run
+    """
+    def __init__(self, chunk=CHUNK, max_pending=MAX_PENDING, offsets=None):
+        self.chunk = chunk
+        self.offsets = offsets or {}
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.streams = []
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.pending.get()
+            if job is None:
+                self.pending.task_done()
+                break
+            stream, rows = job
+            if self.error is None:
+                try:
+                    stream.write_rows(rows)
+                except Exception as e:
+                    self.error = e
+            self.pending.task_done()
+
+    def submit(self, stream, rows):
+        """
+        hands a chunk of rows of stream to the writer thread
+        """
+        if self.error is not None:
+            raise self.error
+        self.pending.put((stream, rows))
+
+    def _open(self, stream):
+        self.streams.append(stream)
+        return stream
+
+    def open_binary(self, path):
+        return self._open(BinaryStream(self, path))
+
+    def open_records(self, path, dtype):
+        return self._open(RecordStream(self, path, dtype))
+
+    def sync(self):
+        """
+        waits until every row appended so far is written and flushed to disk
+        returns {path: size} of every open file
+        """
+        for stream in self.streams:
+            stream.flush()
+        self.pending.join()
+        if self.error is not None:
+            raise self.error
+        offsets = {}
+        for stream in self.streams:
+            stream.file.flush()
+            offsets[stream.path] = stream.file.tell()
+        return offsets
+
+    def close(self):
+        for stream in self.streams:
+            stream.flush()
+        self.pending.put(None)
+        self.thread.join()
+        for stream in self.streams:
+            stream.file.close()
+        self.streams = []
+        if self.error is not None:
+            raise self.error
+
+class Stream:
+    """
+    A file written by a HistoryWriter; rows are buffered here and written in chunks by the writer thread
+    offset is the size the file was truncated to when resuming, None if it was written from scratch
+    """
+    def __init__(self, writer, path, mode, **kwargs):
+        self.writer = writer
+        self.path = path
+        self.offset = writer.offsets.get(path)
+        if self.offset is None:
+            self.file = open(path, mode, **kwargs)
+        else:
+            os.truncate(path, self.offset)
+            self.file = open(path, mode.replace('w', 'a'), **kwargs)
+        self.rows = []
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.writer.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.submit(self, self.rows)
+            self.rows = []
+
+    def write_rows(self, rows):
+        """
+        writes a chunk of rows to the file, called on the writer thread
+        """
+        pass
+
+class BinaryStream(Stream):
+    def __init__(self, writer, path):
+        super().__init__(writer, path, 'wb')
+
+    def append(self, data):
+        """
+        hands a bytes object to the writer thread right away, it is already a chunk
+        """
+        self.writer.submit(self, data)
+
+    def write_rows(self, data):
+        self.file.write(data)
+
+class RecordStream(Stream):
+    """
+    Appends fixed-size records to a binary file, as laid out by a packed little-endian NumPy structured dtype
+    Tuples are packed with struct on the writer thread, several times faster than converting them with np.array
+    The file can be read back with np.memmap, or np.fromfile, of the same dtype
+    """
+    def __init__(self, writer, path, dtype):
+        record = struct.Struct('<' + ''.join([dtype[name].char for name in dtype.names]))
+        if record.size != dtype.itemsize:
+            raise ValueError(f'{dtype} is not a packed little-endian dtype')
+        super().__init__(writer, path, 'wb')
+        self.record = record
+
+    def write_rows(self, rows):
+        self.file.write(b''.join(starmap(self.record.pack, rows)))
+
+def open_history(writer, id, seed, outDir='out'):
+    """
+    Open the step log agent history and other performance metrics are written to (see stepLog.py)
+    It is used for analysis and for offline visualization
+    Rows appended to the log are written by the background writer thread as the simulation runs
+    This is run at the start of simulation when the --history
+    flag is supplied
+    returns the stream of the step log, taking (step, agent, action, reward, distance, episode, terminal) tuples
+    """
+    with open(os.path.join(outDir, 'experiment_id'), 'w', encoding="utf-8") as f:
+        f.write(id)
+    with open(os.path.join(outDir, 'experiment_seed'), 'w', encoding="utf-8") as f:
+        f.write(seed)
+    return writer.open_records(os.path.join(outDir, STEP_LOG), STEP_DTYPE)
+
+def open_tables(writer, outDir='out', stride=1, on_change=False, cells=54):
+    """
+    Open the binary Q-table dump files of both agents
+    The extracted Q-table of every agent step is appended to these as the simulation runs
+    This is used for the offline visualization of the entire run
+    when the --dump-tables option is supplied
+    cells is the number of (location, carrying) pairs of an extracted Q-table
+    """
+    return (TableDumpWriter(writer.open_binary(os.path.join(outDir, 'f_table.bin')), stride, on_change, cells),
+            TableDumpWriter(writer.open_binary(os.path.join(outDir, 'm_table.bin')), stride, on_change, cells))
+
+def write_table(agentFtable, agentMtable):
+    """
+    Hand the remaining Q-table records of each agent to the writer thread
+    This is called appropriately at the end of the simulation
+    when the --dump-tables option is supplied
+    """
+    agentFtable.close()
+    agentMtable.close()
+
+def write_report_timing(timings, outDir='out'):
+    """
+    Write the timesteps for report Q-table dumps
+    This is used for providing visualizations for the report
+    This is called appropriately in the simulation
+    when the --report option is supplied
+    """
+    with open(os.path.join(outDir, 'report_timings.txt'), 'w', encoding='utf-8') as f:
+        for t in timings:
+            f.write(str(t) + '\n')
+
+class RunOutputs:
+    """
+    The output files of a run and the progress messages printed along them, shared by the event loops of
+    main.py and fastEngine.py: the step log, the Q-table dumps and their report timings, the golden trace,
+    the exported history files and the profile
+
+    Arguments:
+    args - the arguments of main.experiment
+    cells - number of cells of the grid, the Q-table dumps holding a row per (cell, carrying) pair
+    offsets - sizes the files were at when the run was checkpointed, None unless resuming
+
+    Properties:
+    writer - the HistoryWriter of the files
+    stepLog - stream of the step log, None without --history
+    tables - [F, M] Q-table dumps, None without --dump-tables
+    tracer - the goldenTrace.TraceRecorder, None without --trace
+    timings - steps of the report Q-table dumps
+    dropoff_timing_not_written - whether the step the first Dropoff was filled at is still to be recorded
+
+    API:
+    first_dropoff_filled - records the step the first Dropoff was filled at, once
+    terminal_reached - records a terminal state
+    stopped - ends a run stopped by its schedule
+    steps_reached - ends a run that performed the requested number of moves
+    close - writes everything still buffered and closes the files
+    export - writes the history files generated from the step log if asked for
+    stop_profile - stops the profiler and prints its report if profiling
+    """
+    def __init__(self, args, cells, offsets=None):
+        self.args = args
+        self.writer = HistoryWriter(offsets=offsets)
+        self.stepLog = None
+        self.tables = None
+        self.tracer = None
+        self.profiler = None
+        self.timings = []
+        self.dropoff_timing_not_written = True
+        if args.produce_history:
+            self.stepLog = open_history(self.writer, args.experiment, str(args.seed), args.outDir)
+        if args.dump_tables:
+            self.tables = list(open_tables(self.writer, args.outDir, args.dump_stride, args.dump_on_change, cells))
+        if args.trace:
+            self.tracer = TraceRecorder(args.trace, args.trace_every, {'experiment': args.experiment,
+                                        'seed': args.seed, 'rl_type': args.rl_type, 'steps': args.steps})
+        if args.profile:
+            self.profiler = start_profile()
+
+    def first_dropoff_filled(self, step):
+        if self.tables is not None and self.dropoff_timing_not_written:
+            print(f"Recording {step} in report timings")
+            self.timings.append(step)
+            self.dropoff_timing_not_written = False
+
+    def terminal_reached(self, step, terminal, numActions):
+        if self.tables is not None:
+            print(f"Recording {step} in report timings")
+            self.timings.append(step)
+        print(f"Terminal state {terminal} reached after {numActions} actions\n")
+
+    def stopped(self, terminal):
+        print(f"Total number of terminal states reached: {terminal}")
+        if self.tables is not None:
+            write_table(*self.tables)
+
+    def steps_reached(self, step, terminal):
+        print(f"Recording {step} in report timings")
+        self.timings.append(step)
+        print(f"\nTotal number of terminal states reached: {terminal}")
+        if self.tables is not None:
+            print(self.timings)
+            write_report_timing(self.timings, self.args.outDir)
+            write_table(*self.tables)
+
+    def close(self):
+        self.writer.close()
+        if self.tracer is not None:
+            self.tracer.close()
+
+    def export(self):
+        if self.args.produce_history and self.args.export:
+            export_history(self.args.outDir, self.args.vizFile)
+
+    def stop_profile(self):
+        if self.profiler is not None:
+            print(stop_profile(self.profiler, os.path.join(self.args.outDir, 'profile.pstats')))
@@ -1,68 +1,165 @@
 import numpy as np
+from action import grid
+from layout import get_layout
 
 class RLSpace:
     """
     An abstract class representing the Reinforcement Learning (RL) state space
     It provides mappings from the real-world state space, and information about the shape of the space.
+
+    RL states are flat integer ids: the mixed-radix number whose digits are the components of the state,
+    most significant first, with radices given by shape(). This is the C-order index into an array of that shape,
+    so the Q-table is a 2D array with one row per id.
+
+    Argument:
+    layout - the layout.Layout, or the name of a preset layout, the shape of the space is derived from
     """
+    # whether states depend on the location of the other agent, and on the blocks in the Pickup and Dropoff cells
+    observes_other = False
+    observes_blocks = False
+
+    def __init__(self, layout='original'):
+        self.layout = get_layout(layout)
+        self.size = self.layout.size
+        self.grid = grid(self.size)
+        # id prefix cell*2 + carrying and coordinates of every (location, carrying) pair, in id prefix order
+        self._prefix = np.arange(2*self.grid.cells)
+        self._loc = np.repeat(np.array(self.grid.cell_loc), 2, axis=0)
+
     def map_state(self, state, agent):
         """
-        Given a real-world state, provide a state in the RL state space of the given agent
+        Given a real-world state, provide the id of the state in the RL state space of the agent of the given code
+        """
+        pass
+
+    def map_states(self, loc, carrying, other_loc, drop_blocks, pick_blocks):
+        """
+        Batch version of map_state: given arrays describing N real-world states, provide an (N,) array of ids
+        A space ignores the arguments its states do not depend on
+
+        arguments:
+        loc - (N, 3) coordinates of the agent
+        carrying - (N,) 1 if the agent is carrying a block and 0 otherwise
+        other_loc - (N, 3) coordinates of the other agent
+        drop_blocks - (N, dropoffs) number of blocks in each Dropoff cell
+        pick_blocks - (N, pickups) number of blocks in each Pickup cell
+        """
+        pass
+
+    def map_positions(self, state, agent):
+        """
+        Given a real-world state, provide the ids of the RL states the given agent would be in at every location,
+        with and without a block, everything else in the world being unchanged
+        Returns an array of ids, ordered by cell*2 + carrying (see action.Grid)
         """
         pass
 
     def shape(self):
         """
-        Returns shape of RL space, used to generate Q table
-        This is used as the .shape parameter of the Numpy array created to store the states
+        Returns the radices of the components of an RL state, most significant first
         """
         pass
 
+    def states(self):
+        """
+        Returns the number of RL states, used as the number of rows of the Q table
+        """
+        return int(np.prod(self.shape()))
+
+    def _prefixes(self, loc, carrying):
+        """
+        returns the id prefixes cell*2 + carrying of arrays of coordinates and carrying flags
+        """
+        loc = np.asarray(loc)
+        Y, Z = self.size[1], self.size[2]
+        return ((loc[:, 0]*Y + loc[:, 1])*Z + loc[:, 2])*2 + np.asarray(carrying)
+
 class VSSpace(RLSpace):
     """
     "Very Simple" RL space: each agent's RL space contains only their coordinates, and whether they hold a block.
     """
     def map_state(self, state, agent):
-        loc = state.get_location(agent)
-        is_carrying = state.is_agent_carrying(agent)
-        return (loc[0], loc[1], loc[2], 1 if is_carrying else 0)
-    
+        return state.cell[agent]*2 + (1 if state.carrying[agent] else 0)
+
+    def map_states(self, loc, carrying, other_loc=None, drop_blocks=None, pick_blocks=None):
+        return self._prefixes(loc, carrying)
+
+    def map_positions(self, state, agent):
+        return self._prefix
+
     def shape(self):
-        return (3, 3, 3, 2)
+        return self.size + (2,)
 
 class SSSpace(RLSpace):
     """
     "Somewhat Simple" RL space: each agent's RL space contains only their coordinates, whether they hold a block,
     and the relative position of the other agent
     """
+    observes_other = True
+
+    def __init__(self, layout='original'):
+        super().__init__(layout)
+        # relative positions range over -(X-1)..X-1, shifted to start at 0
+        self.offset = np.array([n - 1 for n in self.size])
+        self.radix = tuple(2*n - 1 for n in self.size)
+        # number of relative positions, and the id digits of the relative position (0,0,0)
+        self.relative = self.radix[0]*self.radix[1]*self.radix[2]
+        self.center = (self.offset[0]*self.radix[1] + self.offset[1])*self.radix[2] + self.offset[2]
+
     def map_state(self, state, agent):
-        loc = state.get_location(agent)
-        other_loc = state.get_location('F' if agent == 'M' else 'M')
-        is_carrying = state.is_agent_carrying(agent)
-        return (loc[0], loc[1], loc[2], 1 if is_carrying else 0,
-                (loc[0] - other_loc[0]) + 2, 
-                (loc[1] - other_loc[1]) + 2,
-                (loc[2] - other_loc[2]) + 2)
-    
+        loc, other_loc = state.loc[agent], state.loc[1 - agent]
+        radix = self.radix
+        return (state.cell[agent]*2 + (1 if state.carrying[agent] else 0))*self.relative + self.center + \
+            ((loc[0] - other_loc[0])*radix[1] + loc[1] - other_loc[1])*radix[2] + loc[2] - other_loc[2]
+
+    def map_states(self, loc, carrying, other_loc, drop_blocks=None, pick_blocks=None):
+        rel = np.asarray(loc) - np.asarray(other_loc) + self.offset
+        return self._prefixes(loc, carrying)*self.relative + (rel[:, 0]*self.radix[1] + rel[:, 1])*self.radix[2] + rel[:, 2]
+
+    def map_positions(self, state, agent):
+        other_loc = state.loc[1 - agent]
+        rel = self._loc - np.asarray(other_loc) + self.offset
+        return self._prefix*self.relative + (rel[:, 0]*self.radix[1] + rel[:, 1])*self.radix[2] + rel[:, 2]
+
     def shape(self):
-        return (3, 3, 3, 2, 5, 5, 5)
-    
+        return self.size + (2,) + self.radix
+
 class MSpace(RLSpace):
     """
     "Medium" complexity RL space: stores the agent position/block status, and the status of the pickup-dropoff only (not other agent)
+    One flag per Dropoff cell (1 while it is not full) followed by one flag per Pickup cell (1 while it has blocks)
     """
+    observes_blocks = True
+
+    def __init__(self, layout='original'):
+        super().__init__(layout)
+        self.flags = len(self.layout.dropoffs) + len(self.layout.pickups)
+        # place value of each flag, the first Dropoff flag being the most significant
+        self.weights = 1 << np.arange(self.flags)[::-1]
+
+    def _flag_bits(self, state):
+        blocks = state.flat_blocks
+        capacity = state.capacity
+        bits = 0
+        for cell in state.cellDrop:
+            bits = bits*2 + (blocks.item(cell) < capacity)
+        for cell in state.cellPick:
+            bits = bits*2 + (blocks.item(cell) > 0)
+        return bits
+
     def map_state(self, state, agent):
-        loc = state.get_location(agent)
-        #other_loc = state.get_location('F' if agent == 'M' else 'M')
-        is_carrying = state.is_agent_carrying(agent)
-        dropoff_1, dropoff_2, dropoff_3, dropoff_4, pickup_1, pickup_2 = state.get_state_representation()[8:]
-        return (loc[0], loc[1], loc[2], 1 if is_carrying else 0,  
-            1 if dropoff_1 < 5 else 0,
-            1 if dropoff_2 < 5 else 0,
-            1 if dropoff_3 < 5 else 0,
-            1 if dropoff_4 < 5 else 0,
-            1 if pickup_1 > 0 else 0,
-            1 if pickup_2 > 0 else 0)
+        return ((state.cell[agent]*2 + (1 if state.carrying[agent] else 0)) << self.flags) + self._flag_bits(state)
+
+    def map_states(self, loc, carrying, other_loc, drop_blocks, pick_blocks):
+        flags = np.concatenate((np.asarray(drop_blocks) < self.layout.dropoff_capacity,
+                                np.asarray(pick_blocks) > 0), axis=1)
+        return (self._prefixes(loc, carrying) << self.flags) + flags @ self.weights
+
+    def map_positions(self, state, agent):
+        return (self._prefix << self.flags) + self._flag_bits(state)
 
     def shape(self):
-        return (3, 3, 3, 2, 2, 2, 2, 2, 2, 2)
\ No newline at end of file
+        return self.size + (2,) + (2,)*self.flags
+
+# RL state space classes by the rl_type of main.py
+RL_SPACES = {'ss': SSSpace, 'vs': VSSpace, 'ms': MSpace}
@@ -0,0 +1,121 @@
+import json
+from policy import POLICIES
+
+# Step number that never comes, the next step of a schedule with no step events left
+NEVER = -1
+# Keys of an event that say when it happens, and keys that say what it does
+TRIGGERS = ('step', 'terminal')
+EFFECTS = ('policy', 'learning', 'alpha', 'gamma', 'layout', 'stop')
+# Parameters of a schedule before any event, and their defaults
+DEFAULTS = {'alpha': 0.3, 'gamma': 0.5, 'policy': 'PRandom', 'learning': 'ql', 'layout': 'original'}
+
+# The experiments of the project, see the README
+# Every experiment starts with PRANDOM, and all but 1a switch policy after 500 moves
+SCHEDULES = {
+    '1a': {'events': []},
+    '1b': {'events': [{'step': 500, 'policy': 'PGreedy'}]},
+    '1c': {'events': [{'step': 500, 'policy': 'PExploit'}]},
+    '2': {'events': [{'step': 500, 'policy': 'PExploit', 'learning': 'sarsa'}]},
+    '3a': {'alpha': 0.1, 'events': [{'step': 500, 'policy': 'PExploit'}]},
+    '3b': {'alpha': 0.5, 'events': [{'step': 500, 'policy': 'PExploit'}]},
+    '4': {'events': [{'step': 500, 'policy': 'PExploit'},
+                     {'terminal': 3, 'layout': 'modified'},
+                     {'terminal': 6, 'stop': True}]},
+}
+
+class Schedule:
+    """
+    An experiment schedule compiled into event tables.
+    Step events are sorted by step and merged, so the event loop only compares the move count with next_step;
+    terminal events are looked up by terminal count, which only happens when a terminal state is reached.
+
+    Arguments:
+    definition - dict of the initial parameters (keys of DEFAULTS, all optional) and of a list of 'events'
+        Every event has a single trigger, {'step': n} to happen after n moves or {'terminal': k} to happen
+        when the k-th terminal state is reached, and one or more effects:
+        policy - name of the policy both agents switch to, a key of policy.POLICIES
+        learning - 'ql' or 'sarsa'
+        alpha, gamma - new learning rate or discount factor of both agents
+        layout - 'original' or 'modified', the layout the world is reset to from now on
+        stop - true to end the experiment (only for terminal events)
+        Events with the same trigger are merged, the effects of later events taking precedence
+
+    API:
+    advance - returns the effects due at next_step and moves on to the following step event
+    at_terminal - returns the effects due when a given terminal state is reached
+    seek - moves on to the first step event after a given step, for resumed runs
+    """
+    def __init__(self, definition):
+        self.definition = definition
+        for key in definition:
+            if key != 'events' and key not in DEFAULTS:
+                raise ValueError(f'unknown schedule parameter {key!r}')
+        for key, value in DEFAULTS.items():
+            setattr(self, key, definition.get(key, value))
+        _check_effects({'policy': self.policy, 'learning': self.learning, 'layout': self.layout})
+        steps = {}
+        self.terminals = {}
+        for event in definition.get('events', []):
+            triggers = [key for key in TRIGGERS if key in event]
+            if len(triggers) != 1:
+                raise ValueError(f'event {event} must have exactly one of {TRIGGERS}')
+            trigger = triggers[0]
+            at = event[trigger]
+            if not isinstance(at, int) or at < 1:
+                raise ValueError(f'event {event} must happen at a positive {trigger}')
+            effects = {key: value for key, value in event.items() if key != trigger}
+            _check_effects(effects)
+            if 'stop' in effects and trigger != 'terminal':
+                raise ValueError(f'event {event}: only terminal events can stop an experiment')
+            table = steps if trigger == 'step' else self.terminals
+            table.setdefault(at, {}).update(effects)
+        self.steps = sorted(steps.items())
+        self.seek(0)
+
+    def seek(self, n):
+        self.cursor = 0
+        while self.cursor < len(self.steps) and self.steps[self.cursor][0] <= n:
+            self.cursor += 1
+        self.next_step = self.steps[self.cursor][0] if self.cursor < len(self.steps) else NEVER
+
+    def advance(self):
+        effects = self.steps[self.cursor][1]
+        self.seek(self.next_step)
+        return effects
+
+    def at_terminal(self, terminal):
+        return self.terminals.get(terminal, {})
+
+def _check_effects(effects):
+    """
+    raises ValueError if an effect is unknown or has an invalid value
+    """
+    for key in effects:
+        if key not in EFFECTS:
+            raise ValueError(f'unknown schedule effect {key!r}')
+    if 'policy' in effects and effects['policy'] not in POLICIES:
+        raise ValueError(f"unknown policy {effects['policy']!r}, choose from {list(POLICIES)}")
+    if 'learning' in effects and effects['learning'] not in ('ql', 'sarsa'):
+        raise ValueError(f"unknown learning method {effects['learning']!r}")
+    if 'layout' in effects and effects['layout'] not in ('original', 'modified'):
+        raise ValueError(f"unknown layout {effects['layout']!r}")
+
+def load_schedules(path=None):
+    """
+    returns the dict {experiment: schedule definition} of the presets, updated with those of a JSON file
+    The file maps experiment names to definitions as described in Schedule, new names adding experiments
+    """
+    schedules = dict(SCHEDULES)
+    if path is not None:
+        with open(path, 'r', encoding='utf-8') as f:
+            schedules.update(json.load(f))
+    return schedules
+
+def get_schedule(experiment, path=None):
+    """
+    returns the compiled Schedule of an experiment, from the presets or the JSON file at path
+    """
+    schedules = load_schedules(path)
+    if experiment not in schedules:
+        raise ValueError(f'unknown experiment {experiment!r}, choose from {list(schedules)}')
+    return Schedule(schedules[experiment])
@@ -1,122 +1,227 @@
-from cell import Cell
-from action import Action
+from cell import NORMAL, PICKUP, DROPOFF, RISK, EMPTY, OCCUPANT, AGENTS, AGENT_F, AGENT_M
+from action import ACT_DROPOFF, ACTION_BIT, EFFECTS, grid
+from layout import get_layout
 import numpy as np
 
 class StateSpace:
+    __slots__ = ('layout', 'grid', 'capacity', 'cell_type', 'num_blocks', 'occupancy',
+                 'flat_type', 'flat_blocks', 'flat_occupancy',
+                 'loc', 'cell', 'carrying', 'locDrop', 'locPick', 'cellDrop', 'cellPick', 'numFull')
+
     def __init__(self, experiment):
         """
         Constructor for RW state space.
 
         Argument:
-        experiment - 'original' or 'modified'
+        experiment - a layout.Layout, or the name of a preset layout, 'original' or 'modified'
         original corresponds to experiments 1, 2, 3, & part of 4
         modified corresponds to part of experiment 4 after 3rd terminal state is reached
 
         Properties:
-        state_space - a 3D NumPy array of Cells
-        locF - (x,y,z) coordinates of female agent
-        locM - (x,y,z) coordinates of male agent
-        carF - True if female agent is carrying a block and False otherwise
-        carM - True if male agent is carrying a block and False otherwise
+        layout - the layout.Layout of the world
+        grid - the action.Grid of the layout's size
+        cell_type - a 3D int8 NumPy array of cell type codes (see cell.py)
+        num_blocks - a 3D int8 NumPy array of the number of blocks in each cell
+        occupancy - a 3D int8 NumPy array, EMPTY or the code of the agent in each cell
+        flat_type, flat_blocks, flat_occupancy - 1D views of these arrays, indexed by cell number
+        loc - [F, M] (x,y,z) coordinates of each agent, indexed by agent code (see cell.AGENTS)
+            These are the tuples of grid.cell_loc, shared rather than built on every move
+        cell - [F, M] cell number of each agent (see action.Grid.cell_index)
+        carrying - [F, M] True if the agent is carrying a block and False otherwise
         locDrop - list of (x,y,z) coordinates of each Dropoff cell
         locPick - list of (x,y,z) coordinates of each Pickup cell
+        cellDrop, cellPick - cell numbers of each Dropoff and Pickup cell
+        numFull - number of Dropoff cells holding dropoff_capacity blocks
+        """
+        self.layout = None
+        self.cell_type = None
+        self.num_blocks = None
+        self.occupancy = None
+        self.reset(experiment)
+
+    def reset(self, experiment):
+        """
+        resets the world in place to the initial state of a layout
+        The arrays are only reallocated if the grid size changes
+        returns nothing
+        argument:
+        experiment - a layout.Layout, or the name of a preset layout, 'original' or 'modified'
         """
-        self.state_space = np.empty(shape=(
-            3, 3, 3), dtype=object, order='C')   # 'C' means row-major order in memory
-        self.locF = None
-        self.locM = None
-        self.carF = False
-        self.carM = False
-        self.locDrop = []
-        self.locPick = []
-
-        # initializing state_space as all normal cells
-        for x in range(self.state_space.shape[0]):
-            for y in range(self.state_space.shape[1]):
-                for z in range(self.state_space.shape[2]):
-                    self.state_space[x, y, z] = Cell()
-
-        # female agent
-        self.state_space[0, 0, 0].add_agent('F')
-        self.locF = [0, 0, 0]
-
-        # male agent
-        self.state_space[2, 1, 2].add_agent('M')
-        self.locM = [2, 1, 2]
+        self.layout = get_layout(experiment)
+        self.grid = grid(self.layout.size)
+        self.capacity = self.layout.dropoff_capacity
+        blocks_dtype = np.int8 if max(self.layout.pickup_blocks, self.capacity) < 128 else np.int32
+        if self.cell_type is None or self.cell_type.shape != self.layout.size or self.num_blocks.dtype != blocks_dtype:
+            self.cell_type = np.full(self.layout.size, NORMAL, dtype=np.int8)
+            self.num_blocks = np.zeros(self.layout.size, dtype=blocks_dtype)
+            self.occupancy = np.full(self.layout.size, EMPTY, dtype=np.int8)
+            # cells are numbered in C order, so these are views of the same memory
+            self.flat_type = self.cell_type.reshape(-1)
+            self.flat_blocks = self.num_blocks.reshape(-1)
+            self.flat_occupancy = self.occupancy.reshape(-1)
+        else:
+            self.cell_type.fill(NORMAL)
+            self.num_blocks.fill(0)
+            self.occupancy.fill(EMPTY)
+        self.loc = [None, None]
+        self.cell = [None, None]
+        self.carrying = [False, False]
+        self.locDrop = [list(loc) for loc in self.layout.dropoffs]
+        self.locPick = [list(loc) for loc in self.layout.pickups]
+        self.cellDrop = [self.grid.cell_index(loc) for loc in self.locDrop]
+        self.cellPick = [self.grid.cell_index(loc) for loc in self.locPick]
+        self.numFull = 0
+
+        # agents
+        for agent in (AGENT_F, AGENT_M):
+            cell = self.grid.cell_index(self.layout.start[AGENTS[agent]])
+            self.flat_occupancy[cell] = OCCUPANT[agent]
+            self.update_agent_cell(agent, cell)
 
         # pickup cells
-        if experiment == 'original':
-            self.state_space[1, 1, 0].set_type('Pickup')
-            self.locPick.append([1, 1, 0])
-            self.state_space[2, 2, 1].set_type('Pickup')
-            self.locPick.append([2, 2, 1])
-        elif experiment == 'modified':
-            self.state_space[0, 2, 0].set_type('Pickup')
-            self.locPick.append([0, 2, 0])
-            self.state_space[1, 2, 2].set_type('Pickup')
-            self.locPick.append([1, 2, 2])
-            
+        for loc in self.locPick:
+            self.cell_type[loc[0], loc[1], loc[2]] = PICKUP
+            self.num_blocks[loc[0], loc[1], loc[2]] = self.layout.pickup_blocks
+
         # dropoff cells
-        self.state_space[0, 0, 1].set_type('Dropoff')
-        self.locDrop.append([0, 0, 1])
-        self.state_space[0, 0, 2].set_type('Dropoff')
-        self.locDrop.append([0, 0, 2])
-        self.state_space[2, 0, 0].set_type('Dropoff')
-        self.locDrop.append([2, 0, 0])
-        self.state_space[2, 1, 2].set_type('Dropoff')
-        self.locDrop.append([2, 1, 2])
+        for loc in self.locDrop:
+            self.cell_type[loc[0], loc[1], loc[2]] = DROPOFF
 
         # risk cells
-        self.state_space[1, 1, 1].set_type('Risk')
-        self.state_space[2, 1, 0].set_type('Risk')
+        for loc in self.layout.risks:
+            self.cell_type[loc[0], loc[1], loc[2]] = RISK
+
+    def snapshot(self):
+        """
+        returns an immutable tuple encoding the world:
+        (layout, locF, locM, carF, carM, numFull, blocks of each Dropoff cell, blocks of each Pickup cell)
+        Only Pickup and Dropoff cells ever hold blocks, so the cost depends on the number of those cells,
+        not on the size of the grid
+        """
+        blocks = self.num_blocks.item
+        return (self.layout, tuple(self.loc[AGENT_F]), tuple(self.loc[AGENT_M]),
+                self.carrying[AGENT_F], self.carrying[AGENT_M], self.numFull,
+                tuple([blocks(x, y, z) for x, y, z in self.locDrop]),
+                tuple([blocks(x, y, z) for x, y, z in self.locPick]))
+
+    def restore(self, snapshot):
+        """
+        restores the world in place to a snapshot of it, or of any world of the same layout
+        returns nothing
+        argument:
+        snapshot - a tuple returned by snapshot()
+        """
+        layout, locF, locM, carF, carM, numFull, drops, picks = snapshot
+        if layout is not self.layout:
+            self.reset(layout)
+        for cell in self.cell:
+            self.flat_occupancy[cell] = EMPTY
+        self.occupancy[locF] = OCCUPANT[AGENT_F]
+        self.occupancy[locM] = OCCUPANT[AGENT_M]
+        self.update_agent_loc(AGENT_F, locF)
+        self.update_agent_loc(AGENT_M, locM)
+        self.carrying[AGENT_F] = carF
+        self.carrying[AGENT_M] = carM
+        self.numFull = numFull
+        for (x, y, z), blocks in zip(self.locDrop, drops):
+            self.num_blocks[x, y, z] = blocks
+        for (x, y, z), blocks in zip(self.locPick, picks):
+            self.num_blocks[x, y, z] = blocks
 
     def get_location(self, agent):
         """
         returns (x,y,z) coordinates of agent
         argument:
-        agent - 'F' for female agent; 'M' for male agent
+        agent - code of the agent, AGENT_F or AGENT_M
         """
-        if agent == 'F':
-            return self.locF
-        if agent == 'M':
-            return self.locM
-        
+        return self.loc[agent]
+
     def update_agent_loc(self, agent, loc):
         """
         updates the location of agent
         returns nothing
         arguments:
-        agent - 'F' for female agent; 'M' for male agent
+        agent - code of the agent, AGENT_F or AGENT_M
         loc - (x,y,z) coordinates to assign to agent locaction
         """
-        if agent == 'F':
-            self.locF = loc
-        if agent == 'M':
-            self.locM = loc
+        self.update_agent_cell(agent, self.grid.cell_index(loc))
+
+    def update_agent_cell(self, agent, cell):
+        """
+        updates the location of agent, given as a cell number
+        returns nothing
+        arguments:
+        agent - code of the agent, AGENT_F or AGENT_M
+        cell - cell number to assign to agent location
+        """
+        self.loc[agent] = self.grid.cell_loc[cell]
+        self.cell[agent] = cell
+
+    def get_cell(self, agent):
+        """
+        returns the cell number of agent
+        argument:
+        agent - code of the agent, AGENT_F or AGENT_M
+        """
+        return self.cell[agent]
+
+    def move_agent(self, agent, loc):
+        """
+        moves agent to an unoccupied cell, updating occupancy and location
+        returns nothing
+        arguments:
+        agent - code of the agent, AGENT_F or AGENT_M
+        loc - (x,y,z) coordinates of the destination cell
+        """
+        self.move_agent_to(agent, self.grid.cell_index(loc))
+
+    def move_agent_to(self, agent, cell):
+        """
+        moves agent to an unoccupied cell given by its number, updating occupancy and location
+        returns nothing
+        arguments:
+        agent - code of the agent, AGENT_F or AGENT_M
+        cell - cell number of the destination cell
+        """
+        self.flat_occupancy[self.cell[agent]] = EMPTY
+        self.flat_occupancy[cell] = OCCUPANT[agent]
+        self.update_agent_cell(agent, cell)
 
     def update_agent_carrying(self, agent, bool):
         """
         updates whether agent is carrying block
         returns nothing
         arguments:
-        agent - 'F' for female agent; 'M' for male agent
+        agent - code of the agent, AGENT_F or AGENT_M
         bool - boolean value to assign to agent carrying attribute
         """
-        if agent == 'F':
-            self.carF = bool
-        if agent == 'M':
-            self.carM = bool
+        self.carrying[agent] = bool
 
     def is_agent_carrying(self, agent):
         """
         returns True if agent is carrying a block and False otherwise
         argument:
-        agent - 'F' for female agent; 'M' for male agent
+        agent - code of the agent, AGENT_F or AGENT_M
         """
-        if agent == 'F':
-            return self.carF
-        if agent == 'M':
-            return self.carM
+        return self.carrying[agent]
+
+    def applicable_mask(self, agent):
+        """
+        returns the bitmask of actions applicable to agent, bit i standing for the action of code i
+        argument:
+        agent - code of the agent, AGENT_F or AGENT_M
+        """
+        cell = self.cell[agent]
+        return self.grid.applicable_mask(cell, self.cell[1 - agent], self.carrying[agent],
+                                         self.flat_type.item(cell), self.flat_blocks.item(cell), self.capacity)
+
+    def is_occupied(self, loc):
+        """
+        returns True if an agent is in the cell and False otherwise
+        argument:
+        loc - (x,y,z) coordinates of a cell
+        """
+        return self.occupancy.item(loc[0], loc[1], loc[2]) != EMPTY
 
     def is_pickup(self, loc):
         """
@@ -124,7 +229,7 @@ class StateSpace:
         argument:
         loc - (x,y,z) coordinates of a cell
         """
-        return self.state_space[loc[0], loc[1], loc[2]].get_type() == 'Pickup'
+        return self.cell_type.item(loc[0], loc[1], loc[2]) == PICKUP
 
     def is_dropoff(self, loc):
         """
@@ -132,8 +237,66 @@ class StateSpace:
         argument:
         loc - (x,y,z) coordinates of a cell
         """
-        return self.state_space[loc[0], loc[1], loc[2]].get_type() == 'Dropoff'
-    
+        return self.cell_type.item(loc[0], loc[1], loc[2]) == DROPOFF
+
+    def get_num_blocks(self, loc):
+        """
+        returns the number of blocks in cell
+        argument:
+        loc - (x,y,z) coordinates of a cell
+        """
+        return self.num_blocks.item(loc[0], loc[1], loc[2])
+
+    def get_cost(self, loc):
+        """
+        returns the cost of leaving cell, -2 for Risk cells and -1 otherwise
+        argument:
+        loc - (x,y,z) coordinates of a cell
+        """
+        return -2 if self.cell_type.item(loc[0], loc[1], loc[2]) == RISK else -1
+
+    def add_block(self, loc):
+        """
+        adds a block to a Dropoff cell if there are less than dropoff_capacity blocks present
+        returns nothing
+        argument:
+        loc - (x,y,z) coordinates of a cell
+        """
+        self.add_block_at(self.grid.cell_index(loc))
+
+    def add_block_at(self, cell):
+        """
+        adds a block to a Dropoff cell given by its number if there are less than dropoff_capacity blocks present
+        returns nothing
+        argument:
+        cell - cell number of a cell
+        """
+        blocks = self.flat_blocks.item(cell)
+        if self.flat_type.item(cell) == DROPOFF and blocks < self.capacity:
+            self.flat_blocks[cell] = blocks + 1
+            if blocks + 1 == self.capacity:
+                self.numFull += 1
+
+    def remove_block(self, loc):
+        """
+        removes a block from a Pickup cell if there is at least one block present
+        returns nothing
+        argument:
+        loc - (x,y,z) coordinates of a cell
+        """
+        self.remove_block_at(self.grid.cell_index(loc))
+
+    def remove_block_at(self, cell):
+        """
+        removes a block from a Pickup cell given by its number if there is at least one block present
+        returns nothing
+        argument:
+        cell - cell number of a cell
+        """
+        blocks = self.flat_blocks.item(cell)
+        if self.flat_type.item(cell) == PICKUP and blocks > 0:
+            self.flat_blocks[cell] = blocks - 1
+
     def get_state_representation(self):
         """
         returns a list with form:
@@ -144,83 +307,45 @@ class StateSpace:
         i' = 1 if M is carrying a block and 0 otherwise
         a,b,c,d are the number of blocks in the dropoff locations
         e,f are the number of blocks in the pickup locations
+        (one entry per Dropoff and Pickup cell of the layout)
         """
-        if self.carF:
-            i = 1
-        else:
-            i = 0
-        if self.carM:
-            iPrime = 1
-        else:
-            iPrime = 0
-
-        state = [self.locF[0], self.locF[1], self.locF[2], 
-                 self.locM[0], self.locM[1], self.locM[2],
-                 i, iPrime,                         
-                 self.state_space[self.locDrop[0][0], self.locDrop[0][1], self.locDrop[0][2]].get_num_blocks(),     
-                 self.state_space[self.locDrop[1][0], self.locDrop[1][1], self.locDrop[1][2]].get_num_blocks(),     
-                 self.state_space[self.locDrop[2][0], self.locDrop[2][1], self.locDrop[2][2]].get_num_blocks(),     
-                 self.state_space[self.locDrop[3][0], self.locDrop[3][1], self.locDrop[3][2]].get_num_blocks(),     
-                 self.state_space[self.locPick[0][0], self.locPick[0][1], self.locPick[0][2]].get_num_blocks(), 
-                 self.state_space[self.locPick[1][0], self.locPick[1][1], self.locPick[1][2]].get_num_blocks()]
-        
+        locF, locM = self.loc
+        state = [locF[0], locF[1], locF[2],
+                 locM[0], locM[1], locM[2],
+                 int(self.carrying[AGENT_F]), int(self.carrying[AGENT_M])]
+        state += [self.get_num_blocks(loc) for loc in self.locDrop]
+        state += [self.get_num_blocks(loc) for loc in self.locPick]
+
         return state
-    
+
 
     def is_first_dropoff_filled(self):
         """
-        returns True if exactly 1 dropoff cell contains 5 blocks and False otherwise
+        returns True if exactly 1 dropoff cell is full and False otherwise
         """
-        counter = 0
-        for i in range(4):
-            counter += max(0, self.state_space[self.locDrop[i][0], self.locDrop[i][1], self.locDrop[i][2]].get_num_blocks() - 4)
-        
-        return True if counter == 1 else False
-        
+        return self.numFull == 1
+
 
     def perform_action(self, agent, action):
         """
-        performs action by calling appropriate Action method
-        returns a reward 
-        reward is 14 if action is 'Pickup' or 'Dropoff' or
+        performs action if it is applicable
+        returns a reward
+        reward is 14 if action is Pickup or Dropoff or
         reward is -1 if moving from normal cell and -2 if moving from risk cell
         arguments:
-        agent - 'F' for female agent; 'M' for male agent
-        action - 'Pickup', 'Dropoff', 'E', 'W', 'N', 'S', 'U', or 'D'
+        agent - code of the agent, AGENT_F or AGENT_M
+        action - code of the action (see action.ACTIONS)
         """
-        loc = self.get_location(agent)
-        reward = self.state_space[loc[0], loc[1], loc[2]].get_cost()
-
-        a = Action()
-        if action == 'Pickup':
-            a.pickup_block(agent, self)
-            reward = 14
-        if action == 'Dropoff':
-            a.dropoff_block(agent, self)
+        if action <= ACT_DROPOFF:
             reward = 14
-        if action == 'E':
-            a.move_east(agent, self)
-        if action == 'W':
-            a.move_west(agent, self)
-        if action == 'N':
-            a.move_north(agent, self)
-        if action == 'S':
-            a.move_south(agent, self)
-        if action == 'U':
-            a.move_up(agent, self)
-        if action == 'D':
-            a.move_down(agent, self)
-
+        else:
+            reward = -2 if self.flat_type.item(self.cell[agent]) == RISK else -1
+        if self.applicable_mask(agent) & ACTION_BIT[action]:
+            EFFECTS[action](self, agent, action)
         return reward
 
     def is_complete(self):
         """
-        returns True if all Pickup cells contain 5 blocks and False otherwise
+        returns True if all Dropoff cells are full and False otherwise
         """
-        if (self.state_space[self.locDrop[0][0], self.locDrop[0][1], self.locDrop[0][2]].get_num_blocks() == 5 and   
-            self.state_space[self.locDrop[1][0], self.locDrop[1][1], self.locDrop[1][2]].get_num_blocks() == 5 and   
-            self.state_space[self.locDrop[2][0], self.locDrop[2][1], self.locDrop[2][2]].get_num_blocks() == 5 and   
-            self.state_space[self.locDrop[3][0], self.locDrop[3][1], self.locDrop[3][2]].get_num_blocks() == 5):
-            return True
-        else:
-            return False
\ No newline at end of file
+        return self.numFull == len(self.locDrop)
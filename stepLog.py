@@ -0,0 +1,71 @@
+import os
+import numpy as np
+from action import ACTIONS
+from cell import AGENTS, AGENT_F, AGENT_M
+
+# Dtype of a step of the log, little-endian and packed so the file reads the same on any machine:
+# the 1-based step number, the moving agent and its action codes, the reward, the Manhattan distance
+# between the agents after the step, the index of the episode (number of terminal states reached before the step)
+# and whether the step reached a terminal state
+STEP_DTYPE = np.dtype([('step', '<u4'), ('agent', 'u1'), ('action', 'u1'), ('reward', '<i2'),
+                       ('distance', '<u2'), ('episode', '<u4'), ('terminal', '?')])
+# File name of the step log in the output directory
+STEP_LOG = 'steps.bin'
+
+def load_step_log(path):
+    """
+    returns the steps of a log written by main.py --history as a read-only memory-mapped array of STEP_DTYPE,
+    so only the pages actually read are loaded
+    """
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=STEP_DTYPE)
+    return np.memmap(path, dtype=STEP_DTYPE, mode='r')
+
+def agent_actions(log, agent):
+    """
+    returns the action codes of the steps of an agent, in order
+    """
+    return log['action'][log['agent'] == agent]
+
+def episode_lengths(log):
+    """
+    returns the number of steps of every episode that reached a terminal state
+    """
+    ends = np.flatnonzero(log['terminal'])
+    return np.diff(ends, prepend=-1)
+
+def export_actions(log, outDir='out'):
+    """
+    Writes f_actions and m_actions, the actions of each agent as one action name of action.ACTIONS per line
+    """
+    names = np.array(ACTIONS)
+    for agent, name in ((AGENT_F, 'f_actions'), (AGENT_M, 'm_actions')):
+        with open(os.path.join(outDir, name), 'w', encoding='utf-8') as f:
+            f.write(''.join([f'{action}\n' for action in names[agent_actions(log, agent)].tolist()]))
+
+def export_visualization(log, path):
+    """
+    Writes the visualization CSV used by performanceMetrics_visualization.ipynb:
+    one step, reward, distance, moving agent row per step
+    """
+    names = np.array(AGENTS)[log['agent']].tolist()
+    rows = zip(log['step'].tolist(), log['reward'].tolist(), log['distance'].tolist(), names)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(''.join([f'{step},{reward},{distance},{agent}\r\n' for step, reward, distance, agent in rows]))
+
+def export_terminal_states(log, path):
+    """
+    Writes the terminal states CSV: a 'Steps' header and the number of steps of every completed episode
+    """
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(''.join([f'{steps}\r\n' for steps in ['Steps'] + episode_lengths(log).tolist()]))
+
+def export_history(outDir, vizFile):
+    """
+    Writes the text and CSV history files of earlier versions from the step log of outDir:
+    f_actions, m_actions, the visualization CSV vizFile and terminal_states
+    """
+    log = load_step_log(os.path.join(outDir, STEP_LOG))
+    export_actions(log, outDir)
+    export_visualization(log, vizFile)
+    export_terminal_states(log, os.path.join(outDir, 'terminal_states'))
@@ -0,0 +1,132 @@
+import numpy as np
+from action import MOVE_NAMES
+
+MAGIC = b'QTBL'
+VERSION = 1
+# Fixed-size file header, followed by fixed-stride records
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u2'), ('cells', '<u2'), ('reserved', '<u8')])
+# Number of extracted cells per record of the preset layouts: 27 locations, with and without a block
+CELLS = 54
+# Records are written to disk in chunks of this many records
+CHUNK = 1024
+
+def record_dtype(cells):
+    """
+    returns the dtype of one record of a dump with the given number of cells
+    step - index of the agent step the record was extracted after
+    strength - strongest Q value of every cell
+    move - move code of the action with the strongest Q value of every cell
+    """
+    return np.dtype([('step', '<u4'), ('strength', '<f4', (cells,)), ('move', 'u1', (cells,))])
+
+class TableDumpWriter:
+    """
+    Appends the extracted Q-table of every agent step to a binary dump file.
+
+    Arguments:
+    stream - recorder.BinaryStream of the file to write
+    stride - dump only every stride-th agent step
+    on_change - dump a step only if the extracted table differs from the last dumped one
+    cells - number of cells in an extracted table
+    The header is only written to new files, a stream resumed from a checkpoint already has it
+
+    API:
+    due - returns True if the next agent step should be extracted and passed to append
+    append - records the extracted table of the next agent step
+    skip - moves on to the next agent step without recording it
+    checkpoint - hands the buffered records to the stream and returns the state needed to resume
+    restore - resumes from the state returned by checkpoint
+    close - hands the remaining records to the stream
+    """
+    def __init__(self, stream, stride=1, on_change=False, cells=CELLS):
+        self.stride = stride
+        self.on_change = on_change
+        self.step = 0
+        self.buffer = np.zeros(CHUNK, dtype=record_dtype(cells))
+        self.count = 0
+        self.last = None
+        self.stream = stream
+        if stream.offset is None:
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header['magic'] = MAGIC
+            header['version'] = VERSION
+            header['cells'] = cells
+            self.stream.append(header.tobytes())
+
+    def due(self):
+        return self.step % self.stride == 0
+
+    def skip(self):
+        self.step += 1
+
+    def append(self, table):
+        """
+        arguments:
+        table - (strength, moves) as returned by Agent.extract_table
+        """
+        strength, moves = table
+        strength = strength.astype(np.float32)
+        if self.on_change and self.last is not None and \
+                np.array_equal(strength, self.last[0]) and np.array_equal(moves, self.last[1]):
+            self.step += 1
+            return
+        self.last = (strength, moves)
+        record = self.buffer[self.count]
+        record['step'] = self.step
+        record['strength'] = strength
+        record['move'] = moves
+        self.count += 1
+        self.step += 1
+        if self.count == CHUNK:
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            self.stream.append(self.buffer[:self.count].tobytes())
+        self.count = 0
+
+    def checkpoint(self):
+        self.flush()
+        return {'step': self.step, 'last': self.last}
+
+    def restore(self, state):
+        self.step = state['step']
+        self.last = state['last']
+
+    def close(self):
+        self.flush()
+
+class TableDump:
+    """
+    Memory-mapped view of a binary dump file.
+    Indexing with an agent step returns (strength, moves) of the last record dumped at or before that step,
+    so dumps written with a stride or on change are read exactly like complete ones.
+    """
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header['magic'][0] != MAGIC or header['version'][0] != VERSION:
+            raise ValueError(f'{path} is not a Q-table dump')
+        dtype = record_dtype(int(header['cells'][0]))
+        try:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_DTYPE.itemsize)
+        except ValueError:
+            # no records were written
+            self.records = np.zeros(0, dtype=dtype)
+        steps = self.records['step']
+        # record index of every agent step, built once so that every lookup is O(1)
+        self.lookup = np.searchsorted(steps, np.arange(steps[-1] + 1 if len(steps) else 0), side='right') - 1
+
+    def __len__(self):
+        return len(self.lookup)
+
+    def __getitem__(self, step):
+        record = self.records[self.lookup[min(step, len(self.lookup) - 1)]]
+        return record['strength'], [MOVE_NAMES[m] for m in record['move']]
+
+def load_strengths_moves(path):
+    """
+    returns the strengths and move names of every agent step of a dump as two arrays
+    """
+    dump = TableDump(path)
+    records = dump.records[dump.lookup]
+    return records['strength'].astype(float), np.array(MOVE_NAMES)[records['move']]
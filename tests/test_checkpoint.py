@@ -0,0 +1,63 @@
+import os
+import filecmp
+import pickle
+import pytest
+from randomStream import RandomStream
+from checkpoint import MAGIC, VERSION, save_checkpoint, load_checkpoint, check_config
+from generate_csv import Args
+from main import experiment
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'checkpoint.bin')
+    state = {'n': 1500, 'queue': [1], 'offsets': {'out/steps.bin': 22500}}
+    save_checkpoint(path, state)
+    loaded = load_checkpoint(path)
+    assert loaded.pop('version') == VERSION
+    assert loaded == state
+    assert os.listdir(tmp_path) == ['checkpoint.bin']
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'checkpoint.bin'
+    path.write_bytes(b'not a checkpoint')
+    with pytest.raises(ValueError):
+        load_checkpoint(str(path))
+    path.write_bytes(MAGIC + pickle.dumps({'version': 0}))
+    with pytest.raises(ValueError):
+        load_checkpoint(str(path))
+
+def test_check_config():
+    check_config('checkpoint.bin', {'seed': 1, 'steps': 10}, {'seed': 1})
+    with pytest.raises(ValueError):
+        check_config('checkpoint.bin', {'seed': 1}, {'seed': 2})
+
+def test_random_stream_restore():
+    stream = RandomStream(5, block=8)
+    for _ in range(13):
+        stream.random()
+    position = stream.checkpoint()
+    expected = [stream.random() for _ in range(20)]
+    resumed = RandomStream(0, block=8)
+    resumed.restore(pickle.loads(pickle.dumps(position)))
+    assert [resumed.random() for _ in range(20)] == expected
+
+def run(out_dir, steps, table, **options):
+    args = Args('2', 5, 'ms', os.path.join(out_dir, 'visualization.csv'), out_dir)
+    args.dump_tables = True
+    args.steps = steps
+    args.table_backend = table
+    for key, value in options.items():
+        setattr(args, key, value)
+    os.makedirs(out_dir, exist_ok=True)
+    experiment(args)
+
+@pytest.mark.parametrize('table', ['dense64', 'dense32', 'sparse'])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, table):
+    whole, resumed = str(tmp_path / 'whole'), str(tmp_path / 'resumed')
+    run(whole, 3000, table)
+    # stopped after the checkpoint of move 1300, its last 400 moves are written again when resuming
+    run(resumed, 1701, table, checkpoint_every=1300)
+    run(resumed, 3000, table, resume=True)
+    names = sorted(os.listdir(whole))
+    assert sorted(name for name in os.listdir(resumed) if name != 'checkpoint.bin') == names
+    match, mismatch, errors = filecmp.cmpfiles(whole, resumed, names, shallow=False)
+    assert mismatch == [] and errors == []
@@ -0,0 +1,69 @@
+import os
+import json
+import filecmp
+import pytest
+from layout import load_layouts
+from generate_csv import Args
+from goldenTrace import load_trace, first_divergence
+from fastEngine import check_options
+from main import experiment
+
+def run(out_dir, engine, experiment_id, rl_type, table='dense64', **options):
+    os.makedirs(out_dir, exist_ok=True)
+    args = Args(experiment_id, 3, rl_type, os.path.join(out_dir, 'visualization.csv'), out_dir)
+    args.dump_tables = True
+    args.steps = 6000
+    args.table_backend = table
+    args.engine = engine
+    args.trace = os.path.join(out_dir, 'trace.npz')
+    args.trace_every = 50
+    for key, value in options.items():
+        setattr(args, key, value)
+    return experiment(args)
+
+def assert_replays(tmp_path, experiment_id, rl_type, table='dense64', **options):
+    """
+    runs both engines, in directories of their own, and checks their traces and output files are identical
+    """
+    reference, fast = str(tmp_path / 'reference'), str(tmp_path / 'fast')
+    assert run(reference, 'reference', experiment_id, rl_type, table, **options) == \
+        run(fast, 'fast', experiment_id, rl_type, table, **options)
+    assert first_divergence(load_trace(os.path.join(reference, 'trace.npz')),
+                            load_trace(os.path.join(fast, 'trace.npz'))) is None
+    names = sorted(os.listdir(reference))
+    assert sorted(os.listdir(fast)) == names
+    match, mismatch, errors = filecmp.cmpfiles(reference, fast, names, shallow=False)
+    assert mismatch == [] and errors == []
+
+@pytest.mark.parametrize('experiment_id, rl_type, table', [('1c', 'ss', 'dense64'), ('2', 'vs', 'dense64'),
+                                                            ('4', 'ms', 'dense32')])
+def test_fast_engine_matches_reference(tmp_path, experiment_id, rl_type, table):
+    assert_replays(tmp_path, experiment_id, rl_type, table)
+
+@pytest.mark.parametrize('rl_type', ['ss', 'ms'])
+def test_step_layout_switch_matches_reference(tmp_path, rl_type):
+    # the world is reset to the modified layout from the first terminal state after move 1500 on
+    schedule = tmp_path / 'schedules.json'
+    schedule.write_text(json.dumps({'5': {'events': [{'step': 500, 'policy': 'PExploit'},
+                                                     {'step': 1500, 'layout': 'modified'}]}}))
+    assert_replays(tmp_path, '5', rl_type, schedule=str(schedule))
+
+@pytest.mark.parametrize('rl_type', ['ss', 'ms'])
+def test_layout_capacities_match_reference(tmp_path, rl_type):
+    layouts = {name: layout.to_dict() for name, layout in load_layouts().items()}
+    layouts['modified']['dropoff_capacity'] = 3
+    layouts['modified']['pickup_blocks'] = 7
+    path = tmp_path / 'layouts.json'
+    path.write_text(json.dumps(layouts))
+    assert_replays(tmp_path, '4', rl_type, layout=str(path))
+
+@pytest.mark.parametrize('option, value', [('table_backend', 'sparse'), ('instrument', True),
+                                           ('checkpoint_every', 100), ('resume', True), ('transition_cache', 64)])
+def test_unsupported_options_are_rejected(tmp_path, option, value):
+    args = Args('1a', 3, 'ss', os.devnull, str(tmp_path))
+    args.engine = 'fast'
+    setattr(args, option, value)
+    with pytest.raises(ValueError):
+        check_options(args)
+    with pytest.raises(ValueError):
+        experiment(args)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from qtable import TABLES, make_table
+
+KINDS = list(TABLES)
+STATES, ACTIONS = 6, 8
+
+def expected_best(table, state):
+    row = np.asarray(table.values(state))
+    bits = sum(1 << a for a in np.flatnonzero(row == row.max()))
+    return row.max(), bits
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_max_decrease_rescans_the_row(kind):
+    table = make_table(kind, STATES, ACTIONS, greedy=True)
+    table.set(2, 3, 5.0)
+    table.set(2, 6, 4.0)
+    assert table.best(2) == (5.0, 1 << 3)
+    table.set(2, 3, 1.0)
+    assert table.best(2) == (4.0, 1 << 6)
+    table.set(2, 6, -1.0)
+    # the untouched actions hold the maximum, 0
+    assert table.best(2) == (1.0, 1 << 3)
+    table.set(2, 3, -2.0)
+    assert table.best(2) == (0.0, 0xff & ~(1 << 3) & ~(1 << 6))
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_ties_keep_every_best_action(kind):
+    table = make_table(kind, STATES, ACTIONS, greedy=True)
+    table.set(0, 1, 2.0)
+    table.set(0, 4, 2.0)
+    assert table.best(0) == (2.0, (1 << 1) | (1 << 4))
+    table.set(0, 1, 1.5)
+    assert table.best(0) == (2.0, 1 << 4)
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_random_updates_match_a_scan(kind):
+    table = make_table(kind, STATES, ACTIONS, greedy=True)
+    rng = np.random.default_rng(7)
+    for _ in range(3000):
+        state, action = int(rng.integers(STATES)), int(rng.integers(ACTIONS))
+        # few distinct values, so ties and decreases of the maximum are frequent
+        table.set(state, action, float(rng.integers(-3, 4)) / 2)
+        assert table.best(state) == expected_best(table, state)
+    strength, held = table.best_rows(np.arange(STATES))
+    for state in range(STATES):
+        best, bits = expected_best(table, state)
+        assert strength[state] == best
+        assert held[state].tolist() == [bool(bits >> a & 1) for a in range(ACTIONS)]
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_restore_rebuilds_the_cache(kind):
+    table = make_table(kind, STATES, ACTIONS, greedy=True)
+    table.set(4, 2, 3.0)
+    table.set(5, 7, -1.0)
+    restored = make_table(kind, STATES, ACTIONS, greedy=True)
+    restored.restore(table.checkpoint())
+    for state in range(STATES):
+        assert restored.best(state) == table.best(state)
+    assert np.array_equal(restored.rows(np.arange(STATES)), table.rows(np.arange(STATES)))
+
+def test_sparse_reads_do_not_grow_the_cache():
+    table = make_table('sparse', STATES, ACTIONS, greedy=True)
+    size = table.nbytes()
+    for state in range(STATES):
+        assert table.best(state) == (0.0, 0xff)
+    table.best_rows(np.arange(STATES))
+    assert not table.maxima and not table.argmax
+    assert table.nbytes() == size
+    table.set(3, 1, -1.0)
+    assert list(table.maxima) == list(table.argmax) == [3]
+    assert table.best(3) == (0.0, 0xff & ~(1 << 1))
+
+@pytest.mark.parametrize('kind', ['dense64', 'dense32'])
+def test_nbytes_counts_the_cache(kind):
+    table = make_table(kind, STATES, ACTIONS)
+    greedy = make_table(kind, STATES, ACTIONS, greedy=True)
+    # a maximum of the storage's dtype and a byte of bits per state
+    itemsize = table.rows([0]).dtype.itemsize
+    assert greedy.nbytes() == table.nbytes() + STATES*(itemsize + 1)
+
+def test_nbytes_counts_the_sparse_cache():
+    table = make_table('sparse', STATES, ACTIONS)
+    greedy = make_table('sparse', STATES, ACTIONS, greedy=True)
+    table.set(2, 0, 1.0)
+    greedy.set(2, 0, 1.0)
+    assert greedy.nbytes() > table.nbytes()
@@ -0,0 +1,21 @@
+from randomStream import RandomStream, spawn_streams, spawn_tie_rngs
+from cell import AGENT_F, AGENT_M
+
+def test_draws_only_depend_on_the_seed():
+    # across block boundaries, whatever mix of random, integer and choice consumes the draws
+    a, b = RandomStream(4, block=16), RandomStream(4, block=16)
+    for i in range(40):
+        u = a.random()
+        assert 0 <= u < 1
+        if i % 2:
+            assert b.integer(10) == int(u * 10)
+        else:
+            assert b.choice('abcdefg') == 'abcdefg'[int(u * 7)]
+
+def test_spawned_generators_are_independent():
+    streams = spawn_streams(7)
+    ties = spawn_tie_rngs(7)
+    draws = [[stream.random() for _ in range(8)] for stream in streams] + [rng.random(8).tolist() for rng in ties]
+    assert len({tuple(d) for d in draws}) == 4
+    assert spawn_tie_rngs(7)[AGENT_M].random(8).tolist() == draws[2 + AGENT_M]
+    assert spawn_tie_rngs(8)[AGENT_F].random(8).tolist() != draws[2 + AGENT_F]
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pytest
+from action import MASK_ACTIONS, ACT_DROPOFF
+from cell import AGENT_F, AGENT_M
+from layout import load_layouts, Layout
+from rlw import RL_SPACES
+from stateSpace import StateSpace
+from reachability import CompactSpace, make_space, cache_key
+
+LAYOUTS = load_layouts()
+
+def compact(rl_type, cache_dir=None):
+    return CompactSpace(RL_SPACES[rl_type](LAYOUTS['original']), [LAYOUTS['original'], LAYOUTS['modified']],
+                        cache_dir)
+
+@pytest.mark.parametrize('rl_type', ['ss', 'vs', 'ms'])
+def test_reachable_ids_map_to_dense_ids(rl_type):
+    space = compact(rl_type)
+    reachable = space.reachable
+    assert np.all(np.diff(reachable) > 0)
+    assert space.states() == len(reachable) + 1
+    assert np.array_equal(space.index[reachable], np.arange(1, len(reachable) + 1))
+    unreachable = np.setdiff1d(np.arange(space.space.states()), reachable)
+    assert not space.index[unreachable].any()
+
+@pytest.mark.parametrize('rl_type', ['ss', 'vs', 'ms'])
+def test_visited_states_are_reachable(rl_type):
+    space = compact(rl_type)
+    rng = np.random.default_rng(3)
+    world = StateSpace(LAYOUTS['original'])
+    agent = AGENT_F
+    resets = 0
+    for step in range(3000):
+        for a in (AGENT_F, AGENT_M):
+            full = space.space.map_state(world, a)
+            assert space.map_state(world, a) == space.index[full] != 0
+        # Pickup and Dropoff are taken whenever applicable, as the policies do, so episodes end
+        actions = MASK_ACTIONS[world.applicable_mask(agent)]
+        action = actions[0] if actions[0] <= ACT_DROPOFF else actions[rng.integers(len(actions))]
+        world.perform_action(agent, action)
+        agent = 1 - agent
+        if world.is_complete():
+            world.reset(LAYOUTS['modified' if step > 1500 else 'original'])
+            agent = AGENT_F
+            resets += 1
+    assert resets > 2
+
+@pytest.mark.parametrize('capacity, pickup_blocks', [(3, 7), (6, 12)])
+def test_visited_states_are_reachable_with_other_capacity(capacity, pickup_blocks):
+    # the modified layout fills its Dropoff cells with fewer or more blocks than the original one, and may
+    # end with blocks left on its Pickup cells
+    modified = Layout('modified', **dict(LAYOUTS['modified'].to_dict(), dropoff_capacity=capacity,
+                                         pickup_blocks=pickup_blocks))
+    space = make_space('ms', {'original': LAYOUTS['original'], 'modified': modified})
+    rng = np.random.default_rng(4)
+    world = StateSpace(modified)
+    agent = AGENT_F
+    resets = 0
+    for step in range(5000):
+        actions = MASK_ACTIONS[world.applicable_mask(agent)]
+        action = actions[0] if actions[0] <= ACT_DROPOFF else actions[rng.integers(len(actions))]
+        world.perform_action(agent, action)
+        # terminal states included, which the agents see as the new state of their last update
+        for a in (AGENT_F, AGENT_M):
+            assert space.map_state(world, a) != 0
+        agent = 1 - agent
+        if world.is_complete():
+            world.reset(modified)
+            agent = AGENT_F
+            resets += 1
+    assert resets > 2
+
+def test_reachable_ids_are_cached(tmp_path):
+    space = compact('ms', str(tmp_path))
+    assert os.listdir(tmp_path) == [cache_key(space.space, [LAYOUTS['original'], LAYOUTS['modified']])]
+    assert np.array_equal(compact('ms', str(tmp_path)).reachable, space.reachable)
+
+def test_full_tables_keep_every_state():
+    space = make_space('vs', LAYOUTS, full_tables=True)
+    assert type(space) is RL_SPACES['vs']
+    assert isinstance(make_space('vs', LAYOUTS), CompactSpace)
@@ -0,0 +1,57 @@
+import json
+import pytest
+from schedule import NEVER, Schedule, get_schedule
+
+DEFINITION = {'alpha': 0.2, 'events': [{'step': 300, 'alpha': 0.1},
+                                       {'step': 100, 'policy': 'PGreedy'},
+                                       {'step': 100, 'learning': 'sarsa'},
+                                       {'terminal': 2, 'layout': 'modified'},
+                                       {'terminal': 4, 'stop': True}]}
+
+def test_initial_parameters():
+    schedule = Schedule(DEFINITION)
+    assert (schedule.alpha, schedule.gamma, schedule.policy, schedule.learning, schedule.layout) == \
+        (0.2, 0.5, 'PRandom', 'ql', 'original')
+
+def test_advance_merges_and_sorts_step_events():
+    schedule = Schedule(DEFINITION)
+    assert schedule.next_step == 100
+    assert schedule.advance() == {'policy': 'PGreedy', 'learning': 'sarsa'}
+    assert schedule.next_step == 300
+    assert schedule.advance() == {'alpha': 0.1}
+    assert schedule.next_step == NEVER
+
+@pytest.mark.parametrize('n, next_step', [(0, 100), (99, 100), (100, 300), (299, 300), (300, NEVER), (5000, NEVER)])
+def test_seek(n, next_step):
+    schedule = Schedule(DEFINITION)
+    schedule.advance()
+    schedule.seek(n)
+    assert schedule.next_step == next_step
+
+def test_at_terminal():
+    schedule = Schedule(DEFINITION)
+    assert schedule.at_terminal(1) == {}
+    assert schedule.at_terminal(2) == {'layout': 'modified'}
+    assert schedule.at_terminal(4) == {'stop': True}
+
+@pytest.mark.parametrize('definition', [
+    {'beta': 1},
+    {'events': [{'policy': 'PGreedy'}]},
+    {'events': [{'step': 1, 'terminal': 1, 'policy': 'PGreedy'}]},
+    {'events': [{'step': 0, 'policy': 'PGreedy'}]},
+    {'events': [{'step': 10, 'stop': True}]},
+    {'events': [{'step': 10, 'policy': 'PBest'}]},
+    {'events': [{'terminal': 1, 'layout': 'rotated'}]},
+])
+def test_rejects_invalid_definitions(definition):
+    with pytest.raises(ValueError):
+        Schedule(definition)
+
+def test_presets_and_files(tmp_path):
+    assert get_schedule('4').at_terminal(6) == {'stop': True}
+    path = tmp_path / 'schedules.json'
+    path.write_text(json.dumps({'5': DEFINITION}))
+    assert get_schedule('5', str(path)).alpha == 0.2
+    assert get_schedule('1a', str(path)).next_step == NEVER
+    with pytest.raises(ValueError):
+        get_schedule('5')
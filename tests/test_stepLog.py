@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from action import ACTIONS
+from cell import AGENT_F, AGENT_M
+from recorder import HistoryWriter, RecordStream
+from stepLog import STEP_DTYPE, STEP_LOG, load_step_log, agent_actions, episode_lengths, export_history
+
+# (step, agent, action, reward, distance, episode, terminal) of two episodes, the second one unfinished
+STEPS = [(1, AGENT_F, 2, -1, 3, 0, False), (2, AGENT_M, 0, 14, 4, 0, False), (3, AGENT_F, 7, -2, 2, 0, True),
+         (4, AGENT_F, 1, 14, 2, 1, False), (5, AGENT_M, 5, -1, 1, 1, False)]
+
+def write_log(path, steps, offsets=None, chunk=2):
+    writer = HistoryWriter(chunk=chunk, offsets=offsets)
+    log = writer.open_records(str(path), STEP_DTYPE)
+    for step in steps:
+        log.append(step)
+    writer.close()
+
+def test_round_trip(tmp_path):
+    path = tmp_path / STEP_LOG
+    write_log(path, STEPS)
+    log = load_step_log(str(path))
+    assert path.stat().st_size == len(STEPS) * STEP_DTYPE.itemsize == len(STEPS) * 15
+    assert [tuple(record) for record in log.tolist()] == STEPS
+    assert agent_actions(log, AGENT_F).tolist() == [2, 7, 1]
+    assert agent_actions(log, AGENT_M).tolist() == [0, 5]
+    assert episode_lengths(log).tolist() == [3]
+
+def test_empty_log(tmp_path):
+    write_log(tmp_path / STEP_LOG, [])
+    log = load_step_log(str(tmp_path / STEP_LOG))
+    assert len(log) == 0 and episode_lengths(log).tolist() == []
+
+def test_resume_truncates_and_appends(tmp_path):
+    path = tmp_path / STEP_LOG
+    writer = HistoryWriter(chunk=2)
+    log = writer.open_records(str(path), STEP_DTYPE)
+    for step in STEPS[:2]:
+        log.append(step)
+    offsets = writer.sync()
+    # steps written after the checkpoint, lost when the run is interrupted
+    log.append((3, AGENT_F, 6, -1, 9, 0, False))
+    writer.close()
+    write_log(path, STEPS[2:], offsets)
+    assert [tuple(record) for record in load_step_log(str(path)).tolist()] == STEPS
+
+def test_rejects_padded_dtypes(tmp_path):
+    writer = HistoryWriter()
+    with pytest.raises(ValueError):
+        RecordStream(writer, str(tmp_path / STEP_LOG), np.dtype([('step', '<u4'), ('agent', 'u1')], align=True))
+    writer.close()
+
+def test_exports(tmp_path):
+    write_log(tmp_path / STEP_LOG, STEPS)
+    export_history(str(tmp_path), str(tmp_path / 'visualization.csv'))
+    assert (tmp_path / 'f_actions').read_text().splitlines() == [ACTIONS[2], ACTIONS[7], ACTIONS[1]]
+    assert (tmp_path / 'm_actions').read_text().splitlines() == [ACTIONS[0], ACTIONS[5]]
+    assert (tmp_path / 'visualization.csv').read_bytes().decode().split('\r\n')[:2] == ['1,-1,3,F', '2,14,4,M']
+    assert (tmp_path / 'terminal_states').read_bytes() == b'Steps\r\n3\r\n'
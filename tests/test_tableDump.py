@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from action import MOVE_NAMES
+from recorder import HistoryWriter
+from tableDump import TableDumpWriter, TableDump, load_strengths_moves
+
+CELLS = 6
+
+def random_tables(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [(rng.random(CELLS), rng.integers(0, len(MOVE_NAMES), CELLS).astype(np.uint8)) for _ in range(n)]
+
+def write_dump(path, tables, stride=1, on_change=False):
+    writer = HistoryWriter()
+    dump = TableDumpWriter(writer.open_binary(str(path)), stride, on_change, CELLS)
+    for table in tables:
+        if dump.due():
+            dump.append(table)
+        else:
+            dump.skip()
+    dump.close()
+    writer.close()
+
+def test_round_trip(tmp_path):
+    # more tables than a chunk, so records are handed to the writer in several chunks
+    tables = random_tables(1500)
+    write_dump(tmp_path / 'f_table.bin', tables)
+    dump = TableDump(tmp_path / 'f_table.bin')
+    assert len(dump) == len(tables)
+    for step in (0, 1, 1023, 1024, 1499):
+        strength, moves = dump[step]
+        assert np.array_equal(strength, tables[step][0].astype(np.float32))
+        assert moves == [MOVE_NAMES[m] for m in tables[step][1]]
+
+def test_stride_reads_last_dumped_record(tmp_path):
+    tables = random_tables(10)
+    write_dump(tmp_path / 'f_table.bin', tables, stride=3)
+    dump = TableDump(tmp_path / 'f_table.bin')
+    assert len(dump.records) == 4
+    for step in range(10):
+        strength, _ = dump[step]
+        assert np.array_equal(strength, tables[step - step % 3][0].astype(np.float32))
+
+def test_on_change_skips_repeated_tables(tmp_path):
+    first, second = random_tables(2)
+    tables = [first, first, first, second, second]
+    write_dump(tmp_path / 'f_table.bin', tables, on_change=True)
+    strengths, moves = load_strengths_moves(tmp_path / 'f_table.bin')
+    assert len(TableDump(tmp_path / 'f_table.bin').records) == 2
+    assert strengths.shape == (4, CELLS)
+    assert np.array_equal(strengths[2], first[0].astype(np.float32))
+    assert np.array_equal(strengths[3], second[0].astype(np.float32))
+
+def test_empty_dump(tmp_path):
+    write_dump(tmp_path / 'f_table.bin', [])
+    assert len(TableDump(tmp_path / 'f_table.bin')) == 0
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'f_table.bin'
+    path.write_bytes(b'not a dump at all')
+    with pytest.raises(ValueError):
+        TableDump(path)
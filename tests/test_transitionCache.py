@@ -0,0 +1,86 @@
+import os
+import filecmp
+import numpy as np
+from action import MASK_ACTIONS
+from cell import AGENT_F, AGENT_M
+from layout import load_layouts
+from reachability import make_space
+from stateSpace import StateSpace
+from transitionCache import TransitionCache, CachedWorld, CachedSpace
+from generate_csv import Args
+from main import experiment
+
+LAYOUTS = load_layouts()
+
+def walk(capacity, steps=2000, space=None):
+    """
+    steps a StateSpace and a CachedWorld through the same random actions, returning the cache
+    The RL states of both agents are compared as well if an RL space is given
+    """
+    cache = TransitionCache(LAYOUTS['original'], capacity)
+    cached = CachedWorld(cache, LAYOUTS['original'])
+    cached_space = CachedSpace(space, cache) if space is not None else None
+    world = StateSpace(LAYOUTS['original'])
+    rng = np.random.default_rng(1)
+    agent = AGENT_F
+    for _ in range(steps):
+        assert cached.applicable_mask(agent) == world.applicable_mask(agent)
+        actions = MASK_ACTIONS[world.applicable_mask(agent)]
+        action = actions[rng.integers(len(actions))]
+        assert cached.perform_action(agent, action) == world.perform_action(agent, action)
+        assert cached.snapshot() == world.snapshot()
+        assert cached.loc == world.loc and cached.carrying == world.carrying
+        assert cached.is_complete() == world.is_complete()
+        if space is not None:
+            for a in (AGENT_F, AGENT_M):
+                assert cached_space.map_state(cached, a) == space.map_state(world, a)
+        agent = 1 - agent
+        # revisit the start of the episode now and then, so transitions are served from the cache
+        if rng.random() < 0.01:
+            world.reset(LAYOUTS['original'])
+            cached.reset(LAYOUTS['original'])
+            agent = AGENT_F
+    return cache
+
+def test_cached_world_matches_state_space():
+    stats = walk(1 << 16).stats()
+    assert stats['hits'] > 0 and stats['evictions'] == 0
+
+def test_least_recently_used_transitions_are_evicted():
+    stats = walk(32).stats()
+    assert stats['transitions'] == 32
+    assert stats['evictions'] == stats['misses'] - 32
+
+def test_interned_worlds_are_evicted_with_their_transitions():
+    cache = walk(32, steps=5000, space=make_space('ms', LAYOUTS))
+    # every cached transition holds at most two worlds, and the walk the world it is in
+    assert cache.stats()['worlds'] <= 2*32 + 1
+    assert len(cache.worlds) <= 2*32 + 1
+    assert sum(world is not None for world in cache.worlds) == len(cache.ids)
+    assert cache.stats()['evictions'] > 1000
+    held = {key >> 4 for key in cache.transitions} | {world for world, _ in cache.transitions.values()}
+    assert held <= set(cache.ids.values())
+
+def test_intern_snapshot_round_trip():
+    cache = TransitionCache(LAYOUTS['original'])
+    world = StateSpace(LAYOUTS['original'])
+    world.perform_action(AGENT_M, MASK_ACTIONS[world.applicable_mask(AGENT_M)][0])
+    id = cache.intern(world)
+    assert cache.intern_snapshot(world.snapshot()) == id
+    assert cache.materialize(id).snapshot() == world.snapshot()
+    assert cache.intern(StateSpace(LAYOUTS['original'])) != id
+
+def test_cached_run_matches_reference(tmp_path):
+    outputs = []
+    for name, capacity in (('reference', None), ('cached', 256)):
+        out_dir = str(tmp_path / name)
+        os.makedirs(out_dir)
+        args = Args('4', 9, 'ms', os.path.join(out_dir, 'visualization.csv'), out_dir)
+        args.dump_tables = True
+        args.steps = 3000
+        args.transition_cache = capacity
+        experiment(args)
+        outputs.append(out_dir)
+    names = sorted(os.listdir(outputs[0]))
+    match, mismatch, errors = filecmp.cmpfiles(*outputs, names, shallow=False)
+    assert match == names
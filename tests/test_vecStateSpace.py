@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+from action import ACTIONS, MASK_ACTIONS, ACT_DROPOFF
+from agent import Agent
+from cell import AGENTS, AGENT_F, AGENT_M
+from layout import load_layouts, Layout
+from policy import PExploit
+from randomStream import spawn_streams
+from reachability import make_space
+from stateSpace import StateSpace
+from vecStateSpace import VecStateSpace, VecLearner, vec_experiment, LEARNING_CODES
+
+def layouts_with_capacity(capacity, pickup_blocks):
+    layouts = load_layouts()
+    modified = dict(layouts['modified'].to_dict(), dropoff_capacity=capacity, pickup_blocks=pickup_blocks)
+    return {'original': layouts['original'], 'modified': Layout('modified', **modified)}
+
+def mask_bits(mask):
+    return sum(1 << a for a in np.flatnonzero(mask))
+
+@pytest.mark.parametrize('capacity, pickup_blocks', [(3, 7), (6, 12)])
+@pytest.mark.parametrize('rl_type', ['ss', 'ms'])
+def test_worlds_match_state_spaces(rl_type, capacity, pickup_blocks):
+    # the worlds switch to a modified layout whose Dropoff cells are filled with fewer or more blocks than
+    # the original ones after their first terminal state
+    layouts = layouts_with_capacity(capacity, pickup_blocks)
+    n = 4
+    vec = VecStateSpace(n, layouts=layouts)
+    worlds = [StateSpace(layouts['original']) for _ in range(n)]
+    space = make_space(rl_type, layouts)
+    rng = np.random.default_rng(2)
+    agent = np.full(n, AGENT_F)
+    terminals = np.zeros(n, dtype=int)
+    for _ in range(4000):
+        mask = vec.applicable_mask(agent)
+        action = np.empty(n, dtype=np.int64)
+        for i, world in enumerate(worlds):
+            assert mask_bits(mask[i]) == world.applicable_mask(agent[i])
+            # Pickup and Dropoff are taken whenever applicable, as the policies do, so episodes end
+            actions = MASK_ACTIONS[world.applicable_mask(agent[i])]
+            action[i] = actions[0] if actions[0] <= ACT_DROPOFF else actions[rng.integers(len(actions))]
+        reward = vec.perform_action(agent, action)
+        for i, world in enumerate(worlds):
+            assert reward[i] == world.perform_action(agent[i], action[i])
+            assert [vec.grid.cell_loc[c] for c in vec.loc[i]] == [tuple(world.loc[a]) for a in range(len(AGENTS))]
+            assert np.array_equal(vec.blocks[i], world.flat_blocks)
+        states = vec.map_state(rl_type, agent)
+        # every state visited is reachable, so none maps to the shared row 0 of the compacted tables
+        assert states.min() > 0
+        assert np.array_equal(states, [space.map_state(w, a) for w, a in zip(worlds, agent)])
+        complete = vec.is_complete()
+        assert complete.tolist() == [world.is_complete() for world in worlds]
+        terminals += complete
+        for i in np.flatnonzero(complete):
+            worlds[i].reset(layouts['modified'])
+        vec.reset(complete, 'modified')
+        agent = np.where(complete, AGENT_F, 1 - agent)
+    assert terminals.min() >= 2
+
+def test_worlds_draw_from_their_own_generators():
+    # the first worlds of a sweep run the same whatever worlds follow them
+    sweep = vec_experiment(['1a', '1c', '4', '1c'], 'ss', seed=5, steps=3000)
+    prefix = vec_experiment(['1a', '1c'], 'ss', seed=5, steps=3000)
+    for key in ('rewards', 'distances', 'agents', 'length'):
+        assert np.array_equal(sweep[key][:2], prefix[key])
+    assert sweep['terminals'][:2] == prefix['terminals']
+    # while worlds of the same experiment draw differently
+    assert not np.array_equal(sweep['rewards'][1], sweep['rewards'][3])
+
+@pytest.mark.parametrize('learning', ['ql', 'sarsa'])
+@pytest.mark.parametrize('rl_type', ['ss', 'ms'])
+def test_batched_steps_match_agents(rl_type, learning):
+    # a batched world takes the actions the agents of a main.py run choose for the same seed, and every
+    # step must make the same transition, get the same reward and update the same Q values
+    layouts = load_layouts()
+    space = make_space(rl_type, layouts)
+    world = StateSpace(layouts['original'])
+    streams = spawn_streams(7)
+    agents = [Agent(a, space, PExploit(a, space, ACTIONS, seed=7, stream=streams[a]), world, alpha=0.3, gamma=0.5)
+              for a in (AGENT_F, AGENT_M)]
+    vec = VecStateSpace(1, layouts=layouts)
+    learner = VecLearner(1, space.states(), 0.3, 0.5)
+    for a in agents:
+        a.set_learning(learning)
+    learner.learning[:] = LEARNING_CODES[learning]
+    learner.state[0] = [vec.map_state(rl_type, np.array([a]))[0] for a in (AGENT_F, AGENT_M)]
+    active = np.ones(1, dtype=bool)
+    all_states = np.arange(space.states())
+    agent = AGENT_F
+    terminals = 0
+    for _ in range(3000):
+        action = agents[agent].choose_action(world)
+        reward = world.perform_action(agent, action)
+        agents[agent].update(world, reward)
+
+        moving = np.array([agent])
+        vec_reward = vec.perform_action(moving, np.array([action]), active)
+        new_state = vec.map_state(rl_type, moving)
+        learner.update(moving, np.array([action]), vec_reward, new_state, vec.applicable_mask(moving), active)
+
+        assert vec_reward[0] == reward
+        assert [vec.grid.cell_loc[c] for c in vec.loc[0]] == [tuple(world.loc[a]) for a in range(len(AGENTS))]
+        assert np.array_equal(vec.blocks[0], world.flat_blocks)
+        assert new_state[0] == agents[agent].history.state(1)
+        # the rows QL and SARSA update, of the state before the move and the one before it
+        history = agents[agent].history
+        updated = [history.state(back) for back in range(2, len(history) + 1)]
+        assert np.array_equal(learner.table[0, agent, updated], agents[agent].table.rows(updated))
+
+        if world.is_complete():
+            assert vec.is_complete()[0]
+            world.reset(layouts['original'])
+            vec.reset(active, 'original')
+            agent = AGENT_F
+            terminals += 1
+        else:
+            agent = 1 - agent
+    assert terminals > 0
+    for a in (AGENT_F, AGENT_M):
+        assert np.array_equal(learner.table[0, a], agents[a].table.rows(all_states))
@@ -0,0 +1,247 @@
+from collections import OrderedDict
+from stateSpace import StateSpace
+from cell import AGENT_F, AGENT_M
+from rlw import RLSpace
+
+# Default number of transitions a TransitionCache keeps
+CAPACITY = 1 << 16
+
+class TransitionCache:
+    """
+    Interns worlds to compact integer ids and memoizes the transitions between them.
+    The real world is a small deterministic MDP, so the next world and reward of an action only depend on the
+    world it is taken in: a transition computed once by StateSpace.perform_action is served from a dict afterwards.
+    Transitions are evicted least recently used first, and an interned world with them once no cached transition
+    leads from or to it, its id being reused by the next world interned; a walk through the cache only holds
+    the world it is in, so at most 2*capacity + 1 worlds are kept.
+
+    Arguments:
+    layout - a layout.Layout, or the name of a preset layout, of the scratch world misses are computed on
+    capacity - number of transitions kept, at least 1
+
+    API:
+    intern - returns the id of the world a StateSpace object is in
+    intern_snapshot - returns the id of a world given as StateSpace.snapshot()
+    step - returns (next world id, reward, applicable mask of the agent in the next world) of an action of an agent
+    applicable_mask - returns the bitmask of the actions applicable to an agent in a world
+    materialize - returns a StateSpace in a world, the scratch world, valid until the next miss or materialize
+    stats - returns the hit/miss statistics
+    summary - returns the statistics as one line of text
+    """
+    def __init__(self, layout, capacity=CAPACITY):
+        if capacity < 1:
+            raise ValueError(f'a transition cache keeps at least 1 transition, not {capacity}')
+        self.capacity = capacity
+        self.scratch = StateSpace(layout)
+        # id of every interned snapshot, and the snapshot and applicable masks [F, M] of every id, None if evicted
+        self.ids = {}
+        self.worlds = []
+        self.masks = []
+        # number of cached transitions from or to every id, and the ids of the evicted worlds
+        self.refs = []
+        self.free = []
+        # per-id lists of the values memoized for the worlds by other objects, cleared when a world is evicted
+        self.memos = []
+        self.transitions = OrderedDict()
+        # world id the scratch world is in, a miss from it needs no restore
+        self.current = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _intern_scratch(self):
+        snapshot = self.scratch.snapshot()
+        world = self.ids.get(snapshot)
+        if world is None:
+            masks = [self.scratch.applicable_mask(AGENT_F), self.scratch.applicable_mask(AGENT_M)]
+            if self.free:
+                world = self.free.pop()
+                self.worlds[world] = snapshot
+                self.masks[world] = masks
+            else:
+                world = len(self.worlds)
+                self.worlds.append(snapshot)
+                self.masks.append(masks)
+                self.refs.append(0)
+            self.ids[snapshot] = world
+        self.current = world
+        return world
+
+    def _release(self, world):
+        # drops a reference to a world, evicting it with the last one
+        self.refs[world] -= 1
+        if not self.refs[world]:
+            del self.ids[self.worlds[world]]
+            self.worlds[world] = self.masks[world] = None
+            for memo in self.memos:
+                if world < len(memo):
+                    memo[world] = None
+            if self.current == world:
+                self.current = None
+            self.free.append(world)
+
+    def intern(self, state):
+        return self.intern_snapshot(state.snapshot())
+
+    def intern_snapshot(self, snapshot):
+        world = self.ids.get(snapshot)
+        if world is None:
+            self.scratch.restore(snapshot)
+            world = self._intern_scratch()
+        return world
+
+    def step(self, world, agent, action):
+        key = (world*2 + agent)*8 + action
+        transition = self.transitions.get(key)
+        if transition is not None:
+            self.hits += 1
+            self.transitions.move_to_end(key)
+        else:
+            self.misses += 1
+            if self.current != world:
+                self.scratch.restore(self.worlds[world])
+            reward = self.scratch.perform_action(agent, action)
+            transition = self.transitions[key] = (self._intern_scratch(), reward)
+            self.refs[world] += 1
+            self.refs[transition[0]] += 1
+            if len(self.transitions) > self.capacity:
+                key, (following, _) = self.transitions.popitem(last=False)
+                self.evictions += 1
+                self._release(key >> 4)
+                self._release(following)
+        return transition[0], transition[1], self.masks[transition[0]][agent]
+
+    def applicable_mask(self, world, agent):
+        return self.masks[world][agent]
+
+    def materialize(self, world):
+        if self.current != world:
+            self.scratch.restore(self.worlds[world])
+            self.current = world
+        return self.scratch
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions, 'transitions': len(self.transitions), 'capacity': self.capacity,
+                'worlds': len(self.ids)}
+
+    def summary(self):
+        s = self.stats()
+        return (f"Transition cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.1%} hit rate), "
+                f"{s['evictions']} evictions, {s['transitions']}/{s['capacity']} transitions, {s['worlds']} worlds")
+
+class CachedWorld:
+    """
+    A world stepped through a TransitionCache. It only holds the id of the current world, and offers the parts
+    of the StateSpace API the event loop, the agents and the policies use; perform_action and applicable_mask
+    are served by the cache without touching a StateSpace object.
+
+    Arguments:
+    cache - the TransitionCache
+    experiment - a layout.Layout, or the name of a preset layout, the world starts in
+
+    Properties:
+    id - id of the current world in the cache
+    grid - the action.Grid of the layout's size
+    """
+    def __init__(self, cache, experiment):
+        self.cache = cache
+        self.reset(experiment)
+
+    def reset(self, experiment):
+        scratch = self.cache.scratch
+        scratch.reset(experiment)
+        self.grid = scratch.grid
+        self.id = self.cache._intern_scratch()
+
+    def snapshot(self):
+        return self.cache.worlds[self.id]
+
+    def restore(self, snapshot):
+        self.id = self.cache.intern_snapshot(snapshot)
+
+    def perform_action(self, agent, action):
+        self.id, reward, _ = self.cache.step(self.id, agent, action)
+        return reward
+
+    def applicable_mask(self, agent):
+        return self.cache.masks[self.id][agent]
+
+    @property
+    def layout(self):
+        return self.cache.worlds[self.id][0]
+
+    @property
+    def loc(self):
+        snapshot = self.cache.worlds[self.id]
+        return [snapshot[1], snapshot[2]]
+
+    @property
+    def cell(self):
+        return [self.grid.cell_index(loc) for loc in self.loc]
+
+    @property
+    def carrying(self):
+        snapshot = self.cache.worlds[self.id]
+        return [snapshot[3], snapshot[4]]
+
+    def is_first_dropoff_filled(self):
+        return self.cache.worlds[self.id][5] == 1
+
+    def is_complete(self):
+        snapshot = self.cache.worlds[self.id]
+        return snapshot[5] == len(snapshot[6])
+
+    def materialize(self):
+        """
+        returns a StateSpace in the current world, valid until the next cache miss
+        """
+        return self.cache.materialize(self.id)
+
+    def get_state_representation(self):
+        return self.materialize().get_state_representation()
+
+class CachedSpace(RLSpace):
+    """
+    An RL space memoizing the RL states of both agents in every world of a TransitionCache,
+    for worlds stepped as CachedWorld objects
+
+    Arguments:
+    space - the RLSpace to memoize, possibly a reachability.CompactSpace
+    cache - the TransitionCache of the worlds
+    """
+    def __init__(self, space, cache):
+        self.space = space
+        self.cache = cache
+        self.observes_other = space.observes_other
+        self.observes_blocks = space.observes_blocks
+        self.layout = space.layout
+        self.size = space.size
+        self.grid = space.grid
+        # [F, M] RL states of every world id, None until the world is first mapped or once it is evicted
+        self.ids = []
+        cache.memos.append(self.ids)
+
+    def map_state(self, state, agent):
+        ids = self.ids
+        world = state.id
+        if world >= len(ids):
+            ids.extend([None]*(world + 1 - len(ids)))
+        row = ids[world]
+        if row is None:
+            scratch = self.cache.materialize(world)
+            row = ids[world] = [self.space.map_state(scratch, AGENT_F), self.space.map_state(scratch, AGENT_M)]
+        return row[agent]
+
+    def map_states(self, loc, carrying, other_loc, drop_blocks, pick_blocks):
+        return self.space.map_states(loc, carrying, other_loc, drop_blocks, pick_blocks)
+
+    def map_positions(self, state, agent):
+        return self.space.map_positions(state.materialize(), agent)
+
+    def shape(self):
+        return self.space.shape()
+
+    def states(self):
+        return self.space.states()
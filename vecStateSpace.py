@@ -0,0 +1,461 @@
+from cell import NORMAL, PICKUP as PICKUP_CELL, DROPOFF as DROPOFF_CELL, RISK, AGENTS, AGENT_F
+from action import ACTIONS, ACT_PICKUP, ACT_DROPOFF, ACT_NORTH, grid
+from layout import load_layouts
+from reachability import make_space
+from schedule import get_schedule
+import numpy as np
+import argparse
+import time
+
+# Policy codes
+P_RANDOM, P_GREEDY, P_EXPLOIT = 0, 1, 2
+# Learning codes
+QL, SARSA = 0, 1
+# Codes of the policies and learning methods by name
+POLICY_CODES = {'PRandom': P_RANDOM, 'PGreedy': P_GREEDY, 'PExploit': P_EXPLOIT}
+LEARNING_CODES = {'ql': QL, 'sarsa': SARSA}
+# Draws of every world per VecPolicies.choose call: the exploration draw and the keys of the random and greedy picks
+DRAWS = 1 + 2*len(ACTIONS)
+# Number of choose calls whose draws are generated at a time
+DRAW_BLOCK = 64
+
+class VecStateSpace:
+    def __init__(self, n, experiment='original', layouts=None, full_tables=False):
+        """
+        Constructor for N independent RW state spaces stepped in lockstep.
+
+        Arguments:
+        n - number of worlds
+        experiment - 'original' or 'modified', the layout every world starts with
+        layouts - dict of the 'original' and 'modified' layout.Layout, the presets if None
+        full_tables - whether the RL spaces of map_state keep every RL state, not only the reachable ones
+
+        Properties:
+        loc - (n, 2) cell index of agent F (column 0) and agent M (column 1)
+        carrying - (n, 2) True if the agent is carrying a block
+        cell_type - (n, cells) cell type code of every cell
+        blocks - (n, cells) number of blocks in every cell
+        pick - (n, pickups) cell index of each Pickup cell
+        drop - (n, dropoffs) cell index of each Dropoff cell
+        capacity - (n,) number of blocks that fill a Dropoff cell, that of the layout the world was reset to
+        """
+        self.layouts = load_layouts() if layouts is None else layouts
+        layout = self.layouts['original']
+        self.grid = grid(layout.size)
+        # cell coordinates and the (cells, 6) table of the cell reached by the moves ACTIONS[ACT_NORTH:],
+        # -1 if off the grid
+        self.coords = np.array(self.grid.cell_loc)
+        self.neighbor = np.array([row[ACT_NORTH:] for row in self.grid.neighbor])
+        # RL spaces of map_state, by type, compacted to the reachable states unless full_tables
+        self.full_tables = full_tables
+        self.spaces = {}
+        self.n = n
+        self.envs = np.arange(n)
+        self.loc = np.empty((n, 2), dtype=np.int64)
+        self.carrying = np.zeros((n, 2), dtype=bool)
+        self.cell_type = np.zeros((n, self.grid.cells), dtype=np.int8)
+        self.blocks = np.zeros((n, self.grid.cells), dtype=np.int32)
+        self.pick = np.empty((n, len(layout.pickups)), dtype=np.int64)
+        self.drop = np.empty((n, len(layout.dropoffs)), dtype=np.int64)
+        self.capacity = np.empty(n, dtype=np.int32)
+        self.reset(np.ones(n, dtype=bool), experiment)
+
+    def reset(self, envs, experiment='original'):
+        """
+        resets the selected worlds to the initial state of the given layout
+        returns nothing
+        arguments:
+        envs - (n,) boolean mask of the worlds to reset
+        experiment - 'original' or 'modified'
+        """
+        layout = self.layouts[experiment]
+        cells = self.grid.cell_index
+        self.loc[envs] = [cells(layout.start[agent]) for agent in AGENTS]
+        self.carrying[envs] = False
+        self.pick[envs] = [cells(loc) for loc in layout.pickups]
+        self.drop[envs] = [cells(loc) for loc in layout.dropoffs]
+        self.capacity[envs] = layout.dropoff_capacity
+        row = self._type_row(layout)
+        self.cell_type[envs] = row
+        self.blocks[envs] = np.where(row == PICKUP_CELL, layout.pickup_blocks, 0)
+
+    def _type_row(self, layout):
+        row = np.full(self.grid.cells, NORMAL, dtype=np.int8)
+        row[[self.grid.cell_index(loc) for loc in layout.pickups]] = PICKUP_CELL
+        row[[self.grid.cell_index(loc) for loc in layout.dropoffs]] = DROPOFF_CELL
+        row[[self.grid.cell_index(loc) for loc in layout.risks]] = RISK
+        return row
+
+    def applicable_mask(self, agent):
+        """
+        returns an (n, len(ACTIONS)) boolean array, True where ACTIONS[i] is applicable for the agent of each world
+        argument:
+        agent - (n,) agent index of every world, 0 for F and 1 for M
+        """
+        e = self.envs
+        pos = self.loc[e, agent]
+        other = self.loc[e, 1 - agent]
+        carrying = self.carrying[e, agent]
+        kind = self.cell_type[e, pos]
+        blocks = self.blocks[e, pos]
+        mask = np.empty((self.n, len(ACTIONS)), dtype=bool)
+        mask[:, ACT_PICKUP] = (kind == PICKUP_CELL) & ~carrying & (blocks > 0)
+        mask[:, ACT_DROPOFF] = (kind == DROPOFF_CELL) & carrying & (blocks < self.capacity)
+        nb = self.neighbor[pos]
+        mask[:, ACT_NORTH:] = (nb >= 0) & (nb != other[:, None])
+        return mask
+
+    def perform_action(self, agent, action, active=None):
+        """
+        performs one action in every active world, with the semantics of StateSpace.perform_action
+        returns an (n,) array of rewards
+        reward is 14 if action is 'Pickup' or 'Dropoff' or
+        reward is -1 if moving from normal cell and -2 if moving from risk cell
+        arguments:
+        agent - (n,) agent index of every world, 0 for F and 1 for M
+        action - (n,) action index into ACTIONS of every world
+        active - (n,) boolean mask of worlds to step, all worlds if None
+        """
+        e = self.envs
+        if active is None:
+            active = np.ones(self.n, dtype=bool)
+        mask = self.applicable_mask(agent)[e, action] & active
+        pos = self.loc[e, agent]
+
+        reward = np.where(self.cell_type[e, pos] == RISK, -2, -1)
+        reward[action <= ACT_DROPOFF] = 14
+
+        pickup = mask & (action == ACT_PICKUP)
+        self.blocks[e[pickup], pos[pickup]] -= 1
+        self.carrying[e[pickup], agent[pickup]] = True
+
+        dropoff = mask & (action == ACT_DROPOFF)
+        self.blocks[e[dropoff], pos[dropoff]] += 1
+        self.carrying[e[dropoff], agent[dropoff]] = False
+
+        move = mask & (action > ACT_DROPOFF)
+        self.loc[e[move], agent[move]] = self.neighbor[pos[move], action[move] - ACT_NORTH]
+        return reward
+
+    def is_complete(self):
+        """
+        returns an (n,) boolean array, True where all Dropoff cells of the world are full
+        """
+        return np.all(np.take_along_axis(self.blocks, self.drop, axis=1) == self.capacity[:, None], axis=1)
+
+    def distance(self):
+        """
+        returns an (n,) array of the Manhattan distance between the agents
+        """
+        return np.abs(self.coords[self.loc[:, 0]] - self.coords[self.loc[:, 1]]).sum(axis=1)
+
+    def space(self, rl_type):
+        """
+        returns the RL space of map_state for an RL space type, as main.py builds it (see reachability.make_space)
+        """
+        if rl_type not in self.spaces:
+            self.spaces[rl_type] = make_space(rl_type, self.layouts, self.full_tables)
+        return self.spaces[rl_type]
+
+    def map_state(self, rl_type, agent):
+        """
+        returns an (n,) array of RL state ids for the agent of every world (see rlw.RLSpace.map_states)
+        arguments:
+        rl_type - 'vs', 'ss' or 'ms'
+        agent - (n,) agent index of every world, 0 for F and 1 for M
+        """
+        e = self.envs
+        space = self.space(rl_type)
+        # the RL spaces only observe whether a Dropoff cell is full: full cells are given the capacity of the
+        # layout of the space, which is the count its map_states compares with, and the others no block, as
+        # StateSpace worlds compare their blocks with their own capacity
+        drop_blocks = np.take_along_axis(self.blocks, self.drop, axis=1)
+        drop_blocks = np.where(drop_blocks == self.capacity[:, None], space.layout.dropoff_capacity, 0)
+        return space.map_states(self.coords[self.loc[e, agent]], self.carrying[e, agent],
+                                self.coords[self.loc[e, 1 - agent]], drop_blocks,
+                                np.take_along_axis(self.blocks, self.pick, axis=1))
+
+class VecPolicies:
+    """
+    Batched PRANDOM, PGREEDY and PEXPLOIT action selection for N worlds.
+    Every world carries its own policy code, so worlds may run different policies in the same call.
+    Every world draws from its own generator, spawned from the SeedSequence of seed, so the draws of a world
+    only depend on the seed and its index, not on the other worlds.
+    The draws of a choose call are generated for block calls at a time, one generator call per world.
+    Results are statistically, not bit-for-bit, equivalent to the scalar Policy classes.
+    """
+    def __init__(self, n, seed=None, block=DRAW_BLOCK):
+        self.policy = np.full(n, P_RANDOM, dtype=np.int8)
+        self.rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n)]
+        self.block = block
+        # index in the block of the draws of the next choose call, a full block is drawn on the first one
+        self.index = block
+
+    def _draws(self):
+        """
+        returns an (n, DRAWS) array of the draws of the next choose call of every world
+        """
+        if self.index == self.block:
+            self.buffer = np.stack([rng.random((self.block, DRAWS)) for rng in self.rngs], axis=1)
+            self.index = 0
+        draws = self.buffer[self.index]
+        self.index += 1
+        return draws
+
+    def _pick(self, mask, keys):
+        """
+        returns one uniformly chosen True column of every row of mask, the one with the largest key
+        """
+        return np.argmax(np.where(mask, keys, -1.0), axis=1)
+
+    def choose(self, mask, q_rows):
+        """
+        returns an (n,) array of action indices
+        arguments:
+        mask - (n, len(ACTIONS)) applicable actions
+        q_rows - (n, len(ACTIONS)) Q values of the current RL state of every world
+        """
+        draws = self._draws()
+        forced = mask[:, ACT_PICKUP] | mask[:, ACT_DROPOFF]
+        forced_action = np.where(mask[:, ACT_PICKUP], ACT_PICKUP, ACT_DROPOFF)
+
+        explore = draws[:, 0] >= 0.85
+        use_random = (self.policy == P_RANDOM) | ((self.policy == P_EXPLOIT) & explore)
+
+        random_action = self._pick(mask, draws[:, 1:1 + len(ACTIONS)])
+        masked_q = np.where(mask, q_rows, -np.inf)
+        best = masked_q.max(axis=1, keepdims=True)
+        greedy_action = self._pick(mask & (masked_q == best), draws[:, 1 + len(ACTIONS):])
+
+        action = np.where(use_random, random_action, greedy_action)
+        return np.where(forced, forced_action, action)
+
+class VecLearner:
+    """
+    Batched QL and SARSA updates on per-world Q-tables of shape (n, 2, states, len(ACTIONS)).
+    states is the number of states of the RL space of the worlds, VecStateSpace.space(rl_type).states(), which
+    only counts the reachable ones unless the worlds keep full tables.
+    alpha and gamma are given for every world, or as a single value for all of them.
+    Mirrors Agent: the state recorded after an agent's own move is the one its next update refers to.
+    """
+    def __init__(self, n, states, alpha, gamma=0.5):
+        self.n = n
+        self.envs = np.arange(n)
+        self.alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (n,)).copy()
+        self.gamma = np.broadcast_to(np.asarray(gamma, dtype=float), (n,)).copy()
+        self.learning = np.full(n, QL, dtype=np.int8)
+        self.table = np.zeros((n, 2, states, len(ACTIONS)))
+        # last two history entries per agent: state, action, reward
+        self.state = np.zeros((n, 2), dtype=np.int64)
+        self.prev_state = np.zeros((n, 2), dtype=np.int64)
+        self.prev_action = np.zeros((n, 2), dtype=np.int64)
+        self.prev_reward = np.zeros((n, 2))
+        self.steps = np.zeros((n, 2), dtype=np.int64)
+
+    def rows(self, agent, states):
+        return self.table[self.envs, agent, states]
+
+    def update(self, agent, action, reward, new_state, new_mask, active):
+        """
+        updates the Q-tables of the moving agent of every active world
+        arguments:
+        agent - (n,) moving agent index
+        action - (n,) action taken
+        reward - (n,) reward obtained
+        new_state - (n,) RL state of the moving agent after the action
+        new_mask - (n, len(ACTIONS)) actions applicable to the moving agent after the action
+        active - (n,) boolean mask of worlds that stepped
+        """
+        e = self.envs
+        s = self.state[e, agent]
+        old_q = self.table[e, agent, s, action]
+
+        best_next = np.where(new_mask, self.table[e, agent, new_state], -2.0**32).max(axis=1)
+        ql = (1 - self.alpha)*old_q + self.alpha*(reward + self.gamma*best_next)
+        ql_envs = active & (self.learning == QL)
+        self.table[e[ql_envs], agent[ql_envs], s[ql_envs], action[ql_envs]] = ql[ql_envs]
+
+        ps = self.prev_state[e, agent]
+        pa = self.prev_action[e, agent]
+        sarsa_old = self.table[e, agent, ps, pa]
+        sarsa = (1 - self.alpha)*sarsa_old + self.alpha*(self.prev_reward[e, agent] + self.gamma*old_q)
+        sarsa_envs = active & (self.learning == SARSA) & (self.steps[e, agent] > 0)
+        self.table[e[sarsa_envs], agent[sarsa_envs], ps[sarsa_envs], pa[sarsa_envs]] = sarsa[sarsa_envs]
+
+        a, ea = agent[active], e[active]
+        self.prev_state[ea, a] = s[active]
+        self.prev_action[ea, a] = action[active]
+        self.prev_reward[ea, a] = reward[active]
+        self.state[ea, a] = new_state[active]
+        self.steps[ea, a] += 1
+
+def apply_schedule(effects, envs, policies, learner, layout):
+    """
+    Apply the effects of a schedule event to the selected worlds, as main.apply_schedule does to both agents
+    The stop effect concerns vec_experiment, which handles it itself
+    arguments:
+    effects - effects of the event (see schedule.Schedule)
+    envs - boolean mask or indexes of the worlds
+    policies, learner - the VecPolicies and VecLearner of the worlds
+    layout - (n,) layout every world is reset to after a terminal state
+    """
+    if 'policy' in effects:
+        policies.policy[envs] = POLICY_CODES[effects['policy']]
+    if 'learning' in effects:
+        learner.learning[envs] = LEARNING_CODES[effects['learning']]
+    if 'alpha' in effects:
+        learner.alpha[envs] = effects['alpha']
+    if 'gamma' in effects:
+        learner.gamma[envs] = effects['gamma']
+    if 'layout' in effects:
+        layout[envs] = effects['layout']
+
+def vec_experiment(experiments, rl_type='ss', seed=None, steps=10000, layouts=None, schedule=None, full_tables=False):
+    """
+    Runs one world per entry of experiments in lockstep, following the schedules of main.experiment
+    returns a dict of arrays:
+    rewards - (n, steps) reward of every step
+    distances - (n, steps) Manhattan distance between the agents after every step
+    agents - (n, steps) moving agent of every step, 0 for F and 1 for M
+    length - (n,) number of steps each world ran
+    terminals - list of n lists with the number of actions needed for each terminal state
+    arguments:
+    experiments - list of experiment ids, one per world
+    rl_type - 'vs', 'ss' or 'ms'
+    seed - seed the generator of every world is spawned from
+    steps - maximum number of steps
+    layouts - dict of the 'original' and 'modified' layout.Layout, the presets if None
+    schedule - JSON file of experiment schedules adding to or replacing the presets (see schedule.py)
+    full_tables - whether to allocate Q-table rows for every RL state, not only the reachable ones
+    """
+    experiments = np.asarray(experiments)
+    n = len(experiments)
+    # compiled schedule of every experiment: the worlds of an experiment step in lockstep, so they share
+    # its step events, while terminal events are looked up with the terminal count of each world
+    schedules = {x: get_schedule(x, schedule) for x in np.unique(experiments).tolist()}
+    world = VecStateSpace(n, layouts=layouts, full_tables=full_tables)
+    policies = VecPolicies(n, seed=seed)
+    learner = VecLearner(n, world.space(rl_type).states(), [schedules[x].alpha for x in experiments],
+                         [schedules[x].gamma for x in experiments])
+    policies.policy[:] = [POLICY_CODES[schedules[x].policy] for x in experiments]
+    learner.learning[:] = [LEARNING_CODES[schedules[x].learning] for x in experiments]
+    # layout every world is reset to after a terminal state, and starts with
+    layout = np.array([schedules[x].layout for x in experiments], dtype=object)
+    world.reset(layout == 'modified', 'modified')
+
+    rewards = np.zeros((n, steps), dtype=np.int8)
+    distances = np.zeros((n, steps), dtype=np.int16)
+    agents = np.zeros((n, steps), dtype=np.int8)
+    length = np.full(n, steps, dtype=np.int64)
+    terminals = [[] for _ in range(n)]
+
+    agent = np.zeros(n, dtype=np.int64)
+    terminal = np.zeros(n, dtype=np.int64)
+    num_actions = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    learner.state[:, 0] = world.map_state(rl_type, np.zeros(n, dtype=np.int64))
+    learner.state[:, 1] = world.map_state(rl_type, np.ones(n, dtype=np.int64))
+
+    for step in range(steps):
+        mask = world.applicable_mask(agent)
+        rows = learner.rows(agent, world.map_state(rl_type, agent))
+        action = policies.choose(mask, rows)
+
+        reward = world.perform_action(agent, action, active)
+        num_actions += active
+        new_state = world.map_state(rl_type, agent)
+        learner.update(agent, action, reward, new_state, world.applicable_mask(agent), active)
+
+        rewards[active, step] = reward[active]
+        distances[active, step] = world.distance()[active]
+        agents[active, step] = agent[active]
+
+        complete = world.is_complete() & active
+        terminal += complete
+        for i in np.flatnonzero(complete):
+            terminals[i].append(int(num_actions[i]))
+            # events of the schedule at this terminal state, e.g. experiment 4 modifies the
+            # Pickup locations after its 3rd terminal state and stops at its 6th
+            effects = schedules[experiments[i]].at_terminal(int(terminal[i]))
+            apply_schedule(effects, i, policies, learner, layout)
+            if effects.get('stop'):
+                length[i] = step + 1
+                active[i] = False
+        num_actions[complete] = 0
+
+        for name in ('original', 'modified'):
+            world.reset(complete & active & (layout == name), name)
+        agent = np.where(complete, AGENT_F, 1 - agent)
+
+        # events of the schedules at this move, e.g. the policy switch after the first 500 moves
+        for x, s in schedules.items():
+            if step + 1 == s.next_step:
+                apply_schedule(s.advance(), experiments == x, policies, learner, layout)
+        if not active.any():
+            break
+
+    return {'rewards': rewards, 'distances': distances, 'agents': agents,
+            'length': length, 'terminals': terminals}
+
+def main():
+    """
+    Runs a vectorized sweep of every experiment over a range of seeds and reports the throughput
+    """
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-n", "--worlds",
+        dest="worlds",
+        help="Number of worlds per experiment",
+        required=False,
+        type=int,
+        default=100)
+    arg_parser.add_argument("-r", "--rl",
+        dest="rl_type",
+        help="Choose RL state space type",
+        required=False,
+        type=str,
+        default='ss')
+    arg_parser.add_argument("-s", "--seed",
+        dest="seed",
+        help="Random seed to use",
+        required=False,
+        type=int,
+        default=None)
+    arg_parser.add_argument("--layout",
+        dest="layout",
+        help="Choose a JSON file of the original and modified layouts",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--grid",
+        dest="grid",
+        help="Scale the layouts to an N x N x N grid",
+        required=False,
+        type=int,
+        default=None)
+    arg_parser.add_argument("--schedule",
+        dest="schedule",
+        help="Choose a JSON file of experiment schedules",
+        required=False,
+        type=str,
+        default=None)
+    arg_parser.add_argument("--full-tables",
+        dest="full_tables",
+        help="Allocate Q-table rows for every RL state, not only the reachable ones",
+        required=False,
+        action="store_true")
+    args = arg_parser.parse_args()
+
+    ids = ['1a', '1b', '1c', '2', '3a', '3b', '4']
+    experiments = [x for x in ids for _ in range(args.worlds)]
+    start = time.perf_counter()
+    result = vec_experiment(experiments, args.rl_type, args.seed, layouts=load_layouts(args.layout, args.grid),
+                            schedule=args.schedule, full_tables=args.full_tables)
+    elapsed = time.perf_counter() - start
+    total = int(result['length'].sum())
+    print(f"{len(experiments)} worlds, {total} steps in {elapsed:.2f}s ({total/elapsed:.0f} steps/s)")
+    for x in ids:
+        counts = [len(result['terminals'][i]) for i in range(len(experiments)) if experiments[i] == x]
+        print(f"Experiment {x}: mean terminal states reached {np.mean(counts):.2f}")
+
+if __name__ == "__main__":
+    main()
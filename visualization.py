@@ -4,19 +4,15 @@ from pygame.font import Font
 from queue import Queue
 import numpy as np
 import argparse
-import ast
+from tableDump import TableDump
+from action import ACT_PICKUP, ACT_DROPOFF, ACT_NORTH, ACT_SOUTH, ACT_EAST, ACT_WEST, ACT_UP, ACT_DOWN
+from cell import AGENT_F, AGENT_M
+from stepLog import STEP_LOG, load_step_log, agent_actions
 
-# import action lists
-agentFActions = []
-agentMActions = []
-with open('out/f_actions', 'r', encoding="utf-8") as f:
-    for line in f:
-        x = line[:-1]
-        agentFActions.append(x)
-with open('out/m_actions', 'r', encoding="utf-8") as f:
-    for line in f:
-        x = line[:-1]
-        agentMActions.append(x)
+# import action lists from the memory-mapped step log, action codes of action.ACTIONS
+stepLog = load_step_log(os.path.join('out', STEP_LOG))
+agentFActions = agent_actions(stepLog, AGENT_F).tolist()
+agentMActions = agent_actions(stepLog, AGENT_M).tolist()
 
 # import experiment id
 with open('out/experiment_id', 'r', encoding="utf-8") as f:
@@ -219,7 +215,7 @@ class Agent:
     id - 'F' or 'M'
     loc - (x,y) coordinates on display window
     asset - image used to represent agent visually
-    actionList - list of actions agent will perform generated from prior simulation
+    actionList - list of the codes of the actions agent will perform generated from prior simulation
     qtable - Q-table of agent generated from prior simulation
     index - used to access agent's actionList
     """
@@ -326,9 +322,13 @@ class Agent:
         """
         returns the state of agent's Q-table
         """
-        if self.qtable:
+        if self.qtable is not None:
             return self.qtable[self.index]
 
+# Agent method drawing each move, by action code
+AGENT_MOVES = {ACT_EAST: Agent.move_east, ACT_WEST: Agent.move_west, ACT_NORTH: Agent.move_north,
+               ACT_SOUTH: Agent.move_south, ACT_UP: Agent.move_up, ACT_DOWN: Agent.move_down}
+
 class Conditions:
     """
     Class which allows us to pass conditions by reference and 
@@ -453,12 +453,14 @@ def draw_qtable(c, agent, b, has_block = None):
         b = (np.exp(alpha)*max_q - np.exp(beta)*min_q)/(max_q - min_q)
         return np.log(a*x+b)
 
-    for i in range(3):
-        for j in range(3):
-            for k in range(3):
+    X, Y, Z = LOC_MATRIX.shape
+    for i in range(X):
+        for j in range(Y):
+            for k in range(Z):
                 if has_block is None:
                     has_block = agent.has_block
-                index = i*18+j*6+k*2+has_block
+                # extracted Q-tables are ordered by cell*2 + carrying (see action.Grid)
+                index = ((i*Y + j)*Z + k)*2 + has_block
                 q_direction = q_directions[index]
                 # If there is no favored direction in the Q-table, don't draw any visualization
                 if q_direction == '':
@@ -481,20 +483,10 @@ def draw_action(c, agent, b):
     """
     i = agent.index
     action = agent.actionList[i]
-    if action == 'E':
-        agent.move_east()
-    elif action == 'W':
-        agent.move_west()
-    elif action == 'N':
-        agent.move_north()
-    elif action == 'S':
-        agent.move_south()
-    elif action == 'U':
-        agent.move_up()
-    elif action == 'D':
-        agent.move_down()
+    if action in AGENT_MOVES:
+        AGENT_MOVES[action](agent)
    
-    elif action == 'Pickup':
+    elif action == ACT_PICKUP:
         agent.pickup()
 
         if c.is_modified and c.numTerminal == 3 and not c.has_switched:
@@ -517,7 +509,7 @@ def draw_action(c, agent, b):
         if c.id == '4' and c.numTerminal >= 3 and agent.loc == (1,2,2):
             b.pickup_two -= 1
     
-    elif action == 'Dropoff':
+    elif action == ACT_DROPOFF:
         agent.dropoff()
         c.numDropoff += 1
         if agent.loc == (2,0,0):
@@ -651,20 +643,8 @@ def main():
 
     # load Q-table data
     if args.qtable:
-        f_table = []
-        m_table = []
-        with open('out/f_table.txt', 'r') as f:
-            for line in f:
-                x = line[:-1]
-                parsed = ast.literal_eval(x)
-                f_table.append(parsed)
-        with open('out/m_table.txt', 'r') as f:
-            for line in f:
-                x = line[:-1]
-                parsed = ast.literal_eval(x)
-                m_table.append(parsed)
-        F.set_table(f_table)
-        M.set_table(m_table)
+        F.set_table(TableDump('out/f_table.bin'))
+        M.set_table(TableDump('out/m_table.bin'))
 
     screengrab = False
     single_step = True
@@ -753,7 +733,7 @@ def main():
 
         if c.numActions != 0:
             n += 1
-        if n >= 10000 or (id == '4' and c.numTerminal == 6):
+        if n >= len(agentFActions) + len(agentMActions) or (id == '4' and c.numTerminal == 6):
             break # indicates end of experiment
 
         single_step = False